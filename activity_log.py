@@ -0,0 +1,282 @@
+"""Write-behind logging of UserActivity rows.
+
+Routes call record()/remove() after their own transaction has committed and
+return immediately; a background thread writes the queued changes with one
+multi-row INSERT or DELETE per run of same-kind operations, whenever
+`batch_size` operations are waiting or the oldest one is `flush_interval`
+seconds old.
+
+Operations are applied in the order they were queued. A comment's row
+carries its CommentID (migrations/012), and removing the comment deletes
+that row only. A remove() also cancels matching inserts that are still
+queued, so an upvote undone within
+the flush interval never reaches the database. Until it is written, an
+operation stays visible through pending_for(), which the activity feed
+merges with what is already stored.
+
+The queue is bounded. When it is full, record()/remove() wait up to
+`put_timeout` seconds for the writer to catch up and then drop the
+operation (counted in stats()), so a slow database never blocks requests
+for long.
+"""
+import logging
+import threading
+import time
+from collections import deque
+from datetime import datetime
+
+logger = logging.getLogger(__name__)
+
+INSERT = 'insert'
+DELETE = 'delete'
+
+
+class ActivityOp:
+    __slots__ = ('kind', 'user_id', 'post_id', 'activity_type', 'at', 'comment_id', 'queued')
+
+    def __init__(self, kind, user_id, post_id, activity_type, at, comment_id=None):
+        self.kind = kind
+        self.user_id = user_id
+        self.post_id = post_id
+        self.activity_type = activity_type
+        self.at = at  # ActivityTime written for inserts
+        self.comment_id = comment_id
+        self.queued = time.monotonic()
+
+    @property
+    def key(self):
+        return (self.user_id, self.post_id, self.activity_type)
+
+    def covers(self, other):
+        """Whether this delete removes the row `other` inserts."""
+        return self.key == other.key and (self.comment_id is None or self.comment_id == other.comment_id)
+
+
+class ActivityLog:
+
+    def __init__(self, connect, max_pending=10000, batch_size=500, flush_interval=1.0,
+                 put_timeout=0.5, retry_delay=2.0, schema=None):
+        self._connect = connect
+        self.schema = schema  # schema_registry.SchemaRegistry, to check for UserActivity.CommentID
+        self.max_pending = max_pending
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.put_timeout = put_timeout
+        self.retry_delay = retry_delay
+
+        self._cond = threading.Condition()
+        self._queue = deque()  # ActivityOp, oldest first
+        self._inflight = []  # batch currently being written
+        self._write_lock = threading.Lock()  # held while a batch is written
+        self._stopping = False
+        self._thread = None
+
+        self.enqueued = 0
+        self.cancelled = 0
+        self.dropped = 0
+        self.written = 0
+        self.batches = 0
+        self.failures = 0
+        self.max_depth = 0
+        self.last_flush_ms = 0.0
+
+    def start(self):
+        with self._cond:
+            if self._thread is None:
+                self._stopping = False
+                self._thread = threading.Thread(target=self._run, name='activity-log', daemon=True)
+                self._thread.start()
+
+    def record(self, user_id, post_id, activity_type, comment_id=None):
+        """Queue an INSERT of one UserActivity row, stamped now."""
+        self._put(ActivityOp(INSERT, user_id, post_id, activity_type, datetime.now().replace(microsecond=0),
+                             comment_id))
+
+    def remove(self, user_id, post_id, activity_type, comment_id=None):
+        """Queue a DELETE of the user's rows of this type for this post, or
+        of the row of one comment."""
+        op = ActivityOp(DELETE, user_id, post_id, activity_type, None, comment_id)
+        with self._cond:
+            kept = deque(q for q in self._queue if not (q.kind == INSERT and op.covers(q)))
+            self.cancelled += len(self._queue) - len(kept)
+            self._queue = kept
+        self._put(op)
+
+    def discard_post(self, post_id):
+        """Forget queued operations for a post that is being deleted.
+
+        Waits for an in-flight batch, so no activity row for the post is
+        written after the caller deletes the post's existing rows.
+        """
+        with self._write_lock:
+            with self._cond:
+                kept = deque(q for q in self._queue if q.post_id != post_id)
+                self.cancelled += len(self._queue) - len(kept)
+                self._queue = kept
+
+    def _put(self, op):
+        deadline = time.monotonic() + self.put_timeout
+        with self._cond:
+            while len(self._queue) >= self.max_pending:
+                self._cond.notify_all()
+                remaining = deadline - time.monotonic()
+                if remaining <= 0 or self._stopping:
+                    self.dropped += 1
+                    logger.warning('Activity queue full; dropping %s %s', op.kind, op.key)
+                    return
+                self._cond.wait(remaining)
+            self._queue.append(op)
+            self.enqueued += 1
+            self.max_depth = max(self.max_depth, len(self._queue))
+            if len(self._queue) == 1 or len(self._queue) >= self.batch_size:
+                self._cond.notify_all()
+
+    def pending_for(self, user_id):
+        """Queued and in-flight operations of one user, oldest first."""
+        with self._cond:
+            return [op for op in list(self._inflight) + list(self._queue) if op.user_id == user_id]
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while not self._stopping and len(self._queue) < self.batch_size:
+                    wait = None
+                    if self._queue:
+                        wait = self.flush_interval - (time.monotonic() - self._queue[0].queued)
+                        if wait <= 0:
+                            break
+                    self._cond.wait(wait)
+                if self._stopping and not self._queue:
+                    return
+            if not self.flush():
+                if self._stopping:
+                    return
+                time.sleep(self.retry_delay)
+
+    def flush(self):
+        """Write one batch now. Returns False if the database write failed
+        (the batch is put back at the front of the queue)."""
+        with self._write_lock:
+            with self._cond:
+                if not self._queue:
+                    return True
+                batch = [self._queue.popleft() for _ in range(min(self.batch_size, len(self._queue)))]
+                self._inflight = batch
+                self._cond.notify_all()  # room for producers waiting on a full queue
+
+            start = time.monotonic()
+            try:
+                self._write(batch)
+            except Exception:
+                logger.exception('Failed to write %d activity operation(s); will retry', len(batch))
+                with self._cond:
+                    self.failures += 1
+                    self._queue.extendleft(reversed(batch))
+                    self._inflight = []
+                return False
+
+            with self._cond:
+                self._inflight = []
+                self.written += len(batch)
+                self.batches += 1
+                self.last_flush_ms = round((time.monotonic() - start) * 1000, 3)
+            return True
+
+    def _write(self, batch):
+        conn = self._connect()
+        try:
+            with conn.cursor() as cursor:
+                for kind, ops in _runs(batch):
+                    if kind == INSERT:
+                        self._insert(cursor, ops)
+                    else:
+                        self._delete(cursor, ops)
+            conn.commit()
+        finally:
+            conn.close()
+
+    def _comment_ids(self):
+        return self.schema is None or self.schema.has_column('UserActivity', 'CommentID')
+
+    def _delete(self, cursor, ops):
+        if self._comment_ids():
+            comments = [op.comment_id for op in ops if op.comment_id is not None]
+            ops = [op for op in ops if op.comment_id is None]
+            if comments:
+                cursor.execute(
+                    f"DELETE FROM UserActivity WHERE CommentID IN ({', '.join(['%s'] * len(comments))})", comments
+                )
+        if ops:
+            cursor.execute(
+                f"DELETE FROM UserActivity WHERE (UserID, PostID, ActivityType) IN "
+                f"({', '.join(['(%s, %s, %s)'] * len(ops))})",
+                [v for op in ops for v in op.key]
+            )
+
+    def _insert(self, cursor, ops):
+        if self._comment_ids():
+            columns, row = 'UserID, PostID, ActivityType, ActivityTime, CommentID', '(%s, %s, %s, %s, %s)'
+            values = lambda op: op.key + (op.at, op.comment_id)
+        else:
+            columns, row = 'UserID, PostID, ActivityType, ActivityTime', '(%s, %s, %s, %s)'
+            values = lambda op: op.key + (op.at,)
+        sql = f"INSERT INTO UserActivity ({columns}) VALUES {', '.join([row] * len(ops))}"
+        try:
+            cursor.execute(sql, [v for op in ops for v in values(op)])
+        except Exception as e:
+            # 1452: a post was deleted after its activity was queued; write
+            # the rest row by row instead of retrying the batch forever
+            if not (getattr(e, 'args', None) and e.args[0] == 1452):
+                raise
+            for op in ops:
+                try:
+                    cursor.execute(f"INSERT INTO UserActivity ({columns}) VALUES {row}", values(op))
+                except Exception as row_error:
+                    if not (getattr(row_error, 'args', None) and row_error.args[0] == 1452):
+                        raise
+                    with self._cond:
+                        self.dropped += 1
+
+    def shutdown(self, timeout=10.0):
+        """Stop the writer after it has flushed everything queued."""
+        with self._cond:
+            thread = self._thread
+            self._stopping = True
+            self._cond.notify_all()
+        if thread is not None:
+            thread.join(timeout)
+            if thread.is_alive():
+                logger.warning('Activity writer did not finish within %.1fs; %d operation(s) lost',
+                               timeout, len(self._queue))
+        else:
+            while self._queue and self.flush():
+                pass
+        with self._cond:
+            self._thread = None
+
+    def stats(self):
+        with self._cond:
+            return {
+                'depth': len(self._queue),
+                'inflight': len(self._inflight),
+                'max_depth': self.max_depth,
+                'max_pending': self.max_pending,
+                'enqueued': self.enqueued,
+                'cancelled': self.cancelled,
+                'dropped': self.dropped,
+                'written': self.written,
+                'batches': self.batches,
+                'failures': self.failures,
+                'last_flush_ms': self.last_flush_ms,
+            }
+
+
+def _runs(batch):
+    """Split a batch into consecutive runs of the same kind, keeping order."""
+    runs = []
+    for op in batch:
+        if runs and runs[-1][0] == op.kind:
+            runs[-1][1].append(op)
+        else:
+            runs.append((op.kind, [op]))
+    return runs
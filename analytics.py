@@ -0,0 +1,256 @@
+"""Hourly and daily per-canteen rollups, maintained incrementally.
+
+CanteenRollups (migrations/008_canteen_rollups.sql) holds one row per
+canteen, grain ('hour' or 'day') and bucket: reviews posted, their rating
+and price sums, upvotes received and distinct active users. A background
+job folds in the FoodReviews, Upvotes and UserActivity rows added since
+the last run, `batch_size` rows of one source per transaction, tracking
+how far it got in RollupWatermarks (the highest primary key folded in per
+source). /api/analytics/canteen/<id> then reads a primary-key range of
+rollup rows: a year of daily points is at most 366 rows, however many
+reviews it covers.
+
+Distinct users are not additive, so the (bucket, user) pairs seen are
+kept in RollupActiveUsers and ActiveUsers is recounted from there for the
+buckets a batch touched (one primary-key range each).
+
+Rows are folded in primary-key order, so a row that commits after rows
+with higher keys would be skipped. Rows newer than `settle` seconds are
+left for the next run to make that unlikely. Each batch first moves its
+source's watermark from the value it read to the new one; if another
+worker got there first the UPDATE matches nothing and the batch is rolled
+back, so several app processes can run the job without counting twice.
+
+Rollups record what happened: deleting a review or withdrawing an upvote
+later does not take it back out of its bucket.
+"""
+import logging
+import threading
+import time
+from collections import defaultdict
+from datetime import datetime, timedelta
+
+logger = logging.getLogger(__name__)
+
+GRAINS = ('hour', 'day')
+# counters of a CanteenRollups row, in the order of the deltas added to them
+COLUMNS = ('ReviewCount', 'RatingSum', 'PriceSum', 'UpvoteCount', 'ActiveUsers')
+
+SOURCES = {
+    'FoodReviews': """
+        SELECT ReviewID AS id, SubmissionDate AS at, CanteenID, UserID, Rating, Price
+        FROM FoodReviews WHERE ReviewID > %s ORDER BY ReviewID LIMIT %s
+    """,
+    # LEFT JOIN: upvotes of deleted reviews still move the watermark
+    'Upvotes': """
+        SELECT u.UpvoteID AS id, u.UpvoteDate AS at, r.CanteenID
+        FROM Upvotes u LEFT JOIN FoodReviews r ON r.ReviewID = u.ReviewID
+        WHERE u.UpvoteID > %s ORDER BY u.UpvoteID LIMIT %s
+    """,
+    'UserActivity': """
+        SELECT ActivityID AS id, ActivityTime AS at, CanteenID, UserID
+        FROM UserActivity WHERE ActivityID > %s ORDER BY ActivityID LIMIT %s
+    """,
+}
+
+
+def bucket_start(at, grain):
+    if grain == 'hour':
+        return at.replace(minute=0, second=0, microsecond=0)
+    return at.replace(hour=0, minute=0, second=0, microsecond=0)
+
+
+class RollupJob:
+
+    def __init__(self, connect, interval=60.0, batch_size=5000, settle=60.0):
+        self._connect = connect
+        self.interval = interval
+        self.batch_size = batch_size
+        self.settle = settle
+
+        self._lock = threading.Lock()
+        self._run_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+
+        self.runs = 0
+        self.batches = 0
+        self.rows = 0
+        self.conflicts = 0
+        self.failures = 0
+        self.last_run = None
+        self.last_run_ms = 0.0
+        self.watermarks = {}
+
+    def start(self):
+        """Run every `interval` seconds in a background thread (0 disables)."""
+        with self._lock:
+            if self._thread is None and self.interval > 0:
+                self._stop.clear()
+                self._thread = threading.Thread(target=self._run, name='analytics-rollup', daemon=True)
+                self._thread.start()
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                self.run_once()
+            except Exception:
+                with self._lock:
+                    self.failures += 1
+                logger.exception('Analytics rollup failed; will retry')
+            self._stop.wait(self.interval)
+
+    def shutdown(self):
+        self._stop.set()
+
+    def run_once(self, max_batches=None):
+        """Fold in everything older than `settle` seconds, or at most
+        `max_batches` batches per source. Returns the rows folded in."""
+        with self._run_lock:
+            start = time.monotonic()
+            cutoff = datetime.now() - timedelta(seconds=self.settle)
+            total = 0
+            conn = self._connect()
+            try:
+                for source in SOURCES:
+                    batches = 0
+                    while max_batches is None or batches < max_batches:
+                        folded, more = self._fold_batch(conn, source, cutoff)
+                        total += folded
+                        batches += 1
+                        if not more:
+                            break
+            finally:
+                conn.close()
+            with self._lock:
+                self.runs += 1
+                self.rows += total
+                self.last_run = datetime.now().replace(microsecond=0)
+                self.last_run_ms = round((time.monotonic() - start) * 1000, 3)
+            return total
+
+    def _fold_batch(self, conn, source, cutoff):
+        """Fold one batch of `source` into the rollups in one transaction.
+        Returns (rows folded, whether a full batch was taken)."""
+        try:
+            with conn.cursor() as cursor:
+                cursor.execute("SELECT LastID FROM RollupWatermarks WHERE Source = %s", (source,))
+                row = cursor.fetchone()
+                if row is None:
+                    raise LookupError(f'no RollupWatermarks row for {source}; apply migrations/008_canteen_rollups.sql')
+                last_id = row['LastID']
+                cursor.execute(SOURCES[source], (last_id, self.batch_size))
+                rows = cursor.fetchall()
+
+                taken = []
+                for r in rows:
+                    if r['at'] is not None and r['at'] > cutoff:
+                        break  # settling; this and later rows wait for the next run
+                    taken.append(r)
+                if not taken:
+                    conn.rollback()
+                    with self._lock:
+                        self.watermarks[source] = last_id
+                    return 0, False
+                consumed = len(taken)
+                new_id = taken[-1]['id']
+
+                cursor.execute("UPDATE RollupWatermarks SET LastID = %s WHERE Source = %s AND LastID = %s",
+                               (new_id, source, last_id))
+                if cursor.rowcount != 1:
+                    conn.rollback()
+                    with self._lock:
+                        self.conflicts += 1
+                    return 0, False
+
+                taken = [r for r in taken if r['CanteenID'] is not None and r['at'] is not None]
+                if source == 'UserActivity':
+                    self._record_active_users(cursor, taken)
+                else:
+                    deltas = defaultdict(lambda: [0] * len(COLUMNS))
+                    for r in taken:
+                        for grain in GRAINS:
+                            d = deltas[(r['CanteenID'], grain, bucket_start(r['at'], grain))]
+                            if source == 'FoodReviews':
+                                d[0] += 1
+                                d[1] += r['Rating'] or 0
+                                d[2] += r['Price'] or 0
+                            else:
+                                d[3] += 1
+                    self._apply(cursor, deltas)
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+
+        with self._lock:
+            self.batches += 1
+            self.watermarks[source] = new_id
+        return consumed, consumed == self.batch_size
+
+    def _record_active_users(self, cursor, rows):
+        """Record the (bucket, user) pairs of `rows`, ignoring those already
+        counted, and recount ActiveUsers of the buckets they fall in."""
+        pairs = sorted({(r['CanteenID'], grain, bucket_start(r['at'], grain), r['UserID'])
+                        for r in rows if r['UserID'] is not None for grain in GRAINS})
+        if not pairs:
+            return
+        cursor.executemany(
+            "INSERT IGNORE INTO RollupActiveUsers (CanteenID, Grain, BucketStart, UserID) VALUES (%s, %s, %s, %s)",
+            pairs
+        )
+        keys = sorted({pair[:3] for pair in pairs})
+        self._apply(cursor, {key: [0] * len(COLUMNS) for key in keys})
+        cursor.executemany("""
+            UPDATE CanteenRollups SET ActiveUsers = (
+                SELECT COUNT(*) FROM RollupActiveUsers m
+                WHERE m.CanteenID = %s AND m.Grain = %s AND m.BucketStart = %s)
+            WHERE CanteenID = %s AND Grain = %s AND BucketStart = %s
+        """, [key + key for key in keys])
+
+    def _apply(self, cursor, deltas):
+        """Add `deltas` ({(canteen, grain, bucket): [column deltas]}) to
+        CanteenRollups, creating the rows of new buckets first."""
+        keys = sorted(deltas)
+        if not keys:
+            return
+        cursor.executemany(
+            "INSERT IGNORE INTO CanteenRollups (CanteenID, Grain, BucketStart) VALUES (%s, %s, %s)", keys
+        )
+        updates = [tuple(deltas[k]) + k for k in keys if any(deltas[k])]
+        if updates:
+            cursor.executemany(
+                f"UPDATE CanteenRollups SET {', '.join(f'{c} = {c} + %s' for c in COLUMNS)} "
+                f"WHERE CanteenID = %s AND Grain = %s AND BucketStart = %s",
+                updates
+            )
+
+    def reset(self):
+        """Empty the rollups and rewind every watermark; the next runs
+        rebuild everything from the base tables."""
+        with self._run_lock:
+            conn = self._connect()
+            try:
+                with conn.cursor() as cursor:
+                    cursor.execute("DELETE FROM CanteenRollups")
+                    cursor.execute("DELETE FROM RollupActiveUsers")
+                    cursor.execute("UPDATE RollupWatermarks SET LastID = 0")
+                conn.commit()
+            finally:
+                conn.close()
+            with self._lock:
+                self.watermarks = {}
+
+    def stats(self):
+        with self._lock:
+            return {
+                'interval': self.interval,
+                'runs': self.runs,
+                'batches': self.batches,
+                'rows': self.rows,
+                'conflicts': self.conflicts,
+                'failures': self.failures,
+                'last_run': self.last_run,
+                'last_run_ms': self.last_run_ms,
+                'watermarks': dict(self.watermarks),
+            }
@@ -1,11 +1,33 @@
-from flask import Flask, render_template, request, redirect, session, flash, send_from_directory, jsonify
+from flask import Flask, render_template, request, redirect, session, flash, jsonify, g, has_app_context, has_request_context, Response
 import pymysql
 from werkzeug.security import generate_password_hash, check_password_hash
 import os
 import secrets
-from werkzeug.utils import secure_filename
-import logging
+import atexit
 import json
+import base64
+import hashlib
+import re
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+from decimal import Decimal, InvalidOperation
+import click
+from db_pool import ConnectionPool
+from review_cache import ReviewListCache, VersionStamps
+from review_json import FragmentCache, dumps, encode_payload, with_members
+from uploads import UploadPipeline
+from schema_migrations import MigrationRunner, MigrationError, discover as discover_migrations
+from schema_registry import SchemaRegistry
+from activity_log import ActivityLog
+from event_hub import EventHub, HubFull, ALL as ALL_CANTEENS
+from compression import Compressor
+from static_files import FileServer
+from page_shell import PageShell
+from recommendations import Recommender
+from analytics import RollupJob
+from review_transfer import ReviewImporter, TransferError, export_reviews
+from metrics import Metrics, RequestTrace, TracedConnection, QueryBudgetExceeded, query_budget, check_query_budget
 
 app = Flask(__name__)
 app.secret_key = os.environ.get('FLASK_SECRET') or secrets.token_hex(32)
@@ -13,38 +35,406 @@ app.secret_key = os.environ.get('FLASK_SECRET') or secrets.token_hex(32)
 UPLOAD_FOLDER = 'static/uploads'
 ALLOWED_EXTENSIONS = {'png', 'jpg', 'jpeg', 'gif'}
 app.config['UPLOAD_FOLDER'] = UPLOAD_FOLDER
-app.logger.setLevel(logging.DEBUG)
+# connection pool sizing (see db_pool.ConnectionPool)
+app.config['DB_POOL_SIZE'] = int(os.environ.get('DB_POOL_SIZE', 5))
+app.config['DB_POOL_MAX_OVERFLOW'] = int(os.environ.get('DB_POOL_MAX_OVERFLOW', 10))
+app.config['DB_POOL_TIMEOUT'] = float(os.environ.get('DB_POOL_TIMEOUT', 10))
+app.config['DB_POOL_RECYCLE'] = int(os.environ.get('DB_POOL_RECYCLE', 3600))
+app.config['DB_POOL_PING_AFTER'] = float(os.environ.get('DB_POOL_PING_AFTER', 30))
+# canteen review listing cache (see review_cache.ReviewListCache)
+app.config['REVIEW_CACHE_SIZE'] = int(os.environ.get('REVIEW_CACHE_SIZE', 1024))
+app.config['REVIEW_CACHE_TTL'] = float(os.environ.get('REVIEW_CACHE_TTL', 30))
+# encoded JSON per review, reused until the review's Version changes (see review_json)
+app.config['REVIEW_FRAGMENT_CACHE_SIZE'] = int(os.environ.get('REVIEW_FRAGMENT_CACHE_SIZE', 20000))
+# threads resizing uploads in the background (see uploads.UploadPipeline)
+app.config['UPLOAD_WORKERS'] = int(os.environ.get('UPLOAD_WORKERS', 2))
+# write-behind UserActivity logging (see activity_log.ActivityLog)
+app.config['ACTIVITY_QUEUE_SIZE'] = int(os.environ.get('ACTIVITY_QUEUE_SIZE', 10000))
+app.config['ACTIVITY_BATCH_SIZE'] = int(os.environ.get('ACTIVITY_BATCH_SIZE', 500))
+app.config['ACTIVITY_FLUSH_INTERVAL'] = float(os.environ.get('ACTIVITY_FLUSH_INTERVAL', 1.0))
+# live update streams (see event_hub.EventHub); each open stream holds a request thread
+app.config['STREAM_MAX_SUBSCRIBERS'] = int(os.environ.get('STREAM_MAX_SUBSCRIBERS', 500))
+app.config['STREAM_HEARTBEAT'] = float(os.environ.get('STREAM_HEARTBEAT', 15))
+app.config['STREAM_MAX_AGE'] = float(os.environ.get('STREAM_MAX_AGE', 300))
+# per-route request metrics served on /metrics (see metrics.Metrics);
+# SLOW_REQUEST_MS=0 turns the slow request log off
+app.config['METRICS_ENABLED'] = os.environ.get('METRICS_ENABLED', '1').lower() not in ('0', 'false', 'no')
+app.config['SLOW_REQUEST_MS'] = float(os.environ.get('SLOW_REQUEST_MS', 500))
+# @query_budget checks: 'off', 'log' or 'raise'; unset, they raise when
+# app.testing is set, log in debug mode and are off otherwise, so requests are
+# not traced when METRICS_ENABLED=0. QUERY_REPEAT_LIMIT caps how often one
+# statement shape may run in a request when the view does not say otherwise
+app.config['QUERY_BUDGET_MODE'] = os.environ.get('QUERY_BUDGET_MODE', '').lower()
+app.config['QUERY_REPEAT_LIMIT'] = int(os.environ.get('QUERY_REPEAT_LIMIT', 5))
+# gzip / brotli response compression (see compression.Compressor); bodies over
+# COMPRESS_STREAM_OVER bytes are compressed while they are sent
+app.config['COMPRESS_ENABLED'] = os.environ.get('COMPRESS_ENABLED', '1').lower() not in ('0', 'false', 'no')
+app.config['COMPRESS_MIN_SIZE'] = int(os.environ.get('COMPRESS_MIN_SIZE', 1024))
+app.config['COMPRESS_LEVEL'] = int(os.environ.get('COMPRESS_LEVEL', 5))
+app.config['COMPRESS_BROTLI_QUALITY'] = int(os.environ.get('COMPRESS_BROTLI_QUALITY', 4))
+app.config['COMPRESS_STREAM_OVER'] = int(os.environ.get('COMPRESS_STREAM_OVER', 256 * 1024))
+# dish recommendations rebuilt in the background every RECOMMEND_REFRESH
+# seconds (see recommendations.Recommender); 0 turns the builds off
+app.config['RECOMMEND_REFRESH'] = float(os.environ.get('RECOMMEND_REFRESH', 3600))
+app.config['RECOMMEND_TOP_N'] = int(os.environ.get('RECOMMEND_TOP_N', 20))
+app.config['RECOMMEND_NEIGHBOURS'] = int(os.environ.get('RECOMMEND_NEIGHBOURS', 50))
+# canteen analytics rollups folded in every ANALYTICS_INTERVAL seconds (see
+# analytics.RollupJob); 0 leaves it to `flask rollup-analytics`
+app.config['ANALYTICS_INTERVAL'] = float(os.environ.get('ANALYTICS_INTERVAL', 60))
+app.config['ANALYTICS_BATCH_SIZE'] = int(os.environ.get('ANALYTICS_BATCH_SIZE', 5000))
+app.config['ANALYTICS_SETTLE'] = float(os.environ.get('ANALYTICS_SETTLE', 60))
+# uploads and /templates/public files (see static_files.FileServer); SENDFILE
+# ('x-sendfile' or 'x-accel-redirect') leaves sending the bytes to a front
+# proxy, which for X-Accel-Redirect maps SENDFILE_ACCEL_PREFIX to the app folder
+app.config['SENDFILE'] = os.environ.get('SENDFILE', '').lower()
+app.config['SENDFILE_ACCEL_PREFIX'] = os.environ.get('SENDFILE_ACCEL_PREFIX', '/_files')
+app.config['IMMUTABLE_MAX_AGE'] = int(os.environ.get('IMMUTABLE_MAX_AGE', 365 * 24 * 3600))
+# tables / indexes / routines handlers branch on, read from information_schema
+# at most every SCHEMA_PROBE_INTERVAL seconds (see schema_registry.SchemaRegistry)
+app.config['SCHEMA_PROBE_INTERVAL'] = float(os.environ.get('SCHEMA_PROBE_INTERVAL', 300))
+# the server's innodb_ft_min_token_size: shorter search words are never indexed
+app.config['SEARCH_MIN_TOKEN_SIZE'] = int(os.environ.get('SEARCH_MIN_TOKEN_SIZE', 3))
+app.config['LOG_LEVEL'] = os.environ.get('LOG_LEVEL', 'INFO').upper()
+app.logger.setLevel(app.config['LOG_LEVEL'])
 
 # Ensure upload folder exists
 os.makedirs(UPLOAD_FOLDER, exist_ok=True)
 
+upload_pipeline = UploadPipeline(UPLOAD_FOLDER, '/static/uploads', max_workers=app.config['UPLOAD_WORKERS'])
+
+file_server = FileServer(
+    app.root_path,
+    sendfile=app.config['SENDFILE'],
+    accel_prefix=app.config['SENDFILE_ACCEL_PREFIX'],
+    immutable_max_age=app.config['IMMUTABLE_MAX_AGE']
+)
+PUBLIC_FOLDER = os.path.join(app.root_path, 'templates', 'public')
+
+@app.template_global()
+def public_url(filename):
+    """Versioned URL of a /templates/public file, cached for a year."""
+    return file_server.versioned_url('/templates/public', PUBLIC_FOLDER, filename)
+
 def allowed_file(filename):
     return '.' in filename and filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
 
-def get_db_connection():
+def save_upload(f):
+    """Store an uploaded image and return its URL; resizing happens off-request."""
+    return upload_pipeline.save(f, f.filename.rsplit('.', 1)[1])
+
+def _connect():
     return pymysql.connect(
-        host='localhost',
-        user='root',
-        password='',  # Remember to change this!
-        db='food',
+        host=os.environ.get('DB_HOST', 'localhost'),
+        user=os.environ.get('DB_USER', 'root'),
+        password=os.environ.get('DB_PASSWORD', ''),  # Remember to change this!
+        db=os.environ.get('DB_NAME', 'food'),
         cursorclass=pymysql.cursors.DictCursor
     )
 
+db_pool = ConnectionPool(
+    _connect,
+    pool_size=app.config['DB_POOL_SIZE'],
+    max_overflow=app.config['DB_POOL_MAX_OVERFLOW'],
+    timeout=app.config['DB_POOL_TIMEOUT'],
+    recycle=app.config['DB_POOL_RECYCLE'],
+    ping_after=app.config['DB_POOL_PING_AFTER']
+)
+
+def get_db_connection():
+    """Return the pooled connection checked out for the current app context.
+
+    Handlers may still call conn.close(); that checks the connection back in
+    to the pool, and teardown_db_connection releases anything left over.
+    Outside an app context (CLI commands, worker threads) a fresh checkout is
+    returned and the caller is responsible for closing it.
+    """
+    if not has_app_context():
+        return db_pool.checkout()
+    conn = g.get('db_conn')
+    if conn is None or conn.released:
+        conn = db_pool.checkout()
+        trace = g.get('request_trace')
+        if trace is not None:
+            conn = TracedConnection(conn, trace)
+        g.db_conn = conn
+    return conn
+
+MIGRATIONS_FOLDER = os.path.join(app.root_path, 'migrations')
+
+# probes on a connection of its own, so it never counts against a request's budget
+schema = SchemaRegistry(
+    lambda: db_pool.checkout(),
+    discover_migrations(MIGRATIONS_FOLDER),
+    max_age=app.config['SCHEMA_PROBE_INTERVAL']
+)
+
+# the writer thread checks out its own connections from the pool
+activity_log = ActivityLog(
+    lambda: db_pool.checkout(),
+    max_pending=app.config['ACTIVITY_QUEUE_SIZE'],
+    batch_size=app.config['ACTIVITY_BATCH_SIZE'],
+    flush_interval=app.config['ACTIVITY_FLUSH_INTERVAL'],
+    schema=schema
+)
+atexit.register(activity_log.shutdown)
+
+event_hub = EventHub(
+    heartbeat=app.config['STREAM_HEARTBEAT'],
+    max_age=app.config['STREAM_MAX_AGE'],
+    max_subscribers=app.config['STREAM_MAX_SUBSCRIBERS']
+)
+atexit.register(event_hub.close)
+
+compressor = Compressor(
+    min_size=app.config['COMPRESS_MIN_SIZE'],
+    gzip_level=app.config['COMPRESS_LEVEL'],
+    brotli_quality=app.config['COMPRESS_BROTLI_QUALITY'],
+    stream_over=app.config['COMPRESS_STREAM_OVER']
+)
+# index.html rendered and compressed once (see page_shell.PageShell)
+# app.debug is read per request: app.run(debug=True) sets it after import
+page_shell = PageShell(lambda: render_template('index.html'), compressor, reload=lambda: app.debug)
+
+# the build job checks out its own connection from the pool
+recommender = Recommender(
+    lambda: db_pool.checkout(),
+    top_n=app.config['RECOMMEND_TOP_N'],
+    neighbours=app.config['RECOMMEND_NEIGHBOURS'],
+    refresh_interval=app.config['RECOMMEND_REFRESH']
+)
+atexit.register(recommender.shutdown)
+
+rollup_job = RollupJob(
+    lambda: db_pool.checkout(),
+    interval=app.config['ANALYTICS_INTERVAL'],
+    batch_size=app.config['ANALYTICS_BATCH_SIZE'],
+    settle=app.config['ANALYTICS_SETTLE']
+)
+atexit.register(rollup_job.shutdown)
+
+_background_started = False
+_background_lock = threading.Lock()
+
+def start_background_jobs():
+    """Start the activity writer, recommendation builds and analytics
+    rollups once per process. Called on the first request, so CLI commands
+    and importing the app start no threads (and a preloading server forks
+    before any are running)."""
+    global _background_started
+    if _background_started:
+        return
+    with _background_lock:
+        if not _background_started:
+            activity_log.start()
+            recommender.start()
+            rollup_job.start()
+            _background_started = True
+
+request_metrics = Metrics(slow_ms=app.config['SLOW_REQUEST_MS'])
+request_metrics.add_gauge('db_pool_connections_in_use', 'Checked-out database connections.',
+                          lambda: db_pool.stats()['in_use'])
+request_metrics.add_gauge('db_pool_connections_open', 'Open database connections.',
+                          lambda: db_pool.stats()['open'])
+request_metrics.add_gauge('activity_queue_depth', 'UserActivity writes waiting to be flushed.',
+                          lambda: activity_log.stats()['depth'])
+request_metrics.add_gauge('stream_subscribers', 'Open /api/stream connections.',
+                          lambda: event_hub.stats()['subscribers'])
+request_metrics.add_counter('http_compressed_responses_total', 'Compressed responses by encoding.',
+                            'encoding', lambda: compressor.totals('responses'))
+request_metrics.add_counter('http_compression_input_bytes_total', 'Response bytes before compression.',
+                            'encoding', lambda: compressor.totals('bytes_in'))
+request_metrics.add_counter('http_compression_output_bytes_total', 'Response bytes after compression.',
+                            'encoding', lambda: compressor.totals('bytes_out'))
+request_metrics.add_counter('http_compression_cpu_seconds_total', 'CPU time spent compressing responses.',
+                            'encoding', lambda: compressor.totals('cpu_seconds'))
+
+review_cache = ReviewListCache(
+    max_entries=app.config['REVIEW_CACHE_SIZE'],
+    ttl=app.config['REVIEW_CACHE_TTL']
+)
+review_fragments = FragmentCache(max_entries=app.config['REVIEW_FRAGMENT_CACHE_SIZE'])
+
+# bumped whenever /api/me or /api/my_reviews of that user may have changed
+user_versions = VersionStamps()
+# distinguishes this worker's ETags from those issued by other processes
+BOOT_ID = secrets.token_hex(4)
+
+def invalidate_canteen(canteen_id):
+    """Drop cached review listings after a write that touched this canteen."""
+    if canteen_id is not None:
+        review_cache.invalidate(int(canteen_id))
+
+def invalidate_users(*user_ids):
+    """Bump the version stamp of every user whose own payloads a write changed
+    (the actor and, for interactions, the review's author)."""
+    for user_id in set(user_ids):
+        if user_id is not None:
+            user_versions.bump(user_id)
+
+def publish_event(canteen_id, event, **data):
+    """Push a delta event to /api/stream subscribers of the canteen."""
+    if canteen_id is not None:
+        event_hub.publish(int(canteen_id), event, data)
+
+def api_etag(*parts):
+    """ETag for a JSON response, derived from version stamps instead of the body.
+
+    Versions live in this process, so the tag also carries the REVIEW_CACHE_TTL
+    window: a worker that never saw a write stops confirming an old tag after
+    at most one TTL, the same staleness bound as review_cache.
+    """
+    window = int(time.time() // app.config['REVIEW_CACHE_TTL'])
+    raw = '|'.join(str(p) for p in (BOOT_ID, window) + parts)
+    return hashlib.sha1(raw.encode()).hexdigest()[:24]
+
+def with_validators(resp, etag, last_modified, private=False):
+    resp.set_etag(etag)
+    resp.last_modified = datetime.fromtimestamp(int(last_modified), timezone.utc)
+    # let the browser keep the body but revalidate on every fetch()
+    resp.headers['Cache-Control'] = 'private, no-cache' if private else 'no-cache'
+    return resp
+
+def json_response(body):
+    """Response for an already-encoded JSON body."""
+    return app.response_class(body, mimetype='application/json')
+
+def not_modified(etag, last_modified, private=False):
+    """Return a 304 response if the request's validators still match, else None."""
+    if request.if_none_match:
+        matched = request.if_none_match.contains_weak(etag)
+    elif request.if_modified_since:
+        matched = request.if_modified_since >= datetime.fromtimestamp(int(last_modified), timezone.utc)
+    else:
+        return None
+    if not matched:
+        return None
+    return with_validators(app.response_class(status=304), etag, last_modified, private)
+
+def query_budget_mode():
+    mode = app.config['QUERY_BUDGET_MODE']
+    if app.testing and mode != 'off':
+        return 'raise'
+    return mode or ('log' if app.debug else 'off')
+
+def view_query_budget():
+    """(queries, repeats) declared with @query_budget on the matched view,
+    plus what extend_query_budget() allowed, or None."""
+    budget = getattr(app.view_functions.get(request.endpoint), 'query_budget', None)
+    extra = g.get('query_budget_extra', 0)
+    if budget is not None and budget[0] is not None and extra:
+        budget = (budget[0] + extra, budget[1])
+    return budget
+
+def extend_query_budget(queries):
+    """Allow this request `queries` more statements than its view declared,
+    for a path that legitimately needs them (e.g. a pre-migration fallback)."""
+    if not has_request_context():
+        return
+    g.query_budget_extra = g.get('query_budget_extra', 0) + queries
+    trace = g.get('request_trace')
+    if trace is not None and trace.raise_over is not None:
+        trace.raise_over += queries
+
+# registered ahead of finish_request_trace, so it runs after it (Flask runs
+# after_request hooks in reverse) and request metrics see the uncompressed body
+@app.after_request
+def compress_response(response):
+    if app.config['COMPRESS_ENABLED']:
+        compressor.compress(response, request.accept_encodings)
+    return response
+
+@app.before_request
+def start_background_jobs_on_first_request():
+    start_background_jobs()
+
+@app.before_request
+def start_request_trace():
+    mode = query_budget_mode()
+    if app.config['METRICS_ENABLED'] or mode != 'off':
+        budget = view_query_budget() if mode == 'raise' else None
+        g.request_trace = RequestTrace(raise_over=budget[0] if budget else None)
+
+@app.after_request
+def finish_request_trace(response):
+    trace = g.pop('request_trace', None)
+    if trace is None:
+        return response
+    rule = request.url_rule
+    route = rule.rule if rule is not None else '<unmatched>'
+    if app.config['METRICS_ENABLED']:
+        request_metrics.finish(trace, route, request.method, response.status_code,
+                               None if response.is_streamed else response.content_length)
+
+    mode = query_budget_mode()
+    if mode != 'off':
+        problems = check_query_budget(trace, view_query_budget(), app.config['QUERY_REPEAT_LIMIT'])
+        if problems:
+            message = f"{request.method} {route}: {'; '.join(problems)}"
+            if mode == 'raise':
+                raise QueryBudgetExceeded(message)
+            app.logger.warning('Query budget exceeded by %s', message)
+    return response
+
+# errnos of objects the last schema probe saw that are gone
+SCHEMA_ERRNOS = {
+    1146: 'table',
+    1054: 'column',
+    1305: 'procedure',
+    1191: 'FULLTEXT index',
+}
+
+@app.errorhandler(pymysql.err.ProgrammingError)
+@app.errorhandler(pymysql.err.OperationalError)
+def schema_changed(e):
+    # a query hit a missing table / column / ...: probe again
+    kind = SCHEMA_ERRNOS.get(e.args[0]) if e.args else None
+    if kind is None:
+        app.logger.error('Database error in %s %s', request.method, request.path, exc_info=e)
+        return jsonify({ 'success': False, 'error': 'database_error' }), 500
+    app.logger.warning('Query hit a missing %s (%s); re-probing the schema', kind, e.args[1] if len(e.args) > 1 else e)
+    schema.invalidate()
+    return jsonify({ 'success': False, 'error': 'schema_unavailable' }), 503
+
+@app.teardown_appcontext
+def teardown_db_connection(exc):
+    conn = g.pop('db_conn', None)
+    if conn is not None:
+        conn.close()
+
 @app.route('/templates/public/<path:filename>')
 def serve_templates_public(filename):
-    return send_from_directory(os.path.join(app.root_path, 'templates', 'public'), filename)
+    # only the URL of the current bytes is immutable; stale ?v= links revalidate
+    immutable = file_server.is_current(PUBLIC_FOLDER, filename, request.args.get('v'))
+    return file_server.serve(request, PUBLIC_FOLDER, filename, immutable=immutable)
+
+@app.route('/static/uploads/<path:filename>')
+def serve_upload(filename):
+    if upload_pipeline.immutable(f'/static/uploads/{filename}'):
+        # the content-addressed name identifies the bytes; no need to hash them
+        return file_server.serve(request, os.path.join(app.root_path, UPLOAD_FOLDER), filename,
+                                 immutable=True, etag=filename.rsplit('.', 1)[0])
+    return file_server.serve(request, os.path.join(app.root_path, UPLOAD_FOLDER), filename)
 
 @app.route('/')
+@query_budget(0)
 def index():
-    return render_template('index.html', 
-                         logged_in=('user_id' in session), 
-                         username=session.get('username'), 
-                         profile_image_url=session.get('profile_image_url'), 
-                         user_id=session.get('user_id'), 
-                         email=session.get('email'), 
-                         show_profile=False)
+    return serve_page_shell()
+
+def serve_page_shell():
+    """The app shell; the page reads the signed-in user from /api/me."""
+    etag = page_shell.etag
+    unchanged = not_modified(etag, page_shell.rendered_at)
+    if unchanged is not None:
+        return unchanged
+    accept = request.accept_encodings if app.config['COMPRESS_ENABLED'] else None
+    resp = with_validators(page_shell.response(accept), etag, page_shell.rendered_at)
+    if resp.content_encoding:
+        # like Compressor.compress: the bytes differ per encoding
+        resp.set_etag(etag, weak=True)
+    return resp
 
 @app.route('/register', methods=['POST'])
+@query_budget(2)
 def register():
     full_name = request.form['full_name']
     username = request.form['username']
@@ -57,15 +447,18 @@ def register():
     profile_image_url = None
 
     if uploaded_file and allowed_file(uploaded_file.filename):
-        filename = secure_filename(uploaded_file.filename)
-        unique_name = f"{secrets.token_hex(8)}_{filename}"
-        uploaded_file.save(os.path.join(app.config['UPLOAD_FOLDER'], unique_name))
-        profile_image_url = f"/static/uploads/{unique_name}"
+        profile_image_url = save_upload(uploaded_file)
 
     conn = get_db_connection()
     try:
         with conn.cursor() as cursor:
-            cursor.execute("SELECT * FROM users WHERE email = %s OR username = %s", (email, username))
+            # one indexed lookup per unique key (an OR across both can't use either)
+            cursor.execute("""
+                SELECT user_id FROM users WHERE email = %s
+                UNION ALL
+                SELECT user_id FROM users WHERE username = %s
+                LIMIT 1
+            """, (email, username))
             if cursor.fetchone():
                 flash("Email or username already exists!")
                 return redirect('/')
@@ -82,6 +475,7 @@ def register():
     return redirect('/')
 
 @app.route('/login', methods=['POST'])
+@query_budget(1)
 def login():
     identifier = request.form['identifier']
     password = request.form['password']
@@ -89,7 +483,13 @@ def login():
     conn = get_db_connection()
     try:
         with conn.cursor() as cursor:
-            cursor.execute("SELECT * FROM users WHERE email = %s OR username = %s", (identifier, identifier))
+            # email match first, as the identifier could also be someone's username
+            cursor.execute("""
+                SELECT user_id, username, email, password, profile_image_url FROM users WHERE email = %s
+                UNION ALL
+                SELECT user_id, username, email, password, profile_image_url FROM users WHERE username = %s
+                LIMIT 1
+            """, (identifier, identifier))
             user = cursor.fetchone()
     finally:
         conn.close()
@@ -112,43 +512,20 @@ def logout():
     return redirect('/')
 
 @app.route('/profile')
+@query_budget(0)
 def profile():
     if 'user_id' not in session:
         return redirect('/')
-    return render_template('index.html', 
-                         logged_in=True, 
-                         username=session.get('username'), 
-                         profile_image_url=session.get('profile_image_url'), 
-                         user_id=session.get('user_id'), 
-                         email=session.get('email'), 
-                         show_profile=True)
+    return serve_page_shell()
 
 @app.route('/canteen/<int:canteen_id>')
+@query_budget(0)
 def view_canteen(canteen_id):
-    """Render the main page with instructions to open a specific canteen view."""
-    conn = get_db_connection()
-    canteen_name = ''
-    try:
-        with conn.cursor() as cursor:
-            cursor.execute("SELECT * FROM canteens WHERE canteen_id = %s", (canteen_id,))
-            canteen = cursor.fetchone()
-            if canteen:
-                canteen_name = canteen.get('name', '')
-    finally:
-        conn.close()
-
-    return render_template('index.html', 
-                         logged_in=('user_id' in session), 
-                         username=session.get('username'), 
-                         profile_image_url=session.get('profile_image_url'), 
-                         user_id=session.get('user_id'), 
-                         email=session.get('email'), 
-                         show_profile=False, 
-                         show_canteen=True, 
-                         canteen_id=canteen_id,
-                         canteen_name=canteen_name)
+    """The app shell; the page opens the canteen named in its URL."""
+    return serve_page_shell()
 
 @app.route('/submit_review', methods=['POST'])
+@query_budget(1)
 def submit_review():
     if 'user_id' not in session:
         flash('Please sign in to submit a review.')
@@ -192,11 +569,7 @@ def submit_review():
     if images:
         for f in images:
             if f and f.filename and allowed_file(f.filename):
-                filename = secure_filename(f.filename)
-                unique_name = f"{secrets.token_hex(8)}_{filename}"
-                save_path = os.path.join(app.config['UPLOAD_FOLDER'], unique_name)
-                f.save(save_path)
-                image_paths.append(f"/static/uploads/{unique_name}")
+                image_paths.append(save_upload(f))
 
     if not image_paths:
         image_paths = ['https://images.unsplash.com/photo-1546069901-ba9599a7e63c?w=300&h=200&fit=crop']
@@ -210,13 +583,7 @@ def submit_review():
                 INSERT INTO FoodReviews (FoodName, Price, Rating, SpiceLevel, Review, ImagePaths, UserID, CanteenID)
                 VALUES (%s, %s, %s, %s, %s, %s, %s, %s)
             """, (food_name, price_val, rating_val, spice_val, review_text, image_paths_json, session.get('user_id'), canteen_id))
-            # get inserted review id and also insert a UserActivity row
             review_id = cursor.lastrowid
-            try:
-                cursor.execute("INSERT INTO UserActivity (UserID, PostID, ActivityType) VALUES (%s, %s, %s)", (session.get('user_id'), review_id, 'review'))
-            except Exception:
-                # If UserActivity table doesn't exist or insert fails, log and continue
-                app.logger.exception('Failed to insert UserActivity for new review')
             conn.commit()
             app.logger.debug('Review inserted successfully!')
     except Exception as e:
@@ -226,6 +593,11 @@ def submit_review():
     finally:
         conn.close()
 
+    activity_log.record(session.get('user_id'), review_id, 'review')
+    recommender.observe_review(session.get('user_id'), review_id, int(canteen_id), food_name, rating_val)
+    invalidate_canteen(canteen_id)
+    invalidate_users(session.get('user_id'))
+    publish_event(canteen_id, 'review', review_id=review_id)
     flash('Review submitted successfully!')
     
     try:
@@ -235,10 +607,251 @@ def submit_review():
         app.logger.error(f'Error redirecting to canteen page: {e}')
         return redirect('/')
 
+DEFAULT_REVIEW_IMAGE = 'https://images.unsplash.com/photo-1546069901-ba9599a7e63c?w=300&h=200&fit=crop'
+# max ReviewIDs per IN (...) list when batch-loading comments
+REVIEW_BATCH_SIZE = 500
+
+def parse_image_paths(raw):
+    """ImagePaths is stored as a JSON array or a comma-separated string."""
+    images = []
+    try:
+        if raw:
+            parsed = json.loads(raw) if isinstance(raw, str) else raw
+            images = parsed if isinstance(parsed, list) else [parsed]
+    except Exception:
+        images = [p.strip() for p in (raw or '').split(',') if p.strip()]
+    return images
+
+# columns kept in sync by the triggers in migrations/001_review_counters.sql
+REVIEW_COUNTERS = (
+    ('UpvoteCount', 'Upvotes'),
+    ('FavoriteCount', 'Favorites'),
+    ('CommentCount', 'Comments'),
+)
+
+def review_counter(column, alias='r'):
+    """SQL for one FoodReviews counter: the column, or a count of its base
+    table on a database without migration 001."""
+    if schema.has_column('FoodReviews', column):
+        return f'{alias}.{column}'
+    table = dict(REVIEW_COUNTERS)[column]
+    return f'(SELECT COUNT(*) FROM {table} x WHERE x.ReviewID = {alias}.ReviewID)'
+
+def review_counter_columns():
+    """Extra select list entries for `SELECT r.*` listings, counting the
+    upvotes / favorites serialize_review reads when the columns are missing."""
+    return ''.join(f', {review_counter(column)} AS {column}' for column in ('UpvoteCount', 'FavoriteCount')
+                   if not schema.has_column('FoodReviews', column))
+
+def serialize_review(r, comments):
+    """Build the JSON shape the frontend expects for one FoodReviews row."""
+    originals = parse_image_paths(r.get('ImagePaths')) or [DEFAULT_REVIEW_IMAGE]
+    # cards show the resized variant once the upload pipeline has produced it
+    images = [upload_pipeline.variant_url(u, 'card') for u in originals]
+    return {
+        'id': r['ReviewID'],
+        'canteen_id': r.get('CanteenID'),
+        'images': images,
+        'image': images[0],
+        'thumbs': [upload_pipeline.variant_url(u, 'thumb') for u in originals],
+        'originals': originals,
+        'name': r.get('FoodName'),
+        'rating': int(r.get('Rating') or 0),
+        'price': float(r.get('Price') or 0.0),
+        'spiceLevel': int(r.get('SpiceLevel') or 0),
+        'author': r.get('username') or 'Unknown',
+        'author_id': r.get('UserID'),
+        'upvotes': int(r.get('UpvoteCount') or 0),
+        'favorites': int(r.get('FavoriteCount') or 0),
+        'review': r.get('Review') or '',
+        'comments': comments
+    }
+
+def load_review_comments(cursor, review_ids):
+    """Return {ReviewID: [comment, ...]} for all ids, oldest comment first."""
+    comments = {}
+    for i in range(0, len(review_ids), REVIEW_BATCH_SIZE):
+        chunk = review_ids[i:i + REVIEW_BATCH_SIZE]
+        if not _fetch_comments(cursor, f"c.ReviewID IN ({', '.join(['%s'] * len(chunk))})", chunk, comments):
+            break
+    return comments
+
+def load_author_review_comments(cursor, user_id):
+    """load_review_comments() for every review written by one user, in a
+    single statement however many reviews that is."""
+    comments = {}
+    _fetch_comments(cursor, "c.ReviewID IN (SELECT ReviewID FROM FoodReviews WHERE UserID = %s)", (user_id,), comments)
+    return comments
+
+def _fetch_comments(cursor, where, params, comments):
+    """Add the comments matching `where` to `comments`; False if there is no Comments table."""
+    if not schema.has_table('Comments'):
+        return False
+    cursor.execute(f"""
+        SELECT c.ReviewID, c.CommentID, c.CommentText, c.CommentDate, u.username, c.UserID AS comment_user_id
+        FROM Comments c
+        LEFT JOIN users u ON c.UserID = u.user_id
+        WHERE {where}
+        ORDER BY c.CommentDate ASC, c.CommentID ASC
+    """, params)
+    for cr in cursor.fetchall():
+        comments.setdefault(cr['ReviewID'], []).append({
+            'id': cr.get('CommentID'),
+            'author': cr.get('username'),
+            'user_id': cr.get('comment_user_id'),
+            'text': cr.get('CommentText'),
+            'date': str(cr.get('CommentDate'))
+        })
+    return True
+
+def new_comment(comment_id, text):
+    """The load_review_comments shape of a comment the current user just posted."""
+    return {
+        'id': comment_id,
+        'author': session.get('username'),
+        'user_id': session.get('user_id'),
+        'text': text,
+        'date': str(datetime.now().replace(microsecond=0))
+    }
+
+def encode_reviews(cursor, rows, author_id=None):
+    """Encoded JSON of FoodReviews rows together with their comments.
+
+    Rows whose Version matches a cached fragment are not serialized again.
+    Comments are fetched for the other rows only, with one query per
+    REVIEW_BATCH_SIZE ids (or one in all for more than that when the rows
+    are all of `author_id`'s reviews), and upvote/favorite counts come from
+    the counter columns on the row, so the number of round trips does not
+    grow with the number of reviews.
+    """
+    fragments = [None] * len(rows)
+    missing = []
+    for i, r in enumerate(rows):
+        if r.get('Version') is not None:
+            fragments[i] = review_fragments.get(r['ReviewID'], r['Version'])
+        if fragments[i] is None:
+            missing.append(i)
+    if not missing:
+        return fragments
+
+    if author_id is not None and len(missing) > REVIEW_BATCH_SIZE:
+        comments = load_author_review_comments(cursor, author_id)
+    else:
+        comments = load_review_comments(cursor, [rows[i]['ReviewID'] for i in missing])
+    for i in missing:
+        r = rows[i]
+        review = serialize_review(r, comments.get(r['ReviewID'], []))
+        fragments[i] = dumps(review)
+        # a card still showing the original until its variant is ready would
+        # otherwise stay cached that way until the review next changes
+        if r.get('Version') is not None and all(upload_pipeline.variant_settled(u) for u in review['originals']):
+            review_fragments.set(r['ReviewID'], r['Version'], fragments[i])
+    return fragments
+
+REVIEW_PAGE_SIZE = 20
+REVIEW_PAGE_SIZE_MAX = 100
+
+# sort key -> ordering as (SQL expression, row key, direction). Every ordering
+# ends with ReviewID so keyset pages are stable when the sort values tie.
+REVIEW_SORTS = {
+    'newest': (('r.SubmissionDate', 'SubmissionDate', 'DESC'), ('r.ReviewID', 'ReviewID', 'DESC')),
+    'upvotes': (('r.UpvoteCount', 'UpvoteCount', 'DESC'), ('r.ReviewID', 'ReviewID', 'DESC')),
+    # popularity: first by upvotes then by rating
+    'popular': (('r.UpvoteCount', 'UpvoteCount', 'DESC'), ('r.Rating', 'Rating', 'DESC'), ('r.ReviewID', 'ReviewID', 'DESC')),
+    # reviews without a spice level sort (and page) as level 0
+    'spice_desc': (('COALESCE(r.SpiceLevel, 0)', 'SpiceLevel', 'DESC'), ('r.ReviewID', 'ReviewID', 'DESC')),
+    'spice_asc': (('COALESCE(r.SpiceLevel, 0)', 'SpiceLevel', 'ASC'), ('r.ReviewID', 'ReviewID', 'ASC')),
+    'price_asc': (('r.Price', 'Price', 'ASC'), ('r.ReviewID', 'ReviewID', 'ASC')),
+    'price_desc': (('r.Price', 'Price', 'DESC'), ('r.ReviewID', 'ReviewID', 'DESC')),
+}
+# accept both price_asc and price from frontend; no sort means newest first
+REVIEW_SORT_ALIASES = { '': 'newest', 'price': 'price_asc' }
+
+def encode_review_cursor(sort_key, order, row):
+    """Opaque cursor holding the sort values of the last row on a page."""
+    values = []
+    for _, row_key, _ in order:
+        v = row.get(row_key)
+        if v is None and row_key == 'SpiceLevel':
+            v = 0  # as COALESCE(r.SpiceLevel, 0) in REVIEW_SORTS
+        values.append(v if isinstance(v, (int, float)) else str(v))
+    raw = json.dumps({ 's': sort_key, 'k': values }, separators=(',', ':'))
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+# cursor values that encode_review_cursor stores as strings; the rest are numbers
+CURSOR_DATETIME_KEYS = { 'SubmissionDate', 'ActivityTime' }
+CURSOR_DECIMAL_KEYS = { 'Price' }
+
+def valid_cursor_value(row_key, value):
+    """True if `value` could have been written by encode_review_cursor for
+    the column `row_key` (so it is safe to bind as a query parameter)."""
+    if isinstance(value, bool):
+        return False
+    if row_key in CURSOR_DATETIME_KEYS:
+        if not isinstance(value, str):
+            return False
+        try:
+            datetime.fromisoformat(value)
+        except ValueError:
+            return False
+        return True
+    if row_key in CURSOR_DECIMAL_KEYS:
+        if isinstance(value, (int, float)):
+            return True
+        if not isinstance(value, str):
+            return False
+        try:
+            return Decimal(value).is_finite()
+        except InvalidOperation:
+            return False
+    return isinstance(value, int)
+
+def decode_review_cursor(token, sort_key, order):
+    """Return the cursor's sort values, or None if it is malformed, holds
+    values of the wrong type for its columns or was issued for a different
+    sort mode."""
+    try:
+        raw = base64.urlsafe_b64decode(token + '=' * (-len(token) % 4))
+        data = json.loads(raw)
+        values = data['k']
+    except Exception:
+        return None
+    if (not isinstance(data, dict) or data.get('s') != sort_key or not isinstance(values, list)
+            or len(values) != len(order)):
+        return None
+    if not all(valid_cursor_value(row_key, v) for (_, row_key, _), v in zip(order, values)):
+        return None
+    return values
+
+def keyset_predicate(order, values):
+    """Build "rows after `values`" for an ordering with mixed directions:
+    (a < x) OR (a = x AND b > y) OR ..."""
+    clauses = []
+    params = []
+    for i, (expr, _, direction) in enumerate(order):
+        parts = [f'{prev} = %s' for prev, _, _ in order[:i]]
+        parts.append(f"{expr} {'<' if direction == 'DESC' else '>'} %s")
+        clauses.append('(' + ' AND '.join(parts) + ')')
+        params.extend(values[:i + 1])
+    return '(' + ' OR '.join(clauses) + ')', params
+
 # API ENDPOINTS
+def canteen_image_url(url):
+    """Canteen pictures stored as /templates/public paths get their versioned URL."""
+    if url and url.startswith('/templates/public/'):
+        return public_url(url[len('/templates/public/'):])
+    return url or ''
+
 @app.route('/api/canteens')
+@query_budget(1)
 def api_canteens():
     """Return list of canteens as JSON."""
+    # the app never writes to canteens, so the list only changes on a restart
+    etag = api_etag('canteens')
+    unchanged = not_modified(etag, review_cache.started_at)
+    if unchanged is not None:
+        return unchanged
+
     conn = get_db_connection()
     try:
         with conn.cursor() as cursor:
@@ -250,15 +863,16 @@ def api_canteens():
                     'id': r.get('canteen_id'),
                     'name': r.get('name'),
                     'description': r.get('description') or '',
-                    'image_url': r.get('image_url') or '',
+                    'image_url': canteen_image_url(r.get('image_url')),
                     'location': r.get('location') or ''
                 })
     finally:
         conn.close()
 
-    return jsonify({ 'success': True, 'canteens': canteens })
+    return with_validators(jsonify({ 'success': True, 'canteens': canteens }), etag, review_cache.started_at)
 
 @app.route('/api/canteen_reviews')
+@query_budget(2)
 def api_canteen_reviews():
     """API endpoint to fetch reviews for a specific canteen as JSON."""
     canteen_id = request.args.get('canteen_id')
@@ -273,211 +887,128 @@ def api_canteen_reviews():
     # allow frontend to request different sort modes via ?sort=<key>
     # supported keys: upvotes, popular, spice_desc, spice_asc, newest, price_asc, price_desc
     sort_key = request.args.get('sort', '').lower()
+    sort_key = REVIEW_SORT_ALIASES.get(sort_key, sort_key)
+    if sort_key not in REVIEW_SORTS:
+        sort_key = 'newest'
+    if sort_key in ('upvotes', 'popular') and not schema.has_column('FoodReviews', 'UpvoteCount'):
+        # no index to page by upvotes without migration 001
+        sort_key = 'newest'
+    order = REVIEW_SORTS[sort_key]
 
-    # Use the SELECT aliases (Price, Rating, SpiceLevel, SubmissionDate) in ORDER BY
-    # to avoid ONLY_FULL_GROUP_BY related errors when grouping.
-    order_clause = 'SubmissionDate DESC'
-    if sort_key == 'upvotes':
-        order_clause = 'upvotes DESC'
-    elif sort_key == 'popular':
-        # popularity: first by upvotes then by rating
-        order_clause = 'upvotes DESC, Rating DESC'
-    elif sort_key == 'spice_desc':
-        order_clause = 'SpiceLevel DESC'
-    elif sort_key == 'spice_asc':
-        order_clause = 'SpiceLevel ASC'
-    elif sort_key in ('price_asc', 'price'):
-        # accept both price_asc and price from frontend
-        order_clause = 'Price ASC'
-    elif sort_key == 'price_desc':
-        order_clause = 'Price DESC'
-    elif sort_key == 'newest':
-        order_clause = 'SubmissionDate DESC'
+    try:
+        limit = int(request.args.get('limit') or REVIEW_PAGE_SIZE)
+    except Exception:
+        return jsonify({ 'success': False, 'error': 'invalid limit' }), 400
+    limit = max(1, min(limit, REVIEW_PAGE_SIZE_MAX))
+
+    after = None
+    if request.args.get('cursor'):
+        after = decode_review_cursor(request.args['cursor'], sort_key, order)
+        if after is None:
+            return jsonify({ 'success': False, 'error': 'invalid cursor' }), 400
+
+    cache_key = (sort_key, request.args.get('cursor') or '', limit)
+    cache_version = review_cache.version(canteen_id_int)
+    changed_at = review_cache.changed_at(canteen_id_int)
+    etag = api_etag('canteen_reviews', canteen_id_int, cache_version, *cache_key)
+    unchanged = not_modified(etag, changed_at)
+    if unchanged is not None:
+        return unchanged
+
+    cached = review_cache.get(canteen_id_int, cache_key)
+    if cached is not None:
+        return with_validators(json_response(cached), etag, changed_at)
+
+    if not schema.has_table('FoodReviews'):
+        app.logger.warning('FoodReviews table missing')
+        return jsonify({ 'success': True, 'reviews': [], 'next_cursor': None })
 
     conn = get_db_connection()
     results = []
+    next_cursor = None
     try:
         with conn.cursor() as cursor:
-            try:
-                # compute upvotes in the same query to avoid N+1 COUNT queries
-                # Use ANY_VALUE for non-aggregated columns to be safe with ONLY_FULL_GROUP_BY
-                sql = f"""
-                    SELECT
-                        r.ReviewID,
-                        ANY_VALUE(r.FoodName) AS FoodName,
-                        ANY_VALUE(r.Price) AS Price,
-                        ANY_VALUE(r.Rating) AS Rating,
-                        ANY_VALUE(r.SpiceLevel) AS SpiceLevel,
-                        ANY_VALUE(r.Review) AS Review,
-                        ANY_VALUE(r.ImagePaths) AS ImagePaths,
-                        ANY_VALUE(r.UserID) AS UserID,
-                        ANY_VALUE(r.CanteenID) AS CanteenID,
-                        ANY_VALUE(r.SubmissionDate) AS SubmissionDate,
-                        ANY_VALUE(u.username) AS username,
-                        COUNT(up.UpvoteID) AS upvotes
-                    FROM FoodReviews r
-                    LEFT JOIN users u ON r.UserID = u.user_id
-                    LEFT JOIN Upvotes up ON r.ReviewID = up.ReviewID
-                    WHERE r.CanteenID = %s
-                    GROUP BY r.ReviewID
-                    ORDER BY {order_clause}
-                """
-                cursor.execute(sql, (canteen_id_int,))
-            except pymysql.err.ProgrammingError as e:
-                if e.args and e.args[0] == 1146:
-                    app.logger.warning('FoodReviews or related table missing')
-                    return jsonify({ 'success': True, 'reviews': [] })
-                raise
+            params = [canteen_id_int]
+            keyset_sql = ''
+            if after is not None:
+                keyset_sql, keyset_params = keyset_predicate(order, after)
+                params += keyset_params
+            params.append(limit + 1)
+            order_sql = ', '.join(f'{expr} {direction}' for expr, _, direction in order)
+
+            # every ordering is served by an idx_reviews_canteen_* index
+            sql = f"""
+                SELECT r.*, u.username{review_counter_columns()}
+                FROM FoodReviews r
+                LEFT JOIN users u ON r.UserID = u.user_id
+                WHERE r.CanteenID = %s {'AND ' + keyset_sql if keyset_sql else ''}
+                ORDER BY {order_sql}
+                LIMIT %s
+            """
+            cursor.execute(sql, params)
 
             rows = cursor.fetchall()
-            app.logger.debug(f"Found {len(rows)} reviews for canteen {canteen_id_int} (sort={sort_key})")
-
-            for r in rows:
-                images = []
-                try:
-                    if r.get('ImagePaths'):
-                        parsed = json.loads(r['ImagePaths']) if isinstance(r['ImagePaths'], str) else r['ImagePaths']
-                        images = parsed if isinstance(parsed, list) else [parsed]
-                except Exception:
-                    if r.get('ImagePaths'):
-                        images = [p.strip() for p in (r['ImagePaths'] or '').split(',') if p.strip()]
-
-                if not images:
-                    images = ['https://images.unsplash.com/photo-1546069901-ba9599a7e63c?w=300&h=200&fit=crop']
-
-                upvotes_count = int(r.get('upvotes') or 0)
-
-                # load comments for this review (could be optimized to single query if needed)
-                comments_list = []
-                try:
-                    cursor.execute("SELECT c.CommentID, c.CommentText, c.CommentDate, u.username, c.UserID AS comment_user_id FROM Comments c LEFT JOIN users u ON c.UserID = u.user_id WHERE c.ReviewID = %s ORDER BY c.CommentDate ASC", (r['ReviewID'],))
-                    cm_rows = cursor.fetchall()
-                    for cr in cm_rows:
-                        comments_list.append({
-                            'id': cr.get('CommentID'),
-                            'author': cr.get('username'),
-                            'user_id': cr.get('comment_user_id'),
-                            'text': cr.get('CommentText'),
-                            'date': str(cr.get('CommentDate'))
-                        })
-                except pymysql.err.ProgrammingError as e:
-                    if not (e.args and e.args[0] == 1146):
-                        raise
-
-                results.append({
-                    'id': r['ReviewID'],
-                    'canteen_id': r.get('CanteenID'),
-                    'images': images,
-                    'image': images[0],
-                    'name': r.get('FoodName'),
-                    'rating': int(r.get('Rating') or 0),
-                    'price': float(r.get('Price') or 0.0),
-                    'spiceLevel': int(r.get('SpiceLevel') or 0),
-                    'author': r.get('username') or 'Unknown',
-                    'author_id': r.get('UserID'),
-                    'upvotes': upvotes_count,
-                    'review': r.get('Review') or '',
-                    'comments': comments_list
-                })
+            if len(rows) > limit:
+                rows = rows[:limit]
+                next_cursor = encode_review_cursor(sort_key, order, rows[-1])
+            results = encode_reviews(cursor, rows)
+    except (pymysql.err.ProgrammingError, pymysql.err.OperationalError):
+        raise  # see schema_changed
     except Exception as e:
         app.logger.exception('Error in api_canteen_reviews')
         return jsonify({ 'success': False, 'error': str(e) }), 500
     finally:
         conn.close()
 
-    return jsonify({ 'success': True, 'reviews': results })
+    body = encode_payload({ 'success': True, 'next_cursor': next_cursor }, results)
+    review_cache.set(canteen_id_int, cache_key, body, cache_version)
+    return with_validators(json_response(body), etag, changed_at)
 
 
 @app.route('/api/my_reviews')
+@query_budget(2)
 def api_my_reviews():
     """Return reviews created by the currently logged-in user."""
     if 'user_id' not in session:
         return jsonify({ 'success': False, 'error': 'not_logged_in' }), 401
 
     user_id = session['user_id']
+    version, changed_at = user_versions.get(user_id)
+    etag = api_etag('my_reviews', user_id, version)
+    unchanged = not_modified(etag, changed_at, private=True)
+    if unchanged is not None:
+        return unchanged
+
+    if not schema.has_table('FoodReviews'):
+        app.logger.warning('FoodReviews table missing')
+        return jsonify({ 'success': True, 'reviews': [] })
+
     conn = get_db_connection()
     results = []
     try:
         with conn.cursor() as cursor:
-            try:
-                cursor.execute("""
-                    SELECT r.*, u.username FROM FoodReviews r
-                    LEFT JOIN users u ON r.UserID = u.user_id
-                    WHERE r.UserID = %s
-                    ORDER BY r.SubmissionDate DESC
-                """, (user_id,))
-            except pymysql.err.ProgrammingError as e:
-                # Table might not exist yet
-                if e.args and e.args[0] == 1146:
-                    app.logger.warning('FoodReviews table missing')
-                    return jsonify({ 'success': True, 'reviews': [] })
-                raise
+            cursor.execute(f"""
+                SELECT r.*, u.username{review_counter_columns()} FROM FoodReviews r
+                LEFT JOIN users u ON r.UserID = u.user_id
+                WHERE r.UserID = %s
+                ORDER BY r.SubmissionDate DESC
+            """, (user_id,))
 
             rows = cursor.fetchall()
-            for r in rows:
-                images = []
-                try:
-                    if r.get('ImagePaths'):
-                        parsed = json.loads(r['ImagePaths']) if isinstance(r['ImagePaths'], str) else r['ImagePaths']
-                        images = parsed if isinstance(parsed, list) else [parsed]
-                except Exception:
-                    if r.get('ImagePaths'):
-                        images = [p.strip() for p in (r['ImagePaths'] or '').split(',') if p.strip()]
-
-                if not images:
-                    images = ['https://images.unsplash.com/photo-1546069901-ba9599a7e63c?w=300&h=200&fit=crop']
-
-                upvotes_count = 0
-                try:
-                    cursor.execute("SELECT COUNT(*) AS cnt FROM Upvotes WHERE ReviewID = %s", (r['ReviewID'],))
-                    cnt_row = cursor.fetchone()
-                    upvotes_count = cnt_row['cnt'] if cnt_row and 'cnt' in cnt_row else 0
-                except pymysql.err.ProgrammingError as e:
-                    if not (e.args and e.args[0] == 1146):
-                        raise
-
-                # load comments for this review
-                comments_list = []
-                try:
-                    cursor.execute("SELECT c.CommentID, c.CommentText, c.CommentDate, u.username, c.UserID AS comment_user_id FROM Comments c LEFT JOIN users u ON c.UserID = u.user_id WHERE c.ReviewID = %s ORDER BY c.CommentDate ASC", (r['ReviewID'],))
-                    cm_rows = cursor.fetchall()
-                    for cr in cm_rows:
-                        comments_list.append({
-                            'id': cr.get('CommentID'),
-                            'author': cr.get('username'),
-                            'user_id': cr.get('comment_user_id'),
-                            'text': cr.get('CommentText'),
-                            'date': str(cr.get('CommentDate'))
-                        })
-                except pymysql.err.ProgrammingError as e:
-                    if not (e.args and e.args[0] == 1146):
-                        raise
-
-                results.append({
-                    'id': r['ReviewID'],
-                    'canteen_id': r.get('CanteenID'),
-                    'images': images,
-                    'image': images[0],
-                    'name': r.get('FoodName'),
-                    'rating': int(r.get('Rating') or 0),
-                    'price': float(r.get('Price') or 0.0),
-                    'spiceLevel': int(r.get('SpiceLevel') or 0),
-                    'author': r.get('username') or 'Unknown',
-                    'author_id': r.get('UserID'),
-                    'upvotes': upvotes_count,
-                    'review': r.get('Review') or '',
-                    'comments': comments_list
-                })
+            results = encode_reviews(cursor, rows, author_id=user_id)
+    except (pymysql.err.ProgrammingError, pymysql.err.OperationalError):
+        raise  # see schema_changed
     except Exception as e:
         app.logger.exception('Error in api_my_reviews')
         return jsonify({ 'success': False, 'error': str(e) }), 500
     finally:
         conn.close()
 
-    return jsonify({ 'success': True, 'reviews': results })
+    return with_validators(json_response(encode_payload({ 'success': True }, results)), etag, changed_at, private=True)
 
 
 @app.route('/api/reviews_by_ids')
+@query_budget(2)
 def api_reviews_by_ids():
     """Return multiple reviews by a comma-separated list of ids provided in `ids` query param."""
     ids_raw = request.args.get('ids')
@@ -492,231 +1023,556 @@ def api_reviews_by_ids():
     if not ids:
         return jsonify({ 'success': True, 'reviews': [] })
 
+    if not schema.has_table('FoodReviews'):
+        app.logger.warning('FoodReviews table missing')
+        return jsonify({ 'success': True, 'reviews': [] })
+
     conn = get_db_connection()
     results = []
     try:
         with conn.cursor() as cursor:
-            try:
-                sql = f"SELECT r.*, u.username FROM FoodReviews r LEFT JOIN users u ON r.UserID = u.user_id WHERE r.ReviewID IN ({', '.join(['%s']*len(ids))}) ORDER BY FIELD(r.ReviewID, {', '.join(['%s']*len(ids))})"
-                params = ids + ids
-                cursor.execute(sql, params)
-            except pymysql.err.ProgrammingError as e:
-                if e.args and e.args[0] == 1146:
-                    app.logger.warning('FoodReviews table missing')
-                    return jsonify({ 'success': True, 'reviews': [] })
-                raise
+            sql = f"SELECT r.*, u.username{review_counter_columns()} FROM FoodReviews r LEFT JOIN users u ON r.UserID = u.user_id WHERE r.ReviewID IN ({', '.join(['%s']*len(ids))}) ORDER BY FIELD(r.ReviewID, {', '.join(['%s']*len(ids))})"
+            params = ids + ids
+            cursor.execute(sql, params)
 
             rows = cursor.fetchall()
-            for r in rows:
-                images = []
-                try:
-                    if r.get('ImagePaths'):
-                        parsed = json.loads(r['ImagePaths']) if isinstance(r['ImagePaths'], str) else r['ImagePaths']
-                        images = parsed if isinstance(parsed, list) else [parsed]
-                except Exception:
-                    if r.get('ImagePaths'):
-                        images = [p.strip() for p in (r['ImagePaths'] or '').split(',') if p.strip()]
+            results = encode_reviews(cursor, rows)
+    except (pymysql.err.ProgrammingError, pymysql.err.OperationalError):
+        raise  # see schema_changed
+    except Exception as e:
+        app.logger.exception('Error in api_reviews_by_ids')
+        return jsonify({ 'success': False, 'error': str(e) }), 500
+    finally:
+        conn.close()
 
-                if not images:
-                    images = ['https://images.unsplash.com/photo-1546069901-ba9599a7e63c?w=300&h=200&fit=crop']
+    return json_response(encode_payload({ 'success': True }, results))
+
+SEARCH_PAGE_SIZE = 20
+SEARCH_MAX_TERMS = 8
+# deep OFFSET pages get expensive; nobody pages this far through search hits
+SEARCH_MAX_OFFSET = 1000
+
+# InnoDB's default full-text stopword list (INFORMATION_SCHEMA.INNODB_FT_DEFAULT_STOPWORD)
+FULLTEXT_STOPWORDS = frozenset('''
+    a about an are as at be by com de en for from how i in is it la of on or
+    that the this to was what when where who will with und www
+'''.split())
+
+def fulltext_query(text):
+    """Turn free text into a BOOLEAN MODE query: every word is required and
+    matches as a prefix, so "chick bir" finds "Chicken Biryani". Words the
+    index never holds (stopwords, shorter than SEARCH_MIN_TOKEN_SIZE) are
+    left out, as a required one would match nothing."""
+    min_size = app.config['SEARCH_MIN_TOKEN_SIZE']
+    terms = [t for t in re.findall(r'\w+', (text or '').lower())
+             if len(t) >= min_size and t not in FULLTEXT_STOPWORDS][:SEARCH_MAX_TERMS]
+    return ' '.join(f'+{t}*' for t in terms)
+
+@app.route('/api/search')
+@query_budget(2)
+def api_search():
+    """Ranked full-text search over dish names and review text.
+
+    Query params: q (required), canteen_id, min_price, max_price, min_rating,
+    spice (exact level), page (1-based) and limit. Served by the FULLTEXT
+    indexes from migrations/002_review_search.sql.
+    """
+    q = request.args.get('q') or ''
+    if not re.search(r'\w', q):
+        return jsonify({ 'success': False, 'error': 'q required' }), 400
+    match = fulltext_query(q)
+    if not match:
+        return jsonify({ 'success': False,
+                         'error': f'search words must be at least {app.config["SEARCH_MIN_TOKEN_SIZE"]} letters '
+                                  f'and not stopwords' }), 400
+
+    filters = []
+    params = []
+    for arg, column, op, cast in (
+        ('canteen_id', 'r.CanteenID', '=', int),
+        ('min_price', 'r.Price', '>=', float),
+        ('max_price', 'r.Price', '<=', float),
+        ('min_rating', 'r.Rating', '>=', int),
+        ('spice', 'r.SpiceLevel', '=', int),
+    ):
+        value = request.args.get(arg)
+        if value in (None, ''):
+            continue
+        try:
+            params.append(cast(value))
+        except Exception:
+            return jsonify({ 'success': False, 'error': f'invalid {arg}' }), 400
+        filters.append(f'{column} {op} %s')
 
-                upvotes_count = 0
-                try:
-                    cursor.execute("SELECT COUNT(*) AS cnt FROM Upvotes WHERE ReviewID = %s", (r['ReviewID'],))
-                    cnt_row = cursor.fetchone()
-                    upvotes_count = cnt_row['cnt'] if cnt_row and 'cnt' in cnt_row else 0
-                except pymysql.err.ProgrammingError as e:
-                    if not (e.args and e.args[0] == 1146):
-                        raise
+    try:
+        limit = max(1, min(int(request.args.get('limit') or SEARCH_PAGE_SIZE), REVIEW_PAGE_SIZE_MAX))
+        page = max(1, int(request.args.get('page') or 1))
+    except Exception:
+        return jsonify({ 'success': False, 'error': 'invalid page or limit' }), 400
+    offset = (page - 1) * limit
+    if offset > SEARCH_MAX_OFFSET:
+        return jsonify({ 'success': False, 'error': 'page too deep; refine the query' }), 400
 
-                # load comments for this review
-                comments_list = []
-                try:
-                    cursor.execute("SELECT c.CommentID, c.CommentText, c.CommentDate, u.username, c.UserID AS comment_user_id FROM Comments c LEFT JOIN users u ON c.UserID = u.user_id WHERE c.ReviewID = %s ORDER BY c.CommentDate ASC", (r['ReviewID'],))
-                    cm_rows = cursor.fetchall()
-                    for cr in cm_rows:
-                        comments_list.append({
-                            'id': cr.get('CommentID'),
-                            'author': cr.get('username'),
-                            'user_id': cr.get('comment_user_id'),
-                            'text': cr.get('CommentText'),
-                            'date': str(cr.get('CommentDate'))
-                        })
-                except pymysql.err.ProgrammingError as e:
-                    if not (e.args and e.args[0] == 1146):
-                        raise
+    if not schema.has_index('FoodReviews', 'ft_reviews_text'):
+        app.logger.warning('Search index missing; apply migrations/002_review_search.sql')
+        return jsonify({ 'success': False, 'error': 'search_unavailable' }), 503
 
-                results.append({
-                    'id': r['ReviewID'],
-                    'canteen_id': r.get('CanteenID'),
-                    'images': images,
-                    'image': images[0],
-                    'name': r.get('FoodName'),
-                    'rating': int(r.get('Rating') or 0),
-                    'price': float(r.get('Price') or 0.0),
-                    'spiceLevel': int(r.get('SpiceLevel') or 0),
-                    'author': r.get('username') or 'Unknown',
-                    'author_id': r.get('UserID'),
-                    'upvotes': upvotes_count,
-                    'review': r.get('Review') or '',
-                    'comments': comments_list
-                })
+    conn = get_db_connection()
+    results = []
+    has_more = False
+    try:
+        with conn.cursor() as cursor:
+            # hits in the dish name count double
+            cursor.execute(f"""
+                SELECT r.*, u.username{review_counter_columns()},
+                       2 * MATCH(r.FoodName) AGAINST (%s IN BOOLEAN MODE)
+                         + MATCH(r.FoodName, r.Review) AGAINST (%s IN BOOLEAN MODE) AS score
+                FROM FoodReviews r
+                LEFT JOIN users u ON r.UserID = u.user_id
+                WHERE MATCH(r.FoodName, r.Review) AGAINST (%s IN BOOLEAN MODE)
+                  {''.join(' AND ' + f for f in filters)}
+                ORDER BY score DESC, r.ReviewID DESC
+                LIMIT %s OFFSET %s
+            """, [match, match, match] + params + [limit + 1, offset])
+
+            rows = cursor.fetchall()
+            has_more = len(rows) > limit
+            rows = rows[:limit]
+            results = [with_members(fragment, score=round(float(r.get('score') or 0), 4))
+                       for fragment, r in zip(encode_reviews(cursor, rows), rows)]
+    except (pymysql.err.ProgrammingError, pymysql.err.OperationalError):
+        raise  # see schema_changed
     except Exception as e:
-        app.logger.exception('Error in api_reviews_by_ids')
+        app.logger.exception('Error in api_search')
         return jsonify({ 'success': False, 'error': str(e) }), 500
     finally:
         conn.close()
 
-    return jsonify({ 'success': True, 'reviews': results })
+    return json_response(encode_payload({
+        'success': True,
+        'page': page,
+        'next_page': page + 1 if has_more else None
+    }, results))
+
+DISH_SORTS = {
+    'reviews': 'ReviewCount DESC, FoodKey',
+    'rating': 'AvgRating DESC, ReviewCount DESC, FoodKey',
+    'price_asc': 'MedianPrice ASC, FoodKey',
+    'price_desc': 'MedianPrice DESC, FoodKey',
+    'name': 'FoodKey',
+}
+
+def _decimal(value):
+    return float(value) if value is not None else None
+
+@app.route('/api/dishes')
+@query_budget(1)
+def api_dishes():
+    """Menu summary for one canteen: per-dish review count, ratings, spice and
+    prices, read from the DishStats table (see migrations/003_dish_stats.sql)."""
+    try:
+        canteen_id = int(request.args.get('canteen_id', ''))
+    except Exception:
+        return jsonify({ 'success': False, 'error': 'canteen_id required' }), 400
+    sort_key = request.args.get('sort', 'reviews').lower()
+    order_clause = DISH_SORTS.get(sort_key, DISH_SORTS['reviews'])
+
+    # DishStats only changes when this canteen's reviews do
+    changed_at = review_cache.changed_at(canteen_id)
+    etag = api_etag('dishes', canteen_id, review_cache.version(canteen_id), order_clause)
+    unchanged = not_modified(etag, changed_at)
+    if unchanged is not None:
+        return unchanged
+
+    if not schema.has_table('DishStats'):
+        app.logger.warning('DishStats table missing; apply migrations/003_dish_stats.sql')
+        return jsonify({ 'success': True, 'dishes': [] })
+
+    conn = get_db_connection()
+    try:
+        with conn.cursor() as cursor:
+            cursor.execute(f"""
+                SELECT FoodKey, FoodName, ReviewCount, RatingSum, AvgRating, AvgSpice,
+                       MinPrice, MaxPrice, MedianPrice
+                FROM DishStats
+                WHERE CanteenID = %s
+                ORDER BY {order_clause}
+            """, (canteen_id,))
+            rows = cursor.fetchall()
+    finally:
+        conn.close()
+
+    dishes = [{
+        'key': r['FoodKey'],
+        'name': r['FoodName'],
+        'reviews': r['ReviewCount'],
+        'rating_sum': r['RatingSum'],
+        'avg_rating': _decimal(r['AvgRating']),
+        'avg_spice': _decimal(r['AvgSpice']),
+        'min_price': _decimal(r['MinPrice']),
+        'max_price': _decimal(r['MaxPrice']),
+        'median_price': _decimal(r['MedianPrice'])
+    } for r in rows]
+    return with_validators(jsonify({ 'success': True, 'canteen_id': canteen_id, 'dishes': dishes }), etag, changed_at)
+
+@app.route('/api/recommendations')
+@query_budget(0)
+def api_recommendations():
+    """Dishes the current user has not reviewed, ranked by how often people
+    with similar reviews, upvotes and favorites liked them. Served from the
+    lists the recommender precomputes; guests and users without any activity
+    get the most popular dishes (personalized: false)."""
+    try:
+        limit = min(max(int(request.args.get('limit', 10)), 1), app.config['RECOMMEND_TOP_N'])
+    except ValueError:
+        return jsonify({ 'success': False, 'error': 'invalid limit' }), 400
+
+    dishes, personalized = recommender.recommend(session.get('user_id'), limit)
+    return jsonify({
+        'success': True,
+        'ready': recommender.ready,
+        'personalized': personalized,
+        'recommendations': dishes
+    })
+
+# grain -> (default span, longest span one request may ask for)
+ANALYTICS_SPANS = {
+    'hour': (timedelta(hours=48), timedelta(days=31)),
+    'day': (timedelta(days=30), timedelta(days=3 * 366)),
+}
+
+def _rollup_point(row):
+    n = row['ReviewCount']
+    return {
+        'reviews': n,
+        'avg_rating': round(row['RatingSum'] / n, 2) if n else None,
+        'avg_price': round(float(row['PriceSum']) / n, 2) if n else None,
+        'upvotes': row['UpvoteCount'],
+    }
+
+@app.route('/api/analytics/canteen/<int:canteen_id>')
+@query_budget(2)
+def api_canteen_analytics(canteen_id):
+    """Time series of one canteen's reviews, average rating and price,
+    upvotes and active users per hour or day (?grain=), over [from, to)
+    (ISO dates or datetimes), read from the CanteenRollups table (see
+    analytics.py). Buckets without activity are left out."""
+    grain = request.args.get('grain', 'day').lower()
+    if grain not in ANALYTICS_SPANS:
+        return jsonify({ 'success': False, 'error': 'grain must be hour or day' }), 400
+    default_span, max_span = ANALYTICS_SPANS[grain]
+    try:
+        end = datetime.fromisoformat(request.args['to']) if request.args.get('to') else datetime.now()
+        start = datetime.fromisoformat(request.args['from']) if request.args.get('from') else end - default_span
+    except ValueError:
+        return jsonify({ 'success': False, 'error': 'from / to must be ISO dates' }), 400
+    if start.tzinfo or end.tzinfo:
+        return jsonify({ 'success': False, 'error': 'from / to must not carry a time zone' }), 400
+    if not start < end:
+        return jsonify({ 'success': False, 'error': 'from must be before to' }), 400
+    if end - start > max_span:
+        return jsonify({ 'success': False, 'error': f'at most {max_span.days} days per request at {grain} grain' }), 400
+
+    if not schema.has_table('CanteenRollups'):
+        app.logger.warning('CanteenRollups missing; apply migrations/008_canteen_rollups.sql')
+        return jsonify({ 'success': False, 'error': 'analytics_unavailable' }), 503
+
+    conn = get_db_connection()
+    try:
+        with conn.cursor() as cursor:
+            cursor.execute("""
+                SELECT BucketStart, ReviewCount, RatingSum, PriceSum, UpvoteCount, ActiveUsers
+                FROM CanteenRollups
+                WHERE CanteenID = %s AND Grain = %s AND BucketStart >= %s AND BucketStart < %s
+                ORDER BY BucketStart
+            """, (canteen_id, grain, start, end))
+            rows = cursor.fetchall()
+            if not rows:
+                cursor.execute("SELECT canteen_id FROM canteens WHERE canteen_id = %s", (canteen_id,))
+                if cursor.fetchone() is None:
+                    return jsonify({ 'success': False, 'error': 'unknown canteen_id' }), 404
+    finally:
+        conn.close()
+
+    points = [dict(_rollup_point(r), bucket=r['BucketStart'].isoformat(), active_users=r['ActiveUsers'])
+              for r in rows]
+    totals = _rollup_point({
+        'ReviewCount': sum(r['ReviewCount'] for r in rows),
+        'RatingSum': sum(r['RatingSum'] for r in rows),
+        'PriceSum': sum(float(r['PriceSum']) for r in rows),
+        'UpvoteCount': sum(r['UpvoteCount'] for r in rows),
+    })
+    return jsonify({
+        'success': True,
+        'canteen_id': canteen_id,
+        'grain': grain,
+        'from': start.isoformat(),
+        'to': end.isoformat(),
+        'points': points,
+        'totals': totals
+    })
+
+@app.route('/api/stream')
+@query_budget(1)
+def api_stream():
+    """Server-sent events with live changes to one canteen's reviews.
+
+    Events: review (new review id; fetch it via /api/reviews_by_ids),
+    counter (new upvotes or favorites count), comment, comment_deleted,
+    review_deleted, and reset (missed events; reload the list). Without
+    canteen_id the stream carries every canteen's events.
+    """
+    channel = None
+    canteen_id = request.args.get('canteen_id')
+    if canteen_id:
+        try:
+            channel = int(canteen_id)
+        except ValueError:
+            return jsonify({ 'success': False, 'error': 'invalid canteen_id' }), 400
+        conn = get_db_connection()
+        try:
+            with conn.cursor() as cursor:
+                cursor.execute("SELECT canteen_id FROM canteens WHERE canteen_id = %s", (channel,))
+                if cursor.fetchone() is None:
+                    return jsonify({ 'success': False, 'error': 'unknown canteen_id' }), 404
+        finally:
+            # the stream may stay open for minutes; do not hold a pooled connection
+            conn.close()
+
+    try:
+        events = event_hub.stream(ALL_CANTEENS if channel is None else channel, request.headers.get('Last-Event-ID'))
+    except HubFull:
+        resp = jsonify({ 'success': False, 'error': 'too many open streams' })
+        resp.headers['Retry-After'] = '30'
+        return resp, 503
+
+    return Response(events, mimetype='text/event-stream', headers={
+        'Cache-Control': 'no-cache',
+        'X-Accel-Buffering': 'no'  # stop nginx from buffering the stream
+    })
+
+@app.route('/metrics')
+@query_budget(0)
+def prometheus_metrics():
+    """Per-route latency, SQL and response size metrics for Prometheus."""
+    if not app.config['METRICS_ENABLED']:
+        return jsonify({ 'success': False, 'error': 'metrics are disabled' }), 404
+    return Response(request_metrics.render(), content_type='text/plain; version=0.0.4; charset=utf-8')
+
+@app.route('/api/stats')
+@query_budget(0)
+def api_stats():
+    """Runtime counters for the connection pool, review caches, upload pipeline,
+    file serving, activity write-behind queue, live update streams, response compression,
+    the page shell, the recommendation builds, the analytics rollups and the
+    schema probe."""
+    return jsonify({
+        'success': True,
+        'pool': db_pool.stats(),
+        'review_cache': review_cache.stats(),
+        'review_fragments': review_fragments.stats(),
+        'uploads': upload_pipeline.stats(),
+        'files': file_server.stats(),
+        'activity_log': activity_log.stats(),
+        'streams': event_hub.stats(),
+        'compression': compressor.stats(),
+        'page_shell': page_shell.stats(),
+        'recommendations': recommender.stats(),
+        'analytics': rollup_job.stats(),
+        'schema': schema.stats()
+    })
+
+@app.route('/api/health')
+@query_budget(0)
+def api_health():
+    """Database reachability and schema drift against the base schema and
+    migrations/ (from the cached probe; ?refresh=1 probes now)."""
+    if request.args.get('refresh'):
+        schema.probe()
+    report = schema.report()
+    if not report['probed'] or report['last_error']:
+        return jsonify(dict(report, success=False, status='unavailable')), 503
+    return jsonify(dict(report, success=True, status='degraded' if report['drift'] else 'ok'))
 
 @app.route('/api/me')
+@query_budget(3)
 def api_me():
     if 'user_id' not in session:
         return jsonify({ 'logged_in': False })
 
     user_id = session['user_id']
+    version, changed_at = user_versions.get(user_id)
+    etag = api_etag('me', user_id, version)
+    unchanged = not_modified(etag, changed_at, private=True)
+    if unchanged is not None:
+        return unchanged
+
     conn = get_db_connection()
     try:
         with conn.cursor() as cursor:
-            cursor.execute("SELECT username, profile_image_url FROM users WHERE user_id = %s", (user_id,))
+            cursor.execute("SELECT username, email, profile_image_url FROM users WHERE user_id = %s", (user_id,))
             user = cursor.fetchone() or {}
             
             favs = []
             ups = []
-            try:
+            if schema.has_table('Favorites'):
                 cursor.execute("SELECT ReviewID FROM Favorites WHERE UserID = %s", (user_id,))
                 favs = [r['ReviewID'] for r in cursor.fetchall()]
-            except pymysql.err.ProgrammingError as e:
-                if e.args and e.args[0] != 1146:
-                    raise
 
-            try:
+            if schema.has_table('Upvotes'):
                 cursor.execute("SELECT ReviewID FROM Upvotes WHERE UserID = %s", (user_id,))
                 ups = [r['ReviewID'] for r in cursor.fetchall()]
-            except pymysql.err.ProgrammingError as e:
-                if e.args and e.args[0] != 1146:
-                    raise
     finally:
         conn.close()
 
-    return jsonify({
+    return with_validators(jsonify({
         'logged_in': True,
         'user_id': user_id,
         'username': user.get('username'),
-        'profile_image_url': user.get('profile_image_url'),
+        'email': user.get('email'),
+        'profile_image_url': upload_pipeline.variant_url(user.get('profile_image_url'), 'thumb'),
         'favorites': favs,
         'upvoted': ups
-    })
+    }), etag, changed_at, private=True)
+
+# kind -> (table, counter column, procedure from migrations/005_toggle_procedures.sql)
+INTERACTIONS = {
+    'upvote': ('Upvotes', 'UpvoteCount', 'ToggleUpvote'),
+    'favorite': ('Favorites', 'FavoriteCount', 'ToggleFavorite'),
+}
+# statements toggle_interaction runs per toggle without the 005 procedures
+TOGGLE_FALLBACK_STATEMENTS = 4
+# kind -> counter name in /upvote, /favorite responses and stream events
+INTERACTION_COUNTS = { 'upvote': 'upvotes', 'favorite': 'favorites' }
+# max actions per /api/interactions request
+INTERACTION_BATCH_MAX = 50
+
+def toggle_interaction(cursor, kind, user_id, review_id, active=None):
+    """Flip (active=None) or set a user's upvote / favorite on a review.
+
+    Returns {'active', 'total', 'CanteenID', 'UserID'} with the new state and
+    counter, or None if the review does not exist. The stored procedure does
+    it in one round trip with the review row locked; a database without
+    migration 005 gets the same result from separate statements. The
+    own-review triggers raise errno 1644 either way.
+    """
+    table, counter, procedure = INTERACTIONS[kind]
+    if schema.has_routine(procedure):
+        cursor.execute(f"CALL {procedure}(%s, %s, %s)", (user_id, review_id, active))
+        row = cursor.fetchone()
+        while cursor.nextset():
+            pass
+        if row is not None:
+            row['active'] = bool(row['active'])
+        return row
+
+    # up to 4 statements instead of the one CALL the views budget for
+    extend_query_budget(TOGGLE_FALLBACK_STATEMENTS - 1)
+    cursor.execute("SELECT ReviewID FROM FoodReviews WHERE ReviewID = %s FOR UPDATE", (review_id,))
+    if cursor.fetchone() is None:
+        return None
+    deleted = 0
+    if not active:
+        cursor.execute(f"DELETE FROM {table} WHERE UserID = %s AND ReviewID = %s", (user_id, review_id))
+        deleted = cursor.rowcount
+    if active or (active is None and deleted == 0):
+        try:
+            cursor.execute(f"INSERT INTO {table} (UserID, ReviewID) VALUES (%s, %s)", (user_id, review_id))
+        except pymysql.err.IntegrityError as e:
+            # 1062: already set (active=True)
+            if not (e.args and e.args[0] == 1062):
+                raise
+    cursor.execute(f"SELECT {review_counter(counter, 'FoodReviews')} AS total, CanteenID, UserID FROM FoodReviews "
+                   f"WHERE ReviewID = %s", (review_id,))
+    row = cursor.fetchone()
+    row['active'] = bool(active) if active is not None else deleted == 0
+    return row
 
 @app.route('/upvote/<int:review_id>', methods=['POST'])
+@query_budget(1)  # one CALL; toggle_interaction extends it before migration 005
 def upvote_review(review_id):
     if 'user_id' not in session:
         return jsonify({"error": "Unauthorized"}), 401
 
     user_id = session['user_id']
+    if not schema.has_table('Upvotes'):
+        return jsonify({ 'success': False, 'error': 'Upvotes table does not exist' }), 500
     conn = get_db_connection()
     try:
         with conn.cursor() as cursor:
             try:
-                cursor.execute("SELECT * FROM Upvotes WHERE UserID = %s AND ReviewID = %s", (user_id, review_id))
-            except pymysql.err.ProgrammingError as e:
-                if e.args and e.args[0] == 1146:
-                    return jsonify({ 'success': False, 'error': 'Upvotes table does not exist' }), 500
+                row = toggle_interaction(cursor, 'upvote', user_id, review_id)
+            except pymysql.err.OperationalError as e:
+                # MySQL SIGNAL uses SQLSTATE '45000' and returns errno 1644 in PyMySQL
+                app.logger.debug('Upvote toggle failed: %s', e)
+                if e.args and e.args[0] == 1644:
+                    # Friendly response for UI
+                    return jsonify({ 'success': False, 'error': 'You cannot upvote your own review' }), 400
                 raise
-            exists = cursor.fetchone() is not None
-            if exists:
-                cursor.execute("DELETE FROM Upvotes WHERE UserID = %s AND ReviewID = %s", (user_id, review_id))
-                # remove corresponding activity rows (best-effort)
-                try:
-                    cursor.execute("DELETE FROM UserActivity WHERE UserID = %s AND PostID = %s AND ActivityType = %s", (user_id, review_id, 'upvote'))
-                except Exception:
-                    app.logger.exception('Failed to delete UserActivity for upvote')
-                upvoted = False
-            else:
-                try:
-                    cursor.execute("INSERT INTO Upvotes (UserID, ReviewID) VALUES (%s, %s)", (user_id, review_id))
-                except pymysql.err.OperationalError as e:
-                    # MySQL SIGNAL uses SQLSTATE '45000' and returns errno 1644 in PyMySQL
-                    msg = str(e)
-                    app.logger.debug('Upvote insert failed: %s', msg)
-                    if (hasattr(e, 'args') and len(e.args) > 0 and e.args[0] == 1644) or 'Cannot upvote' in msg:
-                        # Friendly response for UI
-                        conn.close()
-                        return jsonify({ 'success': False, 'error': 'You cannot upvote your own review' }), 400
-                    raise
-
-                # add activity row
-                try:
-                    cursor.execute("INSERT INTO UserActivity (UserID, PostID, ActivityType) VALUES (%s, %s, %s)", (user_id, review_id, 'upvote'))
-                except Exception:
-                    app.logger.exception('Failed to insert UserActivity for upvote')
-                upvoted = True
-
-            cursor.execute("SELECT COUNT(*) AS cnt FROM Upvotes WHERE ReviewID = %s", (review_id,))
-            upvotes_count = cursor.fetchone()['cnt']
+            if row is None:
+                return jsonify({ 'success': False, 'error': 'Review not found' }), 404
         conn.commit()
     finally:
         conn.close()
 
+    # activity rows are written behind the response
+    if row['active']:
+        activity_log.record(user_id, review_id, 'upvote')
+    else:
+        activity_log.remove(user_id, review_id, 'upvote')
+    recommender.observe(user_id, review_id, 'upvote', row['active'])
+    invalidate_canteen(row['CanteenID'])
+    invalidate_users(user_id, row['UserID'])
+    publish_event(row['CanteenID'], 'counter', review_id=review_id, upvotes=row['total'])
+
     return jsonify({
         'success': True,
-        'upvoted': upvoted,
-        'upvotes': upvotes_count
+        'upvoted': row['active'],
+        'upvotes': row['total']
     })
 
 @app.route('/favorite/<int:review_id>', methods=['POST'])
+@query_budget(1)  # one CALL; toggle_interaction extends it before migration 005
 def favorite_review(review_id):
     if 'user_id' not in session:
         return jsonify({"error": "Unauthorized"}), 401
 
     user_id = session['user_id']
+    if not schema.has_table('Favorites'):
+        return jsonify({ 'success': False, 'error': 'Favorites table does not exist' }), 500
     conn = get_db_connection()
     try:
         with conn.cursor() as cursor:
             try:
-                cursor.execute("SELECT * FROM Favorites WHERE UserID = %s AND ReviewID = %s", (user_id, review_id))
-            except pymysql.err.ProgrammingError as e:
-                if e.args and e.args[0] == 1146:
-                    return jsonify({ 'success': False, 'error': 'Favorites table does not exist' }), 500
+                row = toggle_interaction(cursor, 'favorite', user_id, review_id)
+            except pymysql.err.OperationalError as e:
+                app.logger.debug('Favorite toggle failed: %s', e)
+                if e.args and e.args[0] == 1644:
+                    return jsonify({ 'success': False, 'error': 'You cannot favorite your own review' }), 400
                 raise
-            exists = cursor.fetchone() is not None
-            if exists:
-                cursor.execute("DELETE FROM Favorites WHERE UserID = %s AND ReviewID = %s", (user_id, review_id))
-                try:
-                    cursor.execute("DELETE FROM UserActivity WHERE UserID = %s AND PostID = %s AND ActivityType = %s", (user_id, review_id, 'favorite'))
-                except Exception:
-                    app.logger.exception('Failed to delete UserActivity for favorite')
-                favorited = False
-            else:
-                try:
-                    cursor.execute("INSERT INTO Favorites (UserID, ReviewID) VALUES (%s, %s)", (user_id, review_id))
-                except pymysql.err.OperationalError as e:
-                    msg = str(e)
-                    app.logger.debug('Favorite insert failed: %s', msg)
-                    if (hasattr(e, 'args') and len(e.args) > 0 and e.args[0] == 1644) or 'Cannot favorite' in msg:
-                        conn.close()
-                        return jsonify({ 'success': False, 'error': 'You cannot favorite your own review' }), 400
-                    raise
-
-                try:
-                    cursor.execute("INSERT INTO UserActivity (UserID, PostID, ActivityType) VALUES (%s, %s, %s)", (user_id, review_id, 'favorite'))
-                except Exception:
-                    app.logger.exception('Failed to insert UserActivity for favorite')
-                favorited = True
-
-            cursor.execute("SELECT COUNT(*) AS cnt FROM Favorites WHERE ReviewID = %s", (review_id,))
-            favorites_count = cursor.fetchone()['cnt']
+            if row is None:
+                return jsonify({ 'success': False, 'error': 'Review not found' }), 404
         conn.commit()
     finally:
         conn.close()
 
+    if row['active']:
+        activity_log.record(user_id, review_id, 'favorite')
+    else:
+        activity_log.remove(user_id, review_id, 'favorite')
+    recommender.observe(user_id, review_id, 'favorite', row['active'])
+    invalidate_canteen(row['CanteenID'])
+    invalidate_users(user_id, row['UserID'])
+    publish_event(row['CanteenID'], 'counter', review_id=review_id, favorites=row['total'])
+
     return jsonify({
         'success': True,
-        'favorited': favorited,
-        'favorites': favorites_count
+        'favorited': row['active'],
+        'favorites': row['total']
     })
 
 @app.route('/comment/<int:review_id>', methods=['POST'])
+@query_budget(2)
 def post_comment(review_id):
     if 'user_id' not in session:
         return jsonify({ 'success': False, 'error': 'Unauthorized' }), 401
@@ -734,18 +1590,133 @@ def post_comment(review_id):
                 VALUES (%s, %s, %s)
             """, (review_id, user_id, comment_text))
             comment_id = cursor.lastrowid
-            try:
-                cursor.execute("INSERT INTO UserActivity (UserID, PostID, ActivityType) VALUES (%s, %s, %s)", (user_id, review_id, 'comment'))
-            except Exception:
-                app.logger.exception('Failed to insert UserActivity for comment')
+            cursor.execute("SELECT CanteenID, UserID FROM FoodReviews WHERE ReviewID = %s", (review_id,))
+            row = cursor.fetchone()
+        conn.commit()
+    finally:
+        conn.close()
+
+    activity_log.record(user_id, review_id, 'comment', comment_id)
+    comment = new_comment(comment_id, comment_text)
+    if row:
+        invalidate_canteen(row['CanteenID'])
+        invalidate_users(row['UserID'])
+        publish_event(row['CanteenID'], 'comment', review_id=review_id, comment=comment)
+
+    return jsonify({ 'success': True, 'message': 'Comment posted successfully', 'comment': comment })
+
+
+@app.route('/api/interactions', methods=['POST'])
+# a comment is an INSERT and a SELECT, a toggle one CALL
+@query_budget(2 * INTERACTION_BATCH_MAX, repeats=INTERACTION_BATCH_MAX)
+def api_interactions():
+    """Apply a batch of upvote / favorite / comment actions in one transaction.
+
+    Body: {"actions": [{"type": "upvote" | "favorite", "review_id": 1, "active": true | false | null},
+                       {"type": "comment", "review_id": 1, "text": "..."}]}
+    `active` sets the state (null flips it), so the frontend can send the
+    final state of rapid clicks instead of one request per click. Actions run
+    in order; one that cannot apply (own review, missing review, empty
+    comment) gets an error in its result without stopping the others, while
+    any other database error rolls the whole batch back.
+    """
+    if 'user_id' not in session:
+        return jsonify({ 'success': False, 'error': 'Unauthorized' }), 401
+
+    payload = request.get_json(silent=True)
+    actions = payload.get('actions') if isinstance(payload, dict) else None
+    if not isinstance(actions, list) or not actions:
+        return jsonify({ 'success': False, 'error': 'actions must be a non-empty list' }), 400
+    if len(actions) > INTERACTION_BATCH_MAX:
+        return jsonify({ 'success': False, 'error': f'at most {INTERACTION_BATCH_MAX} actions per request' }), 400
+    for a in actions:
+        if (not isinstance(a, dict) or a.get('type') not in ('upvote', 'favorite', 'comment')
+                or not isinstance(a.get('review_id'), int) or isinstance(a.get('review_id'), bool)
+                or not isinstance(a.get('active'), (bool, type(None)))
+                or not isinstance(a.get('text'), (str, type(None)))):
+            return jsonify({ 'success': False, 'error': 'invalid action' }), 400
+
+    user_id = session['user_id']
+    results = []
+    applied = []  # (kind, review_id, active, comment_id) for the activity log
+    touched = []  # FoodReviews rows whose listings / owners to invalidate
+    events = []  # (canteen_id, event, data) for /api/stream
+    conn = get_db_connection()
+    try:
+        with conn.cursor() as cursor:
+            for a in actions:
+                kind, review_id = a['type'], a['review_id']
+                result = { 'type': kind, 'review_id': review_id }
+                results.append(result)
+                try:
+                    if kind == 'comment':
+                        text = a.get('text') or ''
+                        if not text.strip():
+                            result.update({ 'success': False, 'error': 'Comment cannot be empty' })
+                            continue
+                        cursor.execute("""
+                            INSERT INTO Comments (ReviewID, UserID, CommentText)
+                            VALUES (%s, %s, %s)
+                        """, (review_id, user_id, text))
+                        comment = new_comment(cursor.lastrowid, text)
+                        result['comment_id'] = comment['id']
+                        cursor.execute(
+                            f"SELECT {review_counter('CommentCount', 'FoodReviews')} AS total, CanteenID, UserID "
+                            f"FROM FoodReviews WHERE ReviewID = %s",
+                            (review_id,)
+                        )
+                        row = cursor.fetchone()
+                        row['active'] = True
+                    else:
+                        row = toggle_interaction(cursor, kind, user_id, review_id, a.get('active'))
+                except pymysql.err.OperationalError as e:
+                    if not (e.args and e.args[0] == 1644):
+                        raise
+                    result.update({ 'success': False, 'error': f'You cannot {kind} your own review' })
+                    continue
+                except pymysql.err.IntegrityError as e:
+                    # 1452: comment on a review that does not exist
+                    if not (e.args and e.args[0] == 1452):
+                        raise
+                    row = None
+                if row is None:
+                    result.update({ 'success': False, 'error': 'Review not found' })
+                    continue
+                result.update({ 'success': True, 'active': row['active'], 'count': row['total'] })
+                applied.append((kind, review_id, row['active'], comment['id'] if kind == 'comment' else None))
+                touched.append(row)
+                if kind == 'comment':
+                    events.append((row['CanteenID'], 'comment', { 'review_id': review_id, 'comment': comment }))
+                else:
+                    events.append((row['CanteenID'], 'counter', { 'review_id': review_id, INTERACTION_COUNTS[kind]: row['total'] }))
         conn.commit()
+    except Exception:
+        conn.rollback()
+        app.logger.exception('Interaction batch failed')
+        return jsonify({ 'success': False, 'error': 'Could not apply interactions' }), 500
     finally:
         conn.close()
 
-    return jsonify({ 'success': True, 'message': 'Comment posted successfully' })
+    for kind, review_id, active, comment_id in applied:
+        if active:
+            activity_log.record(user_id, review_id, kind, comment_id)
+        else:
+            activity_log.remove(user_id, review_id, kind)
+        recommender.observe(user_id, review_id, kind, active)
+    for canteen_id in {row['CanteenID'] for row in touched}:
+        invalidate_canteen(canteen_id)
+    users = {row['UserID'] for row in touched}
+    if any(kind != 'comment' for kind, _, _, _ in applied):
+        users.add(user_id)  # /api/me lists the actor's upvotes and favorites
+    invalidate_users(*users)
+    for canteen_id, event, data in events:
+        publish_event(canteen_id, event, **data)
+
+    return jsonify({ 'success': True, 'results': results })
 
 
 @app.route('/comment/<int:comment_id>/delete', methods=['POST'])
+@query_budget(2)
 def delete_comment(comment_id):
     if 'user_id' not in session:
         return jsonify({ 'success': False, 'error': 'Unauthorized' }), 401
@@ -755,7 +1726,11 @@ def delete_comment(comment_id):
     try:
         with conn.cursor() as cursor:
             # Ensure the comment exists and belongs to the current user
-            cursor.execute("SELECT ReviewID FROM Comments WHERE CommentID = %s AND UserID = %s", (comment_id, user_id))
+            cursor.execute("""
+                SELECT c.ReviewID, r.CanteenID, r.UserID AS review_owner_id FROM Comments c
+                JOIN FoodReviews r ON c.ReviewID = r.ReviewID
+                WHERE c.CommentID = %s AND c.UserID = %s
+            """, (comment_id, user_id))
             row = cursor.fetchone()
             if not row:
                 return jsonify({ 'success': False, 'error': 'not_found_or_not_owner' }), 404
@@ -765,26 +1740,27 @@ def delete_comment(comment_id):
             # Delete the comment (owner verified above)
             cursor.execute("DELETE FROM Comments WHERE CommentID = %s AND UserID = %s", (comment_id, user_id))
 
-            # Best-effort: remove corresponding UserActivity rows for this comment
-            try:
-                cursor.execute("DELETE FROM UserActivity WHERE UserID = %s AND PostID = %s AND ActivityType = %s", (user_id, review_id, 'comment'))
-            except Exception:
-                app.logger.exception('Failed to delete UserActivity for comment')
-
         conn.commit()
     finally:
         conn.close()
 
+    activity_log.remove(user_id, review_id, 'comment', comment_id)
+    invalidate_canteen(row.get('CanteenID'))
+    invalidate_users(row.get('review_owner_id'))
+    publish_event(row.get('CanteenID'), 'comment_deleted', review_id=review_id, comment_id=comment_id)
+
     return jsonify({ 'success': True, 'message': 'Comment deleted' })
 
 
 @app.route('/review/<int:review_id>/delete', methods=['POST'])
+@query_budget(6)
 def delete_review(review_id):
     """Delete a FoodReviews row owned by the current user.
 
     This endpoint:
     - verifies the requester owns the review (or can be extended for admins)
-    - deletes dependent rows (Upvotes, Favorites, UserActivity) to avoid FK errors
+    - deletes dependent rows (Upvotes, Favorites, Comments) to avoid FK errors
+      and detaches its UserActivity rows
     - deletes the FoodReviews row
     - removes any locally stored image files referenced in ImagePaths
     """
@@ -796,8 +1772,10 @@ def delete_review(review_id):
     image_paths = None
     try:
         with conn.cursor() as cursor:
-            # fetch owner and image paths
-            cursor.execute("SELECT UserID, ImagePaths FROM FoodReviews WHERE ReviewID = %s", (review_id,))
+            # fetch owner and image paths; the row lock makes the activity
+            # writer's inserts for this review wait for the outcome
+            cursor.execute("SELECT UserID, ImagePaths, CanteenID FROM FoodReviews WHERE ReviewID = %s FOR UPDATE",
+                           (review_id,))
             row = cursor.fetchone()
             if not row:
                 return jsonify({ 'success': False, 'error': 'not_found' }), 404
@@ -820,10 +1798,13 @@ def delete_review(review_id):
             except Exception:
                 app.logger.exception('Failed to delete Favorites for review %s', review_id)
 
+            # UserActivity.PostID references the review. Stored rows stay in
+            # their users' history, detached from the review (they keep its
+            # FoodName, see migrations/007)
             try:
-                cursor.execute("DELETE FROM UserActivity WHERE PostID = %s", (review_id,))
+                cursor.execute("UPDATE UserActivity SET PostID = NULL WHERE PostID = %s", (review_id,))
             except Exception:
-                app.logger.exception('Failed to delete UserActivity for review %s', review_id)
+                app.logger.exception('Failed to detach UserActivity from review %s', review_id)
 
             # Comments may have ON DELETE CASCADE; delete explicitly if you prefer
             try:
@@ -838,6 +1819,14 @@ def delete_review(review_id):
     finally:
         conn.close()
 
+    # only once the review is gone: queued activity for it could no longer be
+    # written (the writer drops rows whose post was deleted, errno 1452)
+    activity_log.discard_post(review_id)
+    invalidate_canteen(row.get('CanteenID'))
+    review_fragments.discard(review_id)
+    invalidate_users(user_id)
+    publish_event(row.get('CanteenID'), 'review_deleted', review_id=review_id)
+
     # Remove local image files referenced in ImagePaths (best-effort)
     try:
         if image_paths:
@@ -852,7 +1841,11 @@ def delete_review(review_id):
                 imgs = [p.strip() for p in (image_paths or '').split(',') if p.strip()]
 
             for p in imgs:
-                # Only delete local uploads (avoid removing external URLs)
+                # Only delete local uploads (avoid removing external URLs).
+                # Content-addressed uploads can be shared with other reviews;
+                # `flask prune-uploads` removes them once nothing references them.
+                if upload_pipeline.is_content_addressed(p):
+                    continue
                 if isinstance(p, str) and p.startswith('/static/uploads/'):
                     local_path = os.path.join(app.root_path, p.lstrip('/'))
                     try:
@@ -865,28 +1858,393 @@ def delete_review(review_id):
         app.logger.exception('Error while cleaning up image files for review %s', review_id)
 
     return jsonify({ 'success': True, 'message': 'Review deleted' })
+
+
+ACTIVITY_FEED_SIZE = 50
+ACTIVITY_FEED_SIZE_MAX = 200
+# newest first; ActivityID breaks ties between rows stamped the same second
+ACTIVITY_ORDER = (('a.ActivityTime', 'ActivityTime', 'DESC'), ('a.ActivityID', 'ActivityID', 'DESC'))
+CAMPUS_ORDER = (('c.EntryID', 'EntryID', 'DESC'),)
+
 @app.route('/api/activity_feed')
+@query_budget(2)
 def api_activity_feed():
-    if 'user_id' not in session:
+    """The current user's activity, newest first, or with ?scope=campus the
+    reviews and comments posted across campus (optionally for one
+    canteen_id). Pages are `limit` rows; pass back `next_cursor` as
+    ?cursor= for the next one."""
+    scope = request.args.get('scope', 'mine')
+    if scope not in ('mine', 'campus'):
+        return jsonify({ 'success': False, 'error': 'invalid scope' }), 400
+    if scope == 'mine' and 'user_id' not in session:
         return jsonify({ 'success': False, 'error': 'Unauthorized' }), 401
 
+    try:
+        limit = max(1, min(int(request.args.get('limit') or ACTIVITY_FEED_SIZE), ACTIVITY_FEED_SIZE_MAX))
+        canteen_id = int(request.args['canteen_id']) if request.args.get('canteen_id') else None
+    except Exception:
+        return jsonify({ 'success': False, 'error': 'invalid limit or canteen_id' }), 400
+
+    order = CAMPUS_ORDER if scope == 'campus' else ACTIVITY_ORDER
+    after = None
+    if request.args.get('cursor'):
+        after = decode_review_cursor(request.args['cursor'], scope, order)
+        if after is None:
+            return jsonify({ 'success': False, 'error': 'invalid cursor' }), 400
+
+    if scope == 'campus':
+        return campus_activity_feed(limit, canteen_id, after)
+
     user_id = session['user_id']
+    # taken before the query: an op written in between shows up twice (and
+    # is deduplicated below) rather than not at all
+    pending = activity_log.pending_for(user_id)
+    params = [user_id]
+    keyset_sql = ''
+    if after is not None:
+        keyset_sql, keyset_params = keyset_predicate(order, after)
+        params += keyset_params
+    if canteen_id is not None:
+        keyset_sql += (' AND ' if keyset_sql else '') + 'a.CanteenID = %s'
+        params.append(canteen_id)
+    params.append(limit + 1)
+
     conn = get_db_connection()
     try:
         with conn.cursor() as cursor:
-            cursor.execute("""
-                SELECT a.ActivityType, a.ActivityTime, r.FoodName, r.ReviewID
+            # FoodName / CanteenID are stored on the row (migrations/007), so
+            # this is one range of idx_activity_user_time
+            cursor.execute(f"""
+                SELECT a.ActivityID, a.ActivityType, a.ActivityTime, a.FoodName, a.PostID AS ReviewID, a.CanteenID
+                       {', a.CommentID' if schema.has_column('UserActivity', 'CommentID') else ''}
                 FROM UserActivity a
-                LEFT JOIN FoodReviews r ON a.PostID = r.ReviewID
-                WHERE a.UserID = %s
-                ORDER BY a.ActivityTime DESC
-                LIMIT 50
-            """, (user_id,))
+                WHERE a.UserID = %s {'AND ' + keyset_sql if keyset_sql else ''}
+                ORDER BY a.ActivityTime DESC, a.ActivityID DESC
+                LIMIT %s
+            """, params)
             feed = cursor.fetchall()
+            next_cursor = None
+            if len(feed) > limit:
+                feed = feed[:limit]
+                next_cursor = encode_review_cursor(scope, order, feed[-1])
+            if pending:
+                # queued activity is newer than anything stored, so it only
+                # joins the first page; queued deletes apply to every page
+                feed = merge_pending_activity(cursor, feed, pending, add=after is None, canteen_id=canteen_id)
+    finally:
+        conn.close()
+
+    return jsonify({ 'success': True, 'activity': feed, 'next_cursor': next_cursor })
+
+def campus_activity_feed(limit, canteen_id, after):
+    """A page of CampusActivity, read backwards along its primary key (or
+    idx_campus_canteen) from `after`."""
+    filters = []
+    params = []
+    if canteen_id is not None:
+        filters.append('c.CanteenID = %s')
+        params.append(canteen_id)
+    if after is not None:
+        filters.append('c.EntryID < %s')
+        params.append(after[0])
+    params.append(limit + 1)
+
+    if not schema.has_table('CampusActivity'):
+        app.logger.warning('CampusActivity missing; apply migrations/007_activity_feed.sql')
+        return jsonify({ 'success': False, 'error': 'campus_feed_unavailable' }), 503
+
+    conn = get_db_connection()
+    try:
+        with conn.cursor() as cursor:
+            cursor.execute(f"""
+                SELECT c.EntryID, c.ActivityType, c.ActivityTime, c.UserID, c.Username,
+                       c.FoodName, c.PostID AS ReviewID, c.CanteenID
+                FROM CampusActivity c
+                {'WHERE ' + ' AND '.join(filters) if filters else ''}
+                ORDER BY c.EntryID DESC
+                LIMIT %s
+            """, params)
+            feed = cursor.fetchall()
+    finally:
+        conn.close()
+
+    next_cursor = None
+    if len(feed) > limit:
+        feed = feed[:limit]
+        next_cursor = encode_review_cursor('campus', CAMPUS_ORDER, feed[-1])
+    return jsonify({ 'success': True, 'activity': feed, 'next_cursor': next_cursor })
+
+def merge_pending_activity(cursor, feed, pending, add=True, canteen_id=None):
+    """Overlay activity the write-behind queue has not stored yet on `feed`:
+    drop rows a queued delete will remove and, with `add`, include queued
+    inserts (of `canteen_id` only, if given)."""
+    removed = []
+    added = []  # (op, row)
+    for op in pending:
+        if op.kind == 'delete':
+            removed.append(op)
+            added = [(q, a) for q, a in added if not op.covers(q)]
+        elif add:
+            added.append((op, { 'ActivityID': None, 'ActivityType': op.activity_type, 'ActivityTime': op.at,
+                                'ReviewID': op.post_id, 'CommentID': op.comment_id }))
+    added = [a for _, a in added]
+
+    def deleted(a):
+        # without the CommentID column (before migrations/012) a comment's
+        # delete removes all of the user's comment rows on the post
+        return any(
+            (op.post_id, op.activity_type) == (a['ReviewID'], a['ActivityType'])
+            and (op.comment_id is None or 'CommentID' not in a or a['CommentID'] == op.comment_id)
+            for op in removed
+        )
+
+    # stored rows a queued delete will remove; rows already written by the
+    # batch in flight are the same as their pending copy
+    stored = set()
+    rows = []
+    for a in feed:
+        if deleted(a):
+            continue
+        stored.add((a['ReviewID'], a['ActivityType'], a['ActivityTime']))
+        rows.append(a)
+    added = [a for a in added if (a['ReviewID'], a['ActivityType'], a['ActivityTime']) not in stored]
+
+    if added:
+        ids = list({ a['ReviewID'] for a in added })
+        cursor.execute(
+            f"SELECT ReviewID, FoodName, CanteenID FROM FoodReviews WHERE ReviewID IN ({', '.join(['%s'] * len(ids))})", ids
+        )
+        reviews = { r['ReviewID']: r for r in cursor.fetchall() }
+        for a in added:
+            review = reviews.get(a['ReviewID']) or {}
+            a['FoodName'] = review.get('FoodName')
+            a['CanteenID'] = review.get('CanteenID')
+        if canteen_id is not None:
+            added = [a for a in added if a['CanteenID'] == canteen_id]
+    rows.extend(added)
+    rows.sort(key=lambda a: a['ActivityTime'], reverse=True)
+    return rows
+
+
+@app.cli.command('reconcile-counters')
+@click.option('--fix', is_flag=True, help='Overwrite drifted counters with the recomputed values.')
+def reconcile_counters(fix):
+    """Recompute FoodReviews counters from the base tables and report drift."""
+    joins = []
+    drift = []
+    for column, table in REVIEW_COUNTERS:
+        joins.append(f"LEFT JOIN (SELECT ReviewID, COUNT(*) AS cnt FROM {table} GROUP BY ReviewID) {table} ON {table}.ReviewID = r.ReviewID")
+        drift.append(f"r.{column} <> COALESCE({table}.cnt, 0)")
+    sql = f"""
+        SELECT r.ReviewID,
+               {', '.join(f'r.{column}, COALESCE({table}.cnt, 0) AS actual_{column}' for column, table in REVIEW_COUNTERS)}
+        FROM FoodReviews r
+        {' '.join(joins)}
+        WHERE {' OR '.join(drift)}
+        ORDER BY r.ReviewID
+    """
+
+    conn = get_db_connection()
+    try:
+        with conn.cursor() as cursor:
+            cursor.execute(sql)
+            rows = cursor.fetchall()
+            for r in rows:
+                diffs = ', '.join(
+                    f"{column} {r[column]} -> {r['actual_' + column]}"
+                    for column, _ in REVIEW_COUNTERS if r[column] != r['actual_' + column]
+                )
+                click.echo(f"review {r['ReviewID']}: {diffs}")
+
+            if rows and fix:
+                cursor.executemany(
+                    f"UPDATE FoodReviews SET {', '.join(f'{column} = %s' for column, _ in REVIEW_COUNTERS)} WHERE ReviewID = %s",
+                    [tuple(r['actual_' + column] for column, _ in REVIEW_COUNTERS) + (r['ReviewID'],) for r in rows]
+                )
+                conn.commit()
+    finally:
+        conn.close()
+
+    if not rows:
+        click.echo('All review counters are in sync.')
+    elif fix:
+        click.echo(f'Fixed counters on {len(rows)} review(s).')
+    else:
+        click.echo(f'{len(rows)} review(s) drifted; rerun with --fix to repair.')
+
+
+@app.cli.command('rebuild-dish-stats')
+def rebuild_dish_stats():
+    """Recompute DishStats from FoodReviews (the triggers keep it current)."""
+    conn = get_db_connection()
+    try:
+        with conn.cursor() as cursor:
+            cursor.execute("CALL RebuildDishStats()")
+            cursor.execute("SELECT COUNT(*) AS dishes FROM DishStats")
+            dishes = cursor.fetchone()['dishes']
+        conn.commit()
+    finally:
+        conn.close()
+    click.echo(f'Rebuilt statistics for {dishes} dish(es).')
+
+
+@app.cli.command('build-recommendations')
+def build_recommendations():
+    """Run one recommendation build and report its size, time and memory
+    (each worker builds its own copy in the background)."""
+    recommender.shutdown()
+    stats = recommender.rebuild(trace_memory=True)
+    click.echo(f"{stats['users']} user(s) x {stats['items']} dish(es) in {stats['total_s']}s, "
+               f"peak {stats['peak_mb']} MB traced")
+    for phase in ('load_s', 'matrix_s', 'similarity_s', 'scoring_s'):
+        if phase in stats:
+            click.echo(f'  {phase[:-2]:<12} {stats[phase]}s')
+
+
+@app.cli.command('rollup-analytics')
+@click.option('--rebuild', is_flag=True, help='Empty the rollups and recompute them from the base tables.')
+def rollup_analytics(rebuild):
+    """Fold new reviews, upvotes and activity into the canteen analytics rollups."""
+    rollup_job.shutdown()
+    if rebuild:
+        rollup_job.reset()
+    rows = rollup_job.run_once()
+    click.echo(f'Folded {rows} row(s) into the rollups; watermarks {rollup_job.stats()["watermarks"]}.')
+
+
+@app.cli.command('export-reviews')
+@click.option('--output', '-o', type=click.File('wb'), default='-', show_default=True, help='NDJSON file to write.')
+@click.option('--canteen-id', type=int, help='Only export this canteen\'s reviews.')
+@click.option('--after-id', type=int, default=0, help='Only export reviews with a higher ReviewID (incremental copies).')
+def export_reviews_command(output, canteen_id, after_id):
+    """Stream reviews with their comments and counters as NDJSON."""
+    review_conn = get_db_connection()
+    # the comments stream alongside on a second connection
+    comment_conn = db_pool.checkout()
+    try:
+        # unbuffered cursors: rows are written as they arrive
+        with review_conn.cursor(pymysql.cursors.SSDictCursor) as reviews, \
+                comment_conn.cursor(pymysql.cursors.SSDictCursor) as comments:
+            written = export_reviews(reviews, comments, output, canteen_id=canteen_id, after_id=after_id,
+                                     progress=lambda n: click.echo(f'{n} review(s) ...', err=True))
+    finally:
+        comment_conn.close()
+        review_conn.close()
+    click.echo(f'Exported {written} review(s).', err=True)
+
+
+@app.cli.command('import-reviews')
+@click.argument('path', type=click.Path(exists=True, dir_okay=False))
+@click.option('--chunk-size', default=500, show_default=True, help='Reviews per INSERT and transaction.')
+@click.option('--key', help='Name the import is tracked under for resuming (default: the file name).')
+@click.option('--default-user', help='Username to attribute reviews and comments of unknown authors to.')
+@click.option('--restart', is_flag=True, help='Forget the progress of an earlier attempt and start from the first line.')
+def import_reviews_command(path, chunk_size, key, default_user, restart):
+    """Load an export-reviews file in chunks, resuming an interrupted import."""
+    last_report = [0.0]
+
+    def report(importer, elapsed):
+        if elapsed - last_report[0] >= 1.0:
+            last_report[0] = elapsed
+            click.echo(f'  line {importer.lines}: {importer.reviews} review(s), {importer.comments} comment(s), '
+                       f'{(importer.lines - importer.resumed_from) / max(elapsed, 1e-9):.0f} lines/s', err=True)
+
+    conn = get_db_connection()
+    importer = ReviewImporter(conn, path, key=key, chunk_size=chunk_size, default_user=default_user, progress=report,
+                              schema=schema)
+    try:
+        finished = importer.run(restart=restart)
+    except TransferError as e:
+        if importer.lines:
+            raise click.ClickException(f'{e}\nLines 1-{importer.lines} are imported; '
+                                       f'run the command again to resume after them.')
+        raise click.ClickException(str(e))
+    finally:
+        conn.close()
+    if not finished:
+        click.echo(f'{importer.key!r} was already imported; pass --restart to import it again.')
+        return
+    resumed = f' (resumed at line {importer.resumed_from + 1})' if importer.resumed_from else ''
+    click.echo(f'Imported {importer.reviews} review(s) and {importer.comments} comment(s){resumed}.')
+    if importer.skipped_comments:
+        click.echo(f'Skipped {importer.skipped_comments} comment(s) by unknown users; see --default-user.')
+
+
+@app.cli.command('prune-uploads')
+@click.option('--min-age', default=3600, show_default=True, help='Keep files younger than this many seconds (uploads whose review is still being saved).')
+@click.option('--dry-run', is_flag=True, help='Only list the files that would be removed.')
+def prune_uploads(min_age, dry_run):
+    """Remove content-addressed uploads that no review or profile references."""
+    referenced = set()
+    conn = get_db_connection()
+    try:
+        # unbuffered cursor: stream ImagePaths instead of loading every row
+        with conn.cursor(pymysql.cursors.SSDictCursor) as cursor:
+            cursor.execute("SELECT ImagePaths FROM FoodReviews")
+            for row in cursor:
+                referenced.update(u for u in parse_image_paths(row['ImagePaths']) if isinstance(u, str))
+        with conn.cursor() as cursor:
+            cursor.execute("SELECT profile_image_url FROM users WHERE profile_image_url LIKE '/static/uploads/%%'")
+            referenced.update(row['profile_image_url'] for row in cursor.fetchall())
     finally:
         conn.close()
 
-    return jsonify({ 'success': True, 'activity': feed })
+    removed = 0
+    now = time.time()
+    for name in sorted(os.listdir(UPLOAD_FOLDER)):
+        url = f'/static/uploads/{name}'
+        if not upload_pipeline.is_content_addressed(url) or url in referenced:
+            continue
+        path = os.path.join(UPLOAD_FOLDER, name)
+        if now - os.path.getmtime(path) < min_age:
+            continue
+        for file_path in upload_pipeline.files_for(url):
+            if os.path.exists(file_path):
+                click.echo(('would remove ' if dry_run else 'removing ') + file_path)
+                if not dry_run:
+                    os.remove(file_path)
+        removed += 1
+    click.echo(f'{removed} unreferenced upload(s) {"found" if dry_run else "removed"}.')
+
+
+@app.cli.command('migrate')
+@click.option('--status', 'show_status', is_flag=True, help='List migrations and whether they have been applied.')
+@click.option('--to', 'target', type=int, help='Only apply migrations up to this version.')
+@click.option('--baseline', type=int, help='Record migrations up to this version as applied without running them (databases migrated by hand).')
+def migrate(show_status, target, baseline):
+    """Apply pending migrations from migrations/ in version order."""
+    conn = get_db_connection()
+    try:
+        runner = MigrationRunner(conn, MIGRATIONS_FOLDER)
+        runner.ensure_table()
+        if show_status:
+            for m, row, modified in runner.status():
+                state = f"applied {row['applied_at']}" if row else 'pending'
+                click.echo(f"{m.version:03d} {m.name:<24} {state}{'  (file changed since applied)' if modified else ''}")
+            return
+        if baseline is not None:
+            marked = runner.baseline(baseline)
+            click.echo(f'Recorded {len(marked)} migration(s) as applied.')
+            return
+        for m, row, modified in runner.status():
+            if modified:
+                click.echo(f'warning: {m.filename} changed after it was applied', err=True)
+        try:
+            applied = runner.migrate(target, log=click.echo)
+        except MigrationError as e:
+            # 1050/1060/1061: table, column or index already exists
+            if not runner.applied() and (getattr(e.error, 'args', None) or (None,))[0] in (1050, 1060, 1061):
+                click.echo('Schema objects already exist; if the migrations were applied by hand, '
+                           'run `flask migrate --baseline <last applied version>` first.', err=True)
+            raise click.ClickException(str(e))
+    finally:
+        conn.close()
+    click.echo(f'Applied {len(applied)} migration(s).' if applied else 'Database is up to date.')
+    if schema.probe():
+        for source, entry in schema.report()['sources'].items():
+            if entry['status'] != 'ok':
+                click.echo(f"{source}: {entry['status']}{': ' + ', '.join(entry['missing']) if entry['missing'] else ''}",
+                           err=True)
 
 
 if __name__ == '__main__':
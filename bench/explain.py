@@ -0,0 +1,211 @@
+"""EXPLAIN every statement app.py runs and fail on full table scans.
+
+Drives each benchmark scenario a few times with a recording connection,
+then EXPLAINs every distinct statement with the parameters it actually ran
+with. Exits 1 if any plan reads a whole table, so a query rewrite or a
+dropped index that loses an index path is caught before it ships:
+
+    python -m bench.explain            # SQLite stand-in (EXPLAIN QUERY PLAN)
+    python -m bench.explain --mysql    # the configured MySQL database
+
+cursor.execute() call sites in app.py that no scenario reached are listed
+as well; CLI commands are skipped, as they scan tables on purpose.
+"""
+import argparse
+import ast
+import os
+import re
+import sys
+import threading
+import time
+
+from . import run as bench
+
+# tiny lookup tables, where a scan is cheaper than an index
+SMALL_TABLES = {'canteens'}
+TABLE_REF = re.compile(r'\b(?:FROM|JOIN|UPDATE|INTO)\s+(\w+)(?:\s+(?:AS\s+)?(\w+))?', re.IGNORECASE)
+SQL_KEYWORDS = {'where', 'on', 'left', 'right', 'inner', 'join', 'order', 'group', 'limit', 'set', 'values', 'union', 'using'}
+IN_LIST = re.compile(r'IN \((?:%s, )*%s\)')
+NOT_EXPLAINED = re.compile(r'^\s*(?:INSERT\s+INTO\s+\w+\s*(?:\([^)]*\))?\s*VALUES|CALL|CREATE|ALTER|DROP)\b', re.IGNORECASE)
+
+
+class Recorder:
+    def __init__(self, app_file):
+        self.app_file = app_file
+        self.statements = {}  # (lineno, normalized sql) -> (sql, params)
+        self._lock = threading.Lock()
+
+    def record(self, sql, params):
+        frame = sys._getframe(2)
+        while frame is not None and frame.f_code.co_filename != self.app_file:
+            frame = frame.f_back
+        if frame is None:
+            return
+        key = (frame.f_lineno, IN_LIST.sub('IN (...)', ' '.join(sql.split())))
+        with self._lock:
+            self.statements.setdefault(key, (sql, params))
+
+
+recorder = None
+
+
+class RecordingCursor(bench.CountingCursor):
+    def execute(self, sql, params=None):
+        if recorder is not None:
+            recorder.record(sql, params)
+        return super().execute(sql, params)
+
+    def executemany(self, sql, seq):
+        seq = list(seq)
+        if seq and recorder is not None:
+            recorder.record(sql, seq[0])
+        return super().executemany(sql, seq)
+
+
+class RecordingConnection(bench.CountingConnection):
+    def cursor(self, *args, **kwargs):
+        return RecordingCursor(self._conn.cursor(*args, **kwargs))
+
+
+def execute_call_sites(path):
+    """[(first line, last line, function, is_cli_command)] of every
+    .execute()/.executemany() call in the file."""
+    with open(path) as f:
+        tree = ast.parse(f.read(), path)
+    sites = []
+
+    def is_cli(fn):
+        for d in fn.decorator_list:
+            target = d.func if isinstance(d, ast.Call) else d
+            if isinstance(target, ast.Attribute) and target.attr == 'command':
+                return True
+        return False
+
+    def visit(node, fn_name, cli):
+        for child in ast.iter_child_nodes(node):
+            if isinstance(child, (ast.FunctionDef, ast.AsyncFunctionDef)):
+                visit(child, child.name, cli or is_cli(child))
+                continue
+            if (isinstance(child, ast.Call) and isinstance(child.func, ast.Attribute)
+                    and child.func.attr in ('execute', 'executemany')):
+                sites.append((child.lineno, child.end_lineno, fn_name, cli))
+            visit(child, fn_name, cli)
+
+    visit(tree, '<module>', False)
+    return sites
+
+
+def table_aliases(sql):
+    aliases = {}
+    for table, alias in TABLE_REF.findall(sql):
+        aliases[table.lower()] = table
+        if alias and alias.lower() not in SQL_KEYWORDS:
+            aliases[alias.lower()] = table
+    return aliases
+
+
+def explain_mysql(conn, sql, params):
+    """[(table, access, full scan?)] from MySQL's EXPLAIN."""
+    with conn.cursor() as cursor:
+        cursor.execute('EXPLAIN ' + sql, params)
+        rows = cursor.fetchall()
+    aliases = table_aliases(sql)
+    plan = []
+    for r in rows:
+        table = r.get('table')
+        if not table or table.startswith('<'):
+            continue
+        real = aliases.get(table.lower(), table)
+        access = f"{r.get('type')} key={r.get('key')} rows={r.get('rows')}"
+        plan.append((real, access, r.get('type') == 'ALL' and real not in SMALL_TABLES))
+    return plan
+
+
+SQLITE_SCAN = re.compile(r'^SCAN (\w+)$')
+HAS_LIMIT = re.compile(r'\bLIMIT\b', re.IGNORECASE)
+
+
+def explain_sqlite(conn, sql, params):
+    """[(table, access, full scan?)] from SQLite's EXPLAIN QUERY PLAN."""
+    with conn.cursor() as cursor:
+        cursor.execute('EXPLAIN QUERY PLAN ' + sql, params)
+        rows = cursor.fetchall()
+    aliases = table_aliases(sql)
+    # a rowid scan already in ORDER BY order stops after LIMIT rows (MySQL
+    # reports it as type=index, not ALL)
+    bounded = HAS_LIMIT.search(sql) and not any('TEMP B-TREE' in r['detail'] for r in rows)
+    plan = []
+    for r in rows:
+        detail = r['detail']
+        m = SQLITE_SCAN.match(detail)
+        if m:
+            real = aliases.get(m.group(1).lower(), m.group(1))
+            if bounded and len(rows) == 1:
+                plan.append((real, detail + ' (in order, stops at LIMIT)', False))
+                continue
+            plan.append((real, detail, real not in SMALL_TABLES))
+        elif detail.startswith(('SEARCH', 'SCAN')):
+            plan.append((detail.split()[1], detail, False))
+    return plan
+
+
+def main(argv=None):
+    global recorder
+    parser = argparse.ArgumentParser(prog='python -m bench.explain', description=__doc__.split('\n\n')[0])
+    bench.add_database_arguments(parser)
+    parser.add_argument('--requests', type=int, default=3, help='requests per scenario')
+    args = parser.parse_args(argv)
+    args.concurrency = 1
+    args.only = None
+
+    creator, summary = bench.prepare_database(args)
+    app_module = bench.install_app(creator, 1, wrap=RecordingConnection)
+    # probed before recording: information_schema is not the app's tables
+    app_module.schema.probe()
+    recorder = Recorder(os.path.abspath(app_module.__file__))
+
+    ctx = bench.Context(app_module, summary, args)
+    ctx.run_id = f'explain{int(time.time())}'
+    for scenario in bench.build_scenarios():
+        if not (scenario.skip and scenario.skip(ctx)):
+            bench.run_scenario(ctx, scenario, args.requests, 1)
+    app_module.upload_pipeline.shutdown()
+
+    sites = execute_call_sites(app_module.__file__)
+    explain = explain_mysql if args.mysql else explain_sqlite
+    conn = creator()
+    failures = 0
+    seen_sites = set()
+    try:
+        for (lineno, normalized), (sql, params) in sorted(recorder.statements.items()):
+            site = next((s for s in sites if s[0] <= lineno <= s[1]), (lineno, lineno, '?', False))
+            seen_sites.add(site[:3])
+            label = f'app.py:{site[0]} {site[2]}'
+            if NOT_EXPLAINED.match(sql):
+                continue
+            try:
+                plan = explain(conn, sql, params)
+            except Exception as e:
+                print(f'SKIP  {label}: {e}')
+                continue
+            scans = [p for p in plan if p[2]]
+            failures += bool(scans)
+            print(f"{'SCAN ' if scans else 'ok   '} {label}")
+            for table, access, full in plan:
+                print(f"        {'!' if full else ' '} {table}: {access}")
+    finally:
+        conn.close()
+
+    unexercised = [s for s in sites if s[:3] not in seen_sites and not s[3]]
+    for first, _, fn, _ in unexercised:
+        print(f'not reached: app.py:{first} {fn}')
+
+    if failures:
+        print(f'{failures} statement(s) do full table scans.')
+        return 1
+    print('No full table scans.')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
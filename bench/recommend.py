@@ -0,0 +1,79 @@
+"""Benchmark of the recommendation build (recommendations.Recommender).
+
+Seeds its own SQLite database (10k users / 100k reviews by default, kept
+apart from the endpoint benchmark's), then reports the wall time of each
+build phase, peak traced memory, the size of the resulting model, and the
+cost of folding one new interaction into a user's list and of serving one:
+
+    python -m bench.recommend
+    python -m bench.recommend --users 20000 --reviews 300000 --reseed
+"""
+import argparse
+import json
+import os
+import random
+import time
+
+from recommendations import Recommender
+from . import run as bench
+from . import seed as seeding
+
+DEFAULT_DB = os.path.join(seeding.HERE, 'recommend.sqlite3')
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='python -m bench.recommend', description=__doc__.split('\n\n')[0])
+    bench.add_database_arguments(parser)
+    parser.set_defaults(db=DEFAULT_DB, users=10000, reviews=100000)
+    parser.add_argument('--folds', type=int, default=2000, help='interactions folded in after the build')
+    parser.add_argument('--top-n', type=int, default=20)
+    parser.add_argument('--neighbours', type=int, default=50)
+    parser.add_argument('--output', help='write the JSON report here')
+    args = parser.parse_args(argv)
+
+    creator, summary = bench.prepare_database(args)
+    recommender = Recommender(creator, top_n=args.top_n, neighbours=args.neighbours, refresh_interval=0)
+    build = recommender.rebuild(trace_memory=True)
+
+    conn = creator()
+    try:
+        with conn.cursor() as cursor:
+            cursor.execute("SELECT ReviewID, UserID FROM FoodReviews")
+            reviews = cursor.fetchall()
+    finally:
+        conn.close()
+    rng = random.Random(args.seed)
+    users = list(range(1, args.users + 1))
+    start = time.perf_counter()
+    for _ in range(args.folds):
+        target = rng.choice(reviews)
+        recommender.observe(rng.choice(users), target['ReviewID'], rng.choice(('upvote', 'favorite')), True)
+    fold_us = (time.perf_counter() - start) * 1e6 / max(args.folds, 1)
+
+    start = time.perf_counter()
+    personalized = 0
+    for user_id in users:
+        personalized += recommender.recommend(user_id, 10)[1]
+    serve_us = (time.perf_counter() - start) * 1e6 / len(users)
+
+    report = {
+        'data_set': summary,
+        'build': build,
+        'fold_us': round(fold_us, 1),
+        'serve_us': round(serve_us, 1),
+        'personalized_users': personalized,
+        'users': len(users),
+    }
+    print(f"build      {build['users']} users x {build['items']} dishes in {build['total_s']}s "
+          f"(load {build.get('load_s')}s, matrix {build.get('matrix_s')}s, "
+          f"similarity {build.get('similarity_s')}s, scoring {build.get('scoring_s')}s)")
+    print(f"memory     peak {build['peak_mb']} MB traced, model {build['model_mb']} MB")
+    print(f'fold       {fold_us:.1f} us per interaction ({args.folds} folded)')
+    print(f'serve      {serve_us:.1f} us per user, {personalized}/{len(users)} personalized')
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,617 @@
+"""Endpoint latency benchmark for app.py.
+
+Seeds a database with a realistic data volume, then drives every route
+through the Flask test client and reports per endpoint: p50/p95/p99
+latency, throughput, DB queries and DB time per request, and response
+size. Results are written as JSON so two commits can be compared:
+
+    python -m bench.run --output before.json
+    git checkout <other commit>
+    python -m bench.run --output after.json
+    python -m bench.run --compare before.json after.json
+
+By default the database is a SQLite file behind bench/sqlite_db.py, built
+from bench/sqlite_schema.sql. Pass --mysql to run against the DB_*
+database app.py is configured for instead; --reseed then DELETES all
+users, reviews and interactions there and loads the benchmark data set.
+"""
+import argparse
+import json
+import logging
+import os
+import platform
+import random
+import subprocess
+import sys
+import threading
+import time
+from datetime import datetime, timezone
+
+from . import seed as seeding
+from . import sqlite_db
+
+DEFAULT_DB = os.path.join(seeding.HERE, 'bench.sqlite3')
+# no background recommendation builds or analytics rollups; the scenarios
+# that need them run them
+os.environ.setdefault('RECOMMEND_REFRESH', '0')
+os.environ.setdefault('ANALYTICS_INTERVAL', '0')
+
+
+class QueryStats:
+    """Per-thread count and wall time of executed statements."""
+
+    def __init__(self):
+        self._local = threading.local()
+
+    def _counters(self):
+        if not hasattr(self._local, 'queries'):
+            self._local.queries = 0
+            self._local.db_time = 0.0
+        return self._local
+
+    def record(self, elapsed):
+        c = self._counters()
+        c.queries += 1
+        c.db_time += elapsed
+
+    def snapshot(self):
+        c = self._counters()
+        return c.queries, c.db_time
+
+
+query_stats = QueryStats()
+
+
+class CountingCursor:
+    def __init__(self, cursor):
+        self._cursor = cursor
+
+    def __getattr__(self, name):
+        return getattr(self._cursor, name)
+
+    def _timed(self, fn, *args):
+        start = time.perf_counter()
+        try:
+            return fn(*args)
+        finally:
+            query_stats.record(time.perf_counter() - start)
+
+    def execute(self, sql, params=None):
+        return self._timed(self._cursor.execute, sql, params)
+
+    def executemany(self, sql, seq):
+        return self._timed(self._cursor.executemany, sql, seq)
+
+    def fetchone(self):
+        return self._cursor.fetchone()
+
+    def fetchall(self):
+        return self._cursor.fetchall()
+
+    def __iter__(self):
+        return iter(self._cursor)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self._cursor.close()
+
+
+class CountingConnection:
+    """Wraps a DB-API connection so every statement is counted and timed."""
+
+    def __init__(self, conn):
+        self._conn = conn
+
+    def __getattr__(self, name):
+        return getattr(self._conn, name)
+
+    def cursor(self, *args, **kwargs):
+        return CountingCursor(self._conn.cursor(*args, **kwargs))
+
+
+def percentile(sorted_values, pct):
+    if not sorted_values:
+        return 0.0
+    k = max(0, min(len(sorted_values) - 1, int(round(pct / 100.0 * len(sorted_values) + 0.5)) - 1))
+    return sorted_values[k]
+
+
+class Scenario:
+    """One benchmarked request shape.
+
+    `request(ctx, i)` returns (method, path, kwargs) for the i-th request;
+    `before(ctx, i)` runs untimed ahead of it (e.g. to drop a cache).
+    `setup(ctx)` runs once before the scenario. `skip(ctx)` returns why the
+    scenario cannot be measured against this database, or None.
+    """
+
+    def __init__(self, name, request, before=None, setup=None, login=True, note=None, skip=None):
+        self.name = name
+        self.request = request
+        self.before = before
+        self.setup = setup
+        self.login = login
+        self.note = note
+        self.skip = skip
+
+
+def _get(path, **kwargs):
+    return lambda ctx, i: ('GET', path(ctx, i) if callable(path) else path, kwargs)
+
+
+def _revalidate(path):
+    """GET `path` once to learn its ETag, then send conditional requests."""
+    def setup(ctx):
+        resp = ctx.client(0).get(path)
+        ctx.etags[path] = resp.headers.get('ETag')
+
+    def request(ctx, i):
+        return 'GET', path, {'headers': {'If-None-Match': ctx.etags.get(path) or '*'}}
+    return setup, request
+
+
+class Context:
+    def __init__(self, app_module, summary, args):
+        self.app_module = app_module
+        self.app = app_module.app
+        self.summary = summary
+        self.args = args
+        self.rng = random.Random(args.seed)
+        self.etags = {}
+        self.cursors = {}
+        self.ids = {}
+        self._clients = {}
+        self._lock = threading.Lock()
+
+    def user_for(self, worker):
+        # user 1 is the most prolific author of the seeded data set
+        return 1 + worker
+
+    def client(self, worker, login=True):
+        key = (worker, login)
+        with self._lock:
+            client = self._clients.get(key)
+            if client is None:
+                client = self.app.test_client()
+                if login:
+                    uid = self.user_for(worker)
+                    with client.session_transaction() as sess:
+                        sess['user_id'] = uid
+                        sess['username'] = f'user{uid}'
+                        sess['email'] = f'user{uid}@bench.local'
+                        sess['profile_image_url'] = None
+                self._clients[key] = client
+        return client
+
+    def review_ids(self, n):
+        return [self.rng.randint(1, self.summary['reviews']) for _ in range(n)]
+
+    def query(self, sql, params=()):
+        conn = self.app_module.get_db_connection()
+        try:
+            with conn.cursor() as cursor:
+                cursor.execute(sql, params)
+                return cursor.fetchall()
+        finally:
+            conn.close()
+
+
+SORTS = ('newest', 'upvotes', 'popular', 'spice_desc', 'spice_asc', 'price_asc', 'price_desc')
+
+
+def _canteen(i):
+    return seeding.CANTEEN_IDS[i % len(seeding.CANTEEN_IDS)]
+
+
+def _public_url(ctx, i):
+    return ctx.app_module.public_url('5TH_FLOOR.png')
+
+
+def _reviews_path(ctx, i):
+    return f'/api/canteen_reviews?canteen_id={_canteen(i)}&sort={SORTS[i % len(SORTS)]}'
+
+
+def _warm_review_cache(ctx):
+    for c in seeding.CANTEEN_IDS:
+        for s in SORTS:
+            ctx.client(0).get(f'/api/canteen_reviews?canteen_id={c}&sort={s}')
+
+
+def _setup_second_pages(ctx):
+    for c in seeding.CANTEEN_IDS:
+        for s in SORTS:
+            data = ctx.client(0).get(f'/api/canteen_reviews?canteen_id={c}&sort={s}').get_json()
+            ctx.cursors[(c, s)] = data.get('next_cursor') or ''
+
+
+def _second_page(ctx, i):
+    c, s = _canteen(i), SORTS[i % len(SORTS)]
+    return 'GET', f'/api/canteen_reviews?canteen_id={c}&sort={s}&cursor={ctx.cursors[(c, s)]}', {}
+
+
+def _setup_deep_activity_page(ctx):
+    # page 20, or the last page of a smaller data set
+    cursor = ''
+    for _ in range(19):
+        next_cursor = ctx.client(0).get(f'/api/activity_feed?cursor={cursor}').get_json().get('next_cursor')
+        if not next_cursor:
+            break
+        cursor = next_cursor
+    ctx.cursors['activity'] = cursor
+
+
+def _needs_mysql(ctx):
+    return None if ctx.args.mysql else 'needs MySQL FULLTEXT, not available on the SQLite stand-in'
+
+
+def _build_recommendations(ctx):
+    ctx.app_module.recommender.rebuild()
+
+
+def _rollup_analytics(ctx):
+    ctx.app_module.rollup_job.run_once()
+
+
+def _deep_activity_page(ctx, i):
+    return 'GET', f"/api/activity_feed?cursor={ctx.cursors['activity']}", {}
+
+
+def _clear_review_cache(ctx, i):
+    ctx.app_module.review_cache.clear()
+
+
+def _toggle_target(ctx, i):
+    """Requests 2k and 2k+1 hit the same review, so toggles are undone."""
+    with ctx._lock:
+        ids = ctx.ids.setdefault('toggle', {})
+        if i // 2 not in ids:
+            ids[i // 2] = ctx.review_ids(1)[0]
+        return ids[i // 2]
+
+
+def _interactions_batch(ctx, i):
+    review_id = _toggle_target(ctx, i)
+    return ('POST', '/api/interactions', {'json': {'actions': [
+        {'type': 'upvote', 'review_id': review_id},
+        {'type': 'favorite', 'review_id': review_id},
+        {'type': 'comment', 'review_id': review_id, 'text': f'bench comment {i}'},
+    ]}})
+
+
+def _comment_untimed(ctx, i):
+    ctx.client(ctx.worker_of(i)).post(f'/comment/{ctx.review_ids(1)[0]}', data={'comment': f'bench comment {i}'})
+
+
+def _own_rows(sql):
+    """Setup hook collecting ids (e.g. freshly written comments) per worker."""
+    def setup(ctx):
+        for w in range(ctx.args.concurrency):
+            uid = ctx.user_for(w)
+            ctx.ids[(sql, w)] = [next(iter(r.values())) for r in ctx.query(sql, (uid,))]
+    return setup
+
+
+def _pop_own(sql, path_fmt):
+    def request(ctx, i):
+        ids = ctx.ids.get((sql, ctx.worker_of(i)), [])
+        target = ids.pop() if ids else 0
+        return 'POST', path_fmt.format(target), {}
+    return request
+
+
+OWN_COMMENTS = 'SELECT CommentID FROM Comments WHERE UserID = %s AND CommentText LIKE \'bench comment %%\' ORDER BY CommentID'
+OWN_REVIEWS = 'SELECT ReviewID FROM FoodReviews WHERE UserID = %s AND FoodName = \'Bench Dish\' ORDER BY ReviewID'
+
+GZIP = {'Accept-Encoding': 'gzip, br'}
+canteens_setup, canteens_304 = _revalidate('/api/canteens')
+my_reviews_setup, my_reviews_304 = _revalidate('/api/my_reviews')
+dishes_setup, dishes_304 = _revalidate('/api/dishes?canteen_id=1')
+reviews_setup, reviews_304 = _revalidate('/api/canteen_reviews?canteen_id=1&sort=newest')
+public_setup, public_304 = _revalidate('/templates/public/5TH_FLOOR.png')
+shell_setup, shell_304 = _revalidate('/')
+
+
+def build_scenarios():
+    # reads first: the write scenarios invalidate caches and version stamps
+    return [
+        Scenario('GET /', _get('/'), login=False),
+        Scenario('GET / (gzip)', _get('/', headers=GZIP), login=False),
+        Scenario('GET / (304)', shell_304, setup=shell_setup, login=False),
+        Scenario('GET /profile', _get('/profile')),
+        Scenario('GET /canteen/<id>', _get(lambda ctx, i: f'/canteen/{_canteen(i)}')),
+        Scenario('GET /templates/public/<file>', _get('/templates/public/5TH_FLOOR.png'), login=False),
+        Scenario('GET /templates/public/<file> (versioned)', _get(_public_url), login=False,
+                 note='immutable URL; a browser would not ask again for a year'),
+        Scenario('GET /templates/public/<file> (304)', public_304, setup=public_setup, login=False),
+        Scenario('GET /templates/public/<file> (range)', _get(_public_url, headers={'Range': 'bytes=0-65535'}),
+                 login=False),
+        Scenario('GET /api/canteens', _get('/api/canteens')),
+        Scenario('GET /api/canteens (304)', canteens_304, setup=canteens_setup),
+        Scenario('GET /api/canteen_reviews (cold)', _get(_reviews_path), before=_clear_review_cache,
+                 note='review cache cleared before every request'),
+        Scenario('GET /api/canteen_reviews (cached)', _get(_reviews_path), setup=_warm_review_cache),
+        Scenario('GET /api/canteen_reviews (cached, gzip)', _get(_reviews_path, headers=GZIP), setup=_warm_review_cache),
+        Scenario('GET /api/canteen_reviews (page 2)', _second_page, setup=_setup_second_pages),
+        Scenario('GET /api/canteen_reviews (304)', reviews_304, setup=reviews_setup),
+        Scenario('GET /api/my_reviews', _get('/api/my_reviews')),
+        Scenario('GET /api/my_reviews (gzip)', _get('/api/my_reviews', headers=GZIP),
+                 note='the busiest user: ~8 MB of JSON, compressed while it is sent'),
+        Scenario('GET /api/my_reviews (304)', my_reviews_304, setup=my_reviews_setup),
+        Scenario('GET /api/me', _get('/api/me')),
+        Scenario('GET /api/health', _get('/api/health'), login=False),
+        Scenario('GET /api/reviews_by_ids', _get(lambda ctx, i: '/api/reviews_by_ids?ids=' + ','.join(map(str, ctx.review_ids(20))))),
+        Scenario('GET /api/search', _get(lambda ctx, i: f'/api/search?q={seeding.DISHES[i % 8][0].split()[0].lower()}'),
+                 skip=_needs_mysql),
+        Scenario('GET /api/dishes', _get(lambda ctx, i: f'/api/dishes?canteen_id={_canteen(i)}')),
+        Scenario('GET /api/dishes (304)', dishes_304, setup=dishes_setup),
+        Scenario('GET /api/activity_feed', _get('/api/activity_feed')),
+        Scenario('GET /api/activity_feed (deep page)', _deep_activity_page, setup=_setup_deep_activity_page,
+                 note='page 20 of the busiest user\'s history (or its last page)'),
+        Scenario('GET /api/activity_feed?scope=campus', _get(lambda ctx, i: '/api/activity_feed?scope=campus'
+                                                            + (f'&canteen_id={_canteen(i)}' if i % 2 else ''))),
+        Scenario('GET /api/recommendations', _get('/api/recommendations'), setup=_build_recommendations),
+        Scenario('GET /api/analytics/canteen/<id> (year, daily)',
+                 _get(lambda ctx, i: f'/api/analytics/canteen/{_canteen(i)}?grain=day&from=2024-05-01&to=2025-05-01'),
+                 setup=_rollup_analytics),
+        Scenario('GET /api/analytics/canteen/<id> (month, hourly)',
+                 _get(lambda ctx, i: f'/api/analytics/canteen/{_canteen(i)}?grain=hour&from=2025-04-01&to=2025-05-01'),
+                 setup=_rollup_analytics),
+        Scenario('GET /api/stats', _get('/api/stats')),
+        Scenario('POST /upvote/<id>', lambda ctx, i: ('POST', f'/upvote/{_toggle_target(ctx, i)}', {})),
+        Scenario('POST /favorite/<id>', lambda ctx, i: ('POST', f'/favorite/{_toggle_target(ctx, i)}', {})),
+        Scenario('POST /comment/<id>', lambda ctx, i: ('POST', f'/comment/{ctx.review_ids(1)[0]}',
+                                                       {'data': {'comment': f'bench comment {i}'}})),
+        Scenario('POST /api/interactions', _interactions_batch,
+                 note='upvote + favorite + comment in one request'),
+        Scenario('GET /api/activity_feed (pending)', _get('/api/activity_feed'), before=_comment_untimed,
+                 note='feed read right after a write the activity queue has not flushed yet'),
+        Scenario('POST /comment/<id>/delete', _pop_own(OWN_COMMENTS, '/comment/{}/delete'), setup=_own_rows(OWN_COMMENTS)),
+        Scenario('POST /submit_review', lambda ctx, i: ('POST', '/submit_review', {'data': {
+            'food_name': 'Bench Dish', 'price': '99.5', 'rating': '4', 'spice_level': '2',
+            'review': 'benchmark review', 'canteen_id': str(_canteen(i))}})),
+        Scenario('POST /review/<id>/delete', _pop_own(OWN_REVIEWS, '/review/{}/delete'), setup=_own_rows(OWN_REVIEWS)),
+        Scenario('POST /login', lambda ctx, i: ('POST', '/login', {'data': {
+            'identifier': f'user{1 + i % 100}', 'password': seeding.BENCH_PASSWORD}}), login=False,
+            note='dominated by password hashing'),
+        Scenario('POST /register', lambda ctx, i: ('POST', '/register', {'data': {
+            'full_name': 'Bench Register', 'username': f'reg{ctx.run_id}_{i}', 'email': f'reg{ctx.run_id}_{i}@bench.local',
+            'password': 'pw'}}), login=False, note='dominated by password hashing'),
+        Scenario('GET /logout', _get('/logout'), login=False),
+    ]
+
+
+def run_scenario(ctx, scenario, n, concurrency):
+    if scenario.setup:
+        scenario.setup(ctx)
+
+    samples = []
+    statuses = {}
+    lock = threading.Lock()
+    per_worker = [list(range(w, n, concurrency)) for w in range(concurrency)]
+    ctx.worker_of = lambda i: i % concurrency
+
+    def worker(w):
+        client = ctx.client(w, scenario.login)
+        local = []
+        for i in per_worker[w]:
+            if scenario.before:
+                scenario.before(ctx, i)
+            method, path, kwargs = scenario.request(ctx, i)
+            q0, t0 = query_stats.snapshot()
+            start = time.perf_counter()
+            resp = client.open(path, method=method, **kwargs)
+            body = resp.get_data()
+            elapsed = time.perf_counter() - start
+            q1, t1 = query_stats.snapshot()
+            local.append((elapsed, q1 - q0, t1 - t0, len(body), resp.status_code))
+        with lock:
+            samples.extend(local)
+
+    threads = [threading.Thread(target=worker, args=(w,)) for w in range(concurrency)]
+    wall_start = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    wall = time.perf_counter() - wall_start
+
+    for s in samples:
+        statuses[str(s[4])] = statuses.get(str(s[4]), 0) + 1
+    latencies = sorted(s[0] * 1000 for s in samples)
+    count = len(samples) or 1
+    result = {
+        'requests': len(samples),
+        'statuses': statuses,
+        'errors': sum(1 for s in samples if s[4] >= 500),
+        'throughput_rps': round(len(samples) / wall, 1) if wall else 0.0,
+        'latency_ms': {
+            'mean': round(sum(latencies) / count, 3),
+            'p50': round(percentile(latencies, 50), 3),
+            'p95': round(percentile(latencies, 95), 3),
+            'p99': round(percentile(latencies, 99), 3),
+            'max': round(latencies[-1], 3) if latencies else 0.0,
+        },
+        'db_queries_per_request': round(sum(s[1] for s in samples) / count, 2),
+        'db_queries_max': max((s[1] for s in samples), default=0),
+        'db_ms_per_request': round(sum(s[2] for s in samples) * 1000 / count, 3),
+        'bytes_per_request': round(sum(s[3] for s in samples) / count),
+    }
+    if scenario.note:
+        result['note'] = scenario.note
+    return result
+
+
+def git_revision():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                              cwd=os.path.dirname(seeding.HERE), check=True).stdout.strip()
+    except Exception:
+        return None
+
+
+def prepare_database(args):
+    """Return (connection creator, data set summary), seeding if needed."""
+    if args.mysql:
+        import app as app_module
+        creator = app_module._connect
+        fresh = args.reseed
+    else:
+        path = args.db
+        fresh = args.reseed or not os.path.exists(path)
+        if fresh and os.path.exists(path):
+            for suffix in ('', '-wal', '-shm'):
+                if os.path.exists(path + suffix):
+                    os.remove(path + suffix)
+        creator = lambda: sqlite_db.connect(path)
+
+    summary_path = (args.db if not args.mysql else os.path.join(seeding.HERE, 'mysql')) + '.summary.json'
+    if fresh:
+        print(f'Seeding {args.users} users / {args.reviews} reviews ...')
+        start = time.perf_counter()
+        conn = creator()
+        try:
+            if args.mysql:
+                seeding.clear_tables(conn)
+            else:
+                seeding.create_sqlite_schema(conn)
+            summary = seeding.seed(conn, users=args.users, reviews=args.reviews, seed=args.seed)
+            if args.mysql:
+                seeding.backfill_mysql(conn)
+            else:
+                seeding.backfill_sqlite(conn)
+                seeding.create_sqlite_triggers(conn)
+        finally:
+            conn.close()
+        print(f'  done in {time.perf_counter() - start:.1f}s')
+        with open(summary_path, 'w') as f:
+            json.dump(summary, f)
+    else:
+        with open(summary_path) as f:
+            summary = json.load(f)
+    return creator, summary
+
+
+def install_app(creator, concurrency, wrap=CountingConnection):
+    """Import app.py and point its connection pool at `creator`."""
+    import app as app_module
+    from db_pool import ConnectionPool
+
+    app_module.db_pool.dispose()
+    app_module.db_pool = ConnectionPool(
+        lambda: wrap(creator()),
+        pool_size=max(concurrency, 1),
+        max_overflow=concurrency,
+        timeout=60
+    )
+    # per-request debug logging would dominate the cheaper endpoints
+    app_module.app.logger.setLevel(logging.ERROR)
+    logging.getLogger('metrics.slow').setLevel(logging.ERROR)
+    return app_module
+
+
+def run(args):
+    creator, summary = prepare_database(args)
+    app_module = install_app(creator, args.concurrency)
+
+    ctx = Context(app_module, summary, args)
+    ctx.run_id = f'{int(time.time())}{random.randint(0, 999)}'
+
+    results = {}
+    for scenario in build_scenarios():
+        if args.only and args.only.lower() not in scenario.name.lower():
+            continue
+        reason = scenario.skip(ctx) if scenario.skip else None
+        if reason:
+            results[scenario.name] = {'skipped': reason}
+            print(f'{scenario.name:<40} skipped: {reason}')
+            continue
+        ctx.client(0, scenario.login).get('/api/canteens')  # warm up the client and pool
+        r = run_scenario(ctx, scenario, args.requests, args.concurrency)
+        results[scenario.name] = r
+        lat = r['latency_ms']
+        print(f"{scenario.name:<40} p50 {lat['p50']:>8.2f}  p95 {lat['p95']:>8.2f}  p99 {lat['p99']:>8.2f} ms"
+              f"  {r['throughput_rps']:>8.1f} req/s  {r['db_queries_per_request']:>5.1f} q/req"
+              f"  {r['bytes_per_request']:>8} B  {r['statuses']}")
+
+    app_module.upload_pipeline.shutdown()
+    report = {
+        'meta': {
+            'timestamp': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+            'git_revision': git_revision(),
+            'backend': 'mysql' if args.mysql else 'sqlite',
+            'python': platform.python_version(),
+            'requests_per_scenario': args.requests,
+            'concurrency': args.concurrency,
+            'dataset': summary,
+        },
+        'results': results,
+    }
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+        print(f'Wrote {args.output}')
+    return report
+
+
+def _change(before, after):
+    if not before:
+        return '     n/a'
+    return f'{(after - before) / before * 100:+7.1f}%'
+
+
+def compare(path_a, path_b):
+    with open(path_a) as f:
+        a = json.load(f)
+    with open(path_b) as f:
+        b = json.load(f)
+    print(f"{a['meta'].get('git_revision')} -> {b['meta'].get('git_revision')}")
+    print(f"{'endpoint':<40} {'p50 ms':>17} {'p95 ms':>17} {'p99 ms':>17} {'queries/req':>13}")
+    for name, rb in b['results'].items():
+        ra = a['results'].get(name)
+        if ra is None:
+            print(f'{name:<40} (new)')
+            continue
+        if 'skipped' in ra or 'skipped' in rb:
+            print(f'{name:<40} (skipped)')
+            continue
+        cells = []
+        for key in ('p50', 'p95', 'p99'):
+            x, y = ra['latency_ms'][key], rb['latency_ms'][key]
+            cells.append(f'{y:>8.2f} {_change(x, y)}')
+        qa, qb = ra['db_queries_per_request'], rb['db_queries_per_request']
+        print(f"{name:<40} {' '.join(cells)} {qa:>5.1f} -> {qb:<5.1f}")
+    for name in a['results']:
+        if name not in b['results']:
+            print(f'{name:<40} (removed)')
+
+
+def add_database_arguments(parser):
+    parser.add_argument('--db', default=DEFAULT_DB, help='SQLite database file (created and seeded if missing)')
+    parser.add_argument('--mysql', action='store_true', help='use the DB_* MySQL database instead of SQLite')
+    parser.add_argument('--reseed', action='store_true', help='rebuild the data set (with --mysql: deletes existing rows)')
+    parser.add_argument('--users', type=int, default=5000)
+    parser.add_argument('--reviews', type=int, default=120000)
+    parser.add_argument('--seed', type=int, default=1234)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='python -m bench.run', description=__doc__.split('\n\n')[0])
+    add_database_arguments(parser)
+    parser.add_argument('--requests', type=int, default=200, help='requests per scenario')
+    parser.add_argument('--concurrency', type=int, default=1, help='client threads per scenario')
+    parser.add_argument('--only', help='only run scenarios whose name contains this text')
+    parser.add_argument('--output', help='write the JSON report here')
+    parser.add_argument('--compare', nargs=2, metavar=('BEFORE', 'AFTER'), help='diff two JSON reports and exit')
+    args = parser.parse_args(argv)
+
+    if args.compare:
+        compare(*args.compare)
+        return 0
+    run(args)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
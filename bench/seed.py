@@ -0,0 +1,209 @@
+"""Deterministic benchmark data set.
+
+Volumes and skew roughly follow a busy term: a few canteens and dishes get
+most of the reviews, a small share of users write most of them, and
+upvotes/favorites/comments per review are Pareto-distributed so a handful
+of reviews collect hundreds of interactions while most have none.
+
+Rows are written with %s placeholders through any pymysql-shaped
+connection, so the same data can be loaded into MySQL (schema and
+migrations applied beforehand) or into the SQLite stand-in.
+"""
+import json
+import os
+import random
+from datetime import datetime, timedelta
+
+from werkzeug.security import generate_password_hash
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+BENCH_PASSWORD = 'bench-password'
+CANTEEN_IDS = (1, 2, 3, 4)
+CANTEEN_WEIGHTS = (0.45, 0.25, 0.2, 0.1)
+
+DISHES = [
+    ('Masala Dosa', 60), ('Idli Vada', 45), ('Chicken Biryani', 160), ('Veg Biryani', 120),
+    ('Paneer Butter Masala', 140), ('Chole Bhature', 90), ('Pav Bhaji', 80), ('Vada Pav', 25),
+    ('Samosa', 20), ('Masala Chai', 15), ('Cold Coffee', 50), ('Veg Sandwich', 55),
+    ('Chicken Roll', 90), ('Egg Roll', 60), ('Hakka Noodles', 100), ('Veg Fried Rice', 100),
+    ('Gobi Manchurian', 95), ('Paneer Tikka', 150), ('Rajma Chawal', 85), ('Curd Rice', 50),
+    ('Lemon Rice', 50), ('Poori Sagu', 55), ('Aloo Paratha', 60), ('Thali', 120),
+    ('Maggi', 40), ('Pasta', 110), ('Pizza Slice', 90), ('Burger', 80),
+    ('French Fries', 60), ('Fresh Lime Soda', 35), ('Mango Lassi', 55), ('Filter Coffee', 20),
+]
+WORDS = ('tasty crispy spicy bland fresh stale cheap pricey hot cold soggy crunchy portion '
+         'queue quick slow friendly salty sweet tangy oily light heavy perfect decent').split()
+DEFAULT_IMAGE = 'https://images.unsplash.com/photo-1546069901-ba9599a7e63c?w=300&h=200&fit=crop'
+
+BATCH = 5000
+
+
+def pareto_count(rng, alpha, cap):
+    """0 for most rows, occasionally very large (mean ~ 1 / (alpha - 1))."""
+    return min(int(rng.paretovariate(alpha)) - 1, cap)
+
+
+def _insert(cursor, sql, rows):
+    for i in range(0, len(rows), BATCH):
+        cursor.executemany(sql, rows[i:i + BATCH])
+
+
+def _ts(dt):
+    return dt.strftime('%Y-%m-%d %H:%M:%S')
+
+
+def create_sqlite_schema(conn):
+    with open(os.path.join(HERE, 'sqlite_schema.sql')) as f:
+        conn.executescript(f.read())
+
+
+def create_sqlite_triggers(conn):
+    with open(os.path.join(HERE, 'sqlite_triggers.sql')) as f:
+        conn.executescript(f.read())
+
+
+def clear_tables(conn):
+    """Remove all seeded rows (canteens are kept)."""
+    with conn.cursor() as cursor:
+        for table in ('CanteenRollups', 'RollupActiveUsers', 'CampusActivity', 'UserActivity', 'Comments', 'Favorites',
+                      'Upvotes', 'DishStats', 'FoodReviews', 'users'):
+            cursor.execute(f'DELETE FROM {table}')
+        cursor.execute('UPDATE RollupWatermarks SET LastID = 0')
+    conn.commit()
+
+
+def seed(conn, users=5000, reviews=120000, seed=1234, log=print):
+    """Insert users, reviews and interactions; returns a summary dict."""
+    rng = random.Random(seed)
+    now = datetime(2025, 4, 30, 18, 0, 0)
+    password = generate_password_hash(BENCH_PASSWORD)
+
+    user_rows = [
+        (uid, f'Bench User {uid}', f'user{uid}', f'user{uid}@bench.local', password,
+         f'PES{uid:07d}', None, _ts(now - timedelta(days=400 - uid % 365)))
+        for uid in range(1, users + 1)
+    ]
+    # a small share of users write most reviews: weight ~ 1/rank
+    author_weights = [1.0 / rank for rank in range(1, users + 1)]
+    authors = rng.choices(range(1, users + 1), weights=author_weights, k=reviews)
+    canteens = rng.choices(CANTEEN_IDS, weights=CANTEEN_WEIGHTS, k=reviews)
+    dish_weights = [1.0 / (rank ** 0.8) for rank in range(1, len(DISHES) + 1)]
+    dishes = rng.choices(DISHES, weights=dish_weights, k=reviews)
+
+    review_rows = []
+    for rid in range(1, reviews + 1):
+        name, base_price = dishes[rid - 1]
+        if rng.random() < 0.05:
+            name = name.lower() + ' '  # same dish, different spelling (FoodKey folds these)
+        n_images = rng.choice((0, 0, 1, 1, 2, 3))
+        images = [f'/static/uploads/bench-{rid}-{i}.jpg' for i in range(n_images)] or [DEFAULT_IMAGE]
+        review_rows.append((
+            rid, name, round(base_price * rng.uniform(0.8, 1.3), 2),
+            rng.choices((1, 2, 3, 4, 5), weights=(5, 8, 20, 37, 30))[0],
+            rng.randint(0, 5),
+            ' '.join(rng.choices(WORDS, k=rng.randint(4, 40))),
+            json.dumps(images),
+            # newest reviews are densest, like a growing site
+            _ts(now - timedelta(seconds=int(730 * 86400 * rng.random() ** 2))),
+            authors[rid - 1], canteens[rid - 1],
+        ))
+
+    upvotes, favorites, comments, activity = [], [], [], []
+    for rid, _, _, _, _, _, _, date, author, _ in review_rows:
+        activity.append((author, rid, 'review', date))
+        for rows, alpha, kind in ((upvotes, 1.5, 'upvote'), (favorites, 2.0, 'favorite'), (comments, 2.5, None)):
+            n = pareto_count(rng, alpha, min(500, users - 1))
+            if n <= 0:
+                continue
+            actors = rng.sample(range(1, users + 1), n + 1)
+            for uid in actors:
+                if uid == author or n == 0:
+                    continue
+                n -= 1
+                if kind is None:
+                    rows.append((rid, uid, ' '.join(rng.choices(WORDS, k=rng.randint(2, 15))), date))
+                else:
+                    rows.append((uid, rid, date))
+                    activity.append((uid, rid, kind, date))
+
+    with conn.cursor() as cursor:
+        log(f'  users: {len(user_rows)}')
+        _insert(cursor, """
+            INSERT INTO users (user_id, full_name, username, email, password, student_id, profile_image_url, created_at)
+            VALUES (%s, %s, %s, %s, %s, %s, %s, %s)
+        """, user_rows)
+        log(f'  reviews: {len(review_rows)}')
+        _insert(cursor, """
+            INSERT INTO FoodReviews (ReviewID, FoodName, Price, Rating, SpiceLevel, Review, ImagePaths,
+                                     SubmissionDate, UserID, CanteenID)
+            VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
+        """, review_rows)
+        log(f'  upvotes: {len(upvotes)}, favorites: {len(favorites)}, comments: {len(comments)}')
+        _insert(cursor, "INSERT INTO Upvotes (UserID, ReviewID, UpvoteDate) VALUES (%s, %s, %s)", upvotes)
+        _insert(cursor, "INSERT INTO Favorites (UserID, ReviewID, FavoriteDate) VALUES (%s, %s, %s)", favorites)
+        _insert(cursor, "INSERT INTO Comments (ReviewID, UserID, CommentText, CommentDate) VALUES (%s, %s, %s, %s)", comments)
+        log(f'  activity: {len(activity)}')
+        _insert(cursor, "INSERT INTO UserActivity (UserID, PostID, ActivityType, ActivityTime) VALUES (%s, %s, %s, %s)", activity)
+        conn.commit()
+
+    return {
+        'users': len(user_rows),
+        'reviews': len(review_rows),
+        'upvotes': len(upvotes),
+        'favorites': len(favorites),
+        'comments': len(comments),
+        'activity': len(activity),
+    }
+
+
+def backfill_sqlite(conn):
+    """Fill the columns the MySQL triggers would have maintained during the load."""
+    with conn.cursor() as cursor:
+        cursor.execute("""
+            UPDATE FoodReviews SET
+                UpvoteCount = (SELECT COUNT(*) FROM Upvotes u WHERE u.ReviewID = FoodReviews.ReviewID),
+                FavoriteCount = (SELECT COUNT(*) FROM Favorites f WHERE f.ReviewID = FoodReviews.ReviewID),
+                CommentCount = (SELECT COUNT(*) FROM Comments c WHERE c.ReviewID = FoodReviews.ReviewID)
+        """)
+        cursor.execute("""
+            INSERT INTO DishStats (CanteenID, FoodKey, FoodName, ReviewCount, RatingSum, SpiceSum, SpiceCount,
+                                   MinPrice, MaxPrice)
+            SELECT CanteenID, FoodKey, MAX(FoodName), COUNT(*), SUM(Rating), SUM(COALESCE(SpiceLevel, 0)),
+                   COUNT(SpiceLevel), MIN(Price), MAX(Price)
+            FROM FoodReviews
+            WHERE CanteenID IS NOT NULL
+            GROUP BY CanteenID, FoodKey
+        """)
+        cursor.execute("""
+            UPDATE DishStats SET MedianPrice = (
+                SELECT AVG(Price) FROM (
+                    SELECT Price, ROW_NUMBER() OVER (ORDER BY Price) AS rn, COUNT(*) OVER () AS cnt
+                    FROM FoodReviews r
+                    WHERE r.CanteenID = DishStats.CanteenID AND r.FoodKey = DishStats.FoodKey)
+                WHERE rn IN ((cnt + 1) / 2, (cnt + 2) / 2))
+        """)
+        cursor.execute("""
+            UPDATE UserActivity SET
+                FoodName = (SELECT FoodName FROM FoodReviews r WHERE r.ReviewID = UserActivity.PostID),
+                CanteenID = (SELECT CanteenID FROM FoodReviews r WHERE r.ReviewID = UserActivity.PostID)
+        """)
+        cursor.execute("""
+            INSERT INTO CampusActivity (ActivityType, UserID, Username, PostID, FoodName, CanteenID, ActivityTime,
+                                        ActivityID)
+            SELECT a.ActivityType, a.UserID, u.username, a.PostID, a.FoodName, a.CanteenID, a.ActivityTime,
+                   a.ActivityID
+            FROM UserActivity a
+            LEFT JOIN users u ON u.user_id = a.UserID
+            WHERE a.ActivityType IN ('review', 'comment') AND a.PostID IS NOT NULL
+            ORDER BY a.ActivityTime, a.ActivityID
+        """)
+    conn.commit()
+    conn.executescript('ANALYZE;')
+
+
+def backfill_mysql(conn):
+    """Counters were kept by the triggers; rebuild DishStats in one pass."""
+    with conn.cursor() as cursor:
+        cursor.execute('CALL RebuildDishStats()')
+    conn.commit()
@@ -0,0 +1,250 @@
+"""A pymysql-shaped adapter over sqlite3 for benchmarking without MySQL.
+
+Only what app.py needs is covered: DictCursor-style rows, %s placeholders,
+INSERT IGNORE, datetime columns, lastrowid/rowcount, commit/rollback/ping,
+and the MySQL functions the app's SQL calls (FIELD, GREATEST, LEAST, ANY_VALUE, DATABASE). SQLite errors are re-raised
+as the pymysql exceptions (with MySQL errno) the handlers check for.
+The stored procedures the app CALLs on request paths (and RefreshDishPrices,
+for the importer) are emulated in Python over the same connection, so a CALL
+still counts as one statement; any other CALL raises errno 1305 like a
+missing procedure. `SET @variable = ...` is accepted and ignored, and
+information_schema.TABLES / COLUMNS / STATISTICS / TRIGGERS / ROUTINES are
+TEMP views over sqlite_master.
+FULLTEXT MATCH ... AGAINST has no equivalent and raises errno 1191, which
+/api/search reports as 503.
+"""
+import re
+import sqlite3
+from datetime import datetime
+
+import pymysql
+
+
+# DATETIME / TIMESTAMP columns come back as datetime, like they do from MySQL
+sqlite3.register_adapter(datetime, lambda v: v.isoformat(' '))
+for _decltype in ('DATETIME', 'TIMESTAMP'):
+    sqlite3.register_converter(_decltype, lambda v: datetime.fromisoformat(v.decode()))
+
+_PLACEHOLDER = re.compile(r'%s|%%')
+_CALL = re.compile(r'^\s*CALL\s+(\w+)\s*\(', re.IGNORECASE)
+_INSERT_IGNORE = re.compile(r'^\s*INSERT\s+IGNORE\b', re.IGNORECASE)
+_SESSION_VARIABLE = re.compile(r'^\s*SET\s+@\w+\s*=', re.IGNORECASE)
+_INFORMATION_SCHEMA = re.compile(r'\binformation_schema\.(\w+)', re.IGNORECASE)
+# SQLite has one writer at a time, so row locks have nothing to add
+_FOR_UPDATE = re.compile(r'\s+FOR\s+UPDATE\s*$', re.IGNORECASE)
+
+
+def translate(sql):
+    if 'AGAINST' in sql.upper():
+        raise pymysql.err.OperationalError(1191, "Can't find FULLTEXT index matching the column list (SQLite stand-in)")
+    sql = _INSERT_IGNORE.sub('INSERT OR IGNORE', sql)
+    sql = _FOR_UPDATE.sub('', sql)
+    sql = _INFORMATION_SCHEMA.sub(lambda m: f'temp.information_schema_{m.group(1).upper()}', sql)
+    return _PLACEHOLDER.sub(lambda m: '?' if m.group(0) == '%s' else '%', sql)
+
+
+def _field(value, *candidates):
+    for i, c in enumerate(candidates, 1):
+        if c == value:
+            return i
+    return 0
+
+
+def _greatest(*args):
+    return None if any(a is None for a in args) else max(args)
+
+
+def _least(*args):
+    return None if any(a is None for a in args) else min(args)
+
+
+def _map_error(e):
+    msg = str(e)
+    if msg.startswith('no such table'):
+        return pymysql.err.ProgrammingError(1146, msg)
+    if msg.startswith('no such column'):
+        return pymysql.err.OperationalError(1054, msg)
+    if msg.startswith('Cannot '):
+        # RAISE(ABORT, ...) in the triggers stands in for SIGNAL SQLSTATE '45000'
+        return pymysql.err.OperationalError(1644, msg)
+    if 'UNIQUE constraint failed' in msg:
+        return pymysql.err.IntegrityError(1062, msg)
+    if isinstance(e, sqlite3.IntegrityError):
+        return pymysql.err.IntegrityError(1452, msg)
+    if 'syntax error' in msg:
+        return pymysql.err.ProgrammingError(1064, msg)
+    return pymysql.err.OperationalError(2013, msg)
+
+
+def _toggle_procedure(table, counter):
+    """ToggleUpvote / ToggleFavorite from migrations/005_toggle_procedures.sql."""
+    def procedure(cur, user_id, review_id, active):
+        cur.execute('SELECT 1 FROM FoodReviews WHERE ReviewID = ?', (review_id,))
+        state = False
+        if cur.fetchone() is not None:
+            if active is None:
+                cur.execute(f'DELETE FROM {table} WHERE UserID = ? AND ReviewID = ?', (user_id, review_id))
+                if cur.rowcount == 0:
+                    cur.execute(f'INSERT INTO {table} (UserID, ReviewID) VALUES (?, ?)', (user_id, review_id))
+                    state = True
+            elif active:
+                cur.execute(f'SELECT 1 FROM {table} WHERE UserID = ? AND ReviewID = ?', (user_id, review_id))
+                if cur.fetchone() is None:
+                    cur.execute(f'INSERT INTO {table} (UserID, ReviewID) VALUES (?, ?)', (user_id, review_id))
+                state = True
+            else:
+                cur.execute(f'DELETE FROM {table} WHERE UserID = ? AND ReviewID = ?', (user_id, review_id))
+        cur.execute(f'SELECT ? AS active, {counter} AS total, CanteenID, UserID FROM FoodReviews WHERE ReviewID = ?',
+                    (int(state), review_id))
+    return procedure
+
+
+def _refresh_dish_prices(cur, canteen_id, food_name):
+    """RefreshDishPrices from migrations/003_dish_stats.sql; takes the raw
+    name as the LOWER(TRIM(%s)) argument the importer passes."""
+    dish = 'CanteenID = ? AND FoodKey = LOWER(TRIM(?))'
+    cur.execute(f"""
+        UPDATE DishStats SET
+            MinPrice = (SELECT MIN(Price) FROM FoodReviews WHERE {dish}),
+            MaxPrice = (SELECT MAX(Price) FROM FoodReviews WHERE {dish}),
+            MedianPrice = (SELECT AVG(Price) FROM (
+                SELECT Price, ROW_NUMBER() OVER (ORDER BY Price) AS rn, COUNT(*) OVER () AS cnt
+                FROM FoodReviews WHERE {dish})
+                WHERE rn IN ((cnt + 1) / 2, (cnt + 2) / 2))
+        WHERE {dish}
+    """, (canteen_id, food_name) * 4)
+
+
+PROCEDURES = {
+    'toggleupvote': _toggle_procedure('Upvotes', 'UpvoteCount'),
+    'togglefavorite': _toggle_procedure('Favorites', 'FavoriteCount'),
+    'refreshdishprices': _refresh_dish_prices,
+}
+
+# the information_schema tables the schema probe reads, as TEMP views over
+# sqlite_master and the table pragmas; the routines are the emulated procedures
+INFORMATION_SCHEMA = {
+    'TABLES': """SELECT name AS TABLE_NAME, 'main' AS TABLE_SCHEMA FROM sqlite_master
+                 WHERE type = 'table' AND name NOT LIKE 'sqlite_%'""",
+    'COLUMNS': """SELECT m.name AS TABLE_NAME, c.name AS COLUMN_NAME, 'main' AS TABLE_SCHEMA
+                  FROM sqlite_master m JOIN pragma_table_xinfo(m.name) c WHERE m.type = 'table'""",
+    'STATISTICS': """SELECT m.name AS TABLE_NAME, i.name AS INDEX_NAME, 'main' AS TABLE_SCHEMA
+                     FROM sqlite_master m JOIN pragma_index_list(m.name) i WHERE m.type = 'table'""",
+    'TRIGGERS': """SELECT name AS TRIGGER_NAME, 'main' AS TRIGGER_SCHEMA FROM sqlite_master
+                   WHERE type = 'trigger'""",
+    'ROUTINES': ' UNION ALL '.join(f"SELECT '{name}' AS ROUTINE_NAME, 'main' AS ROUTINE_SCHEMA"
+                                   for name in PROCEDURES),
+}
+
+
+def _dict_row(cursor, row):
+    return {d[0]: v for d, v in zip(cursor.description, row)}
+
+
+class Cursor:
+    def __init__(self, conn):
+        self._cur = conn.cursor()
+        self.lastrowid = None
+        self.rowcount = -1
+
+    def execute(self, sql, params=None):
+        call = _CALL.match(sql)
+        if call:
+            return self._call(call.group(1), params)
+        if _SESSION_VARIABLE.match(sql):
+            # no session variables; the triggers here never read them
+            self.rowcount = 0
+            return 0
+        sql = translate(sql)
+        try:
+            self._cur.execute(sql, tuple(params or ()))
+        except sqlite3.Error as e:
+            raise _map_error(e) from e
+        self.lastrowid = self._cur.lastrowid
+        self.rowcount = self._cur.rowcount
+        if self.rowcount > 1 and sql.lstrip()[:6].upper() == 'INSERT':
+            # MySQL reports the id of the first row of a multi-row INSERT
+            self.lastrowid -= self.rowcount - 1
+        return self.rowcount
+
+    def _call(self, name, params):
+        procedure = PROCEDURES.get(name.lower())
+        if procedure is None:
+            raise pymysql.err.OperationalError(1305, f'PROCEDURE {name} does not exist (SQLite stand-in)')
+        try:
+            procedure(self._cur, *(params or ()))
+        except sqlite3.Error as e:
+            raise _map_error(e) from e
+        self.lastrowid = None
+        self.rowcount = 0
+        return self.rowcount
+
+    def executemany(self, sql, seq):
+        sql = translate(sql)
+        try:
+            self._cur.executemany(sql, [tuple(p) for p in seq])
+        except sqlite3.Error as e:
+            raise _map_error(e) from e
+        self.rowcount = self._cur.rowcount
+        return self.rowcount
+
+    def fetchone(self):
+        return self._cur.fetchone()
+
+    def fetchall(self):
+        return self._cur.fetchall()
+
+    def fetchmany(self, size=None):
+        return self._cur.fetchmany(size or self._cur.arraysize)
+
+    def nextset(self):
+        return None
+
+    def __iter__(self):
+        return iter(self._cur)
+
+    def close(self):
+        self._cur.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class Connection:
+    def __init__(self, path):
+        self._conn = sqlite3.connect(path, timeout=30, check_same_thread=False, detect_types=sqlite3.PARSE_DECLTYPES)
+        self._conn.row_factory = _dict_row
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.execute('PRAGMA foreign_keys=ON')
+        self._conn.create_function('FIELD', -1, _field, deterministic=True)
+        self._conn.create_function('GREATEST', -1, _greatest, deterministic=True)
+        self._conn.create_function('LEAST', -1, _least, deterministic=True)
+        self._conn.create_function('ANY_VALUE', 1, lambda v: v, deterministic=True)
+        self._conn.create_function('DATABASE', 0, lambda: 'main', deterministic=True)
+        for name, sql in INFORMATION_SCHEMA.items():
+            self._conn.execute(f'CREATE TEMP VIEW information_schema_{name} AS {sql}')
+
+    def cursor(self, cursorclass=None):
+        return Cursor(self._conn)
+
+    def commit(self):
+        self._conn.commit()
+
+    def rollback(self):
+        self._conn.rollback()
+
+    def ping(self, reconnect=False):
+        self._conn.execute('SELECT 1')
+
+    def close(self):
+        self._conn.close()
+
+    def executescript(self, script):
+        self._conn.executescript(script)
+
+
+def connect(path):
+    return Connection(path)
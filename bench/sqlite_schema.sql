@@ -0,0 +1,169 @@
+-- SQLite mirror of Campus_Food_Guide.sql plus migrations/, used by the
+-- benchmark stand-in. Keep it in step with the MySQL schema. The indexes on
+-- foreign-key columns reproduce the ones InnoDB creates implicitly.
+
+CREATE TABLE users (
+    user_id INTEGER PRIMARY KEY AUTOINCREMENT,
+    full_name VARCHAR(100) NOT NULL,
+    username VARCHAR(50) UNIQUE NOT NULL,
+    email VARCHAR(100) UNIQUE NOT NULL,
+    password VARCHAR(255) NOT NULL,
+    student_id VARCHAR(20),
+    profile_image_url VARCHAR(255),
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+CREATE TABLE canteens (
+    canteen_id INTEGER PRIMARY KEY AUTOINCREMENT,
+    name VARCHAR(100) NOT NULL,
+    description TEXT,
+    image_url VARCHAR(255),
+    location VARCHAR(100),
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+CREATE TABLE FoodReviews (
+    ReviewID INTEGER PRIMARY KEY AUTOINCREMENT,
+    FoodName VARCHAR(255) NOT NULL,
+    Price DECIMAL(10, 2) NOT NULL,
+    Rating INT NOT NULL CHECK (Rating BETWEEN 1 AND 5),
+    SpiceLevel INT CHECK (SpiceLevel BETWEEN 0 AND 5),
+    Review TEXT,
+    ImagePaths TEXT,
+    SubmissionDate DATETIME DEFAULT CURRENT_TIMESTAMP,
+    UserID INT REFERENCES users(user_id),
+    CanteenID INT REFERENCES canteens(canteen_id),
+    UpvoteCount INT NOT NULL DEFAULT 0,
+    FavoriteCount INT NOT NULL DEFAULT 0,
+    CommentCount INT NOT NULL DEFAULT 0,
+    Version INT NOT NULL DEFAULT 0,
+    FoodKey VARCHAR(255) GENERATED ALWAYS AS (LOWER(TRIM(FoodName))) STORED
+);
+CREATE INDEX idx_reviews_user_date ON FoodReviews (UserID, SubmissionDate);
+CREATE INDEX idx_reviews_canteen_upvotes ON FoodReviews (CanteenID, UpvoteCount, ReviewID);
+CREATE INDEX idx_reviews_canteen_popular ON FoodReviews (CanteenID, UpvoteCount, Rating, ReviewID);
+CREATE INDEX idx_reviews_canteen_date ON FoodReviews (CanteenID, SubmissionDate, ReviewID);
+CREATE INDEX idx_reviews_canteen_price ON FoodReviews (CanteenID, Price, ReviewID);
+CREATE INDEX idx_reviews_canteen_spice_sort ON FoodReviews (CanteenID, COALESCE(SpiceLevel, 0), ReviewID);
+CREATE INDEX idx_reviews_dish ON FoodReviews (CanteenID, FoodKey, Price);
+
+CREATE TABLE Upvotes (
+    UpvoteID INTEGER PRIMARY KEY AUTOINCREMENT,
+    UserID INT NOT NULL REFERENCES users(user_id),
+    ReviewID INT NOT NULL REFERENCES FoodReviews(ReviewID),
+    UpvoteDate TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    UNIQUE (UserID, ReviewID)
+);
+CREATE INDEX fk_upvotes_review ON Upvotes (ReviewID);
+
+CREATE TABLE Favorites (
+    FavoriteID INTEGER PRIMARY KEY AUTOINCREMENT,
+    UserID INT NOT NULL REFERENCES users(user_id),
+    ReviewID INT NOT NULL REFERENCES FoodReviews(ReviewID),
+    FavoriteDate TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    UNIQUE (UserID, ReviewID)
+);
+CREATE INDEX fk_favorites_review ON Favorites (ReviewID);
+
+CREATE TABLE Comments (
+    CommentID INTEGER PRIMARY KEY AUTOINCREMENT,
+    ReviewID INT NOT NULL REFERENCES FoodReviews(ReviewID) ON DELETE CASCADE,
+    UserID INT NOT NULL REFERENCES users(user_id) ON DELETE CASCADE,
+    CommentText TEXT NOT NULL,
+    CommentDate TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+CREATE INDEX idx_comments_review_date ON Comments (ReviewID, CommentDate);
+CREATE INDEX fk_comments_user ON Comments (UserID);
+
+CREATE TABLE UserActivity (
+    ActivityID INTEGER PRIMARY KEY AUTOINCREMENT,
+    UserID INT NOT NULL REFERENCES users(user_id),
+    PostID INT REFERENCES FoodReviews(ReviewID),
+    ActivityType VARCHAR(50) NOT NULL,
+    ActivityTime TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    FoodName VARCHAR(255),
+    CanteenID INT,
+    CommentID INT
+);
+CREATE INDEX idx_activity_user_time ON UserActivity (UserID, ActivityTime);
+CREATE INDEX idx_activity_user_post_type ON UserActivity (UserID, PostID, ActivityType);
+CREATE INDEX fk_activity_post ON UserActivity (PostID);
+CREATE INDEX idx_activity_comment ON UserActivity (CommentID);
+
+CREATE TABLE CampusActivity (
+    EntryID INTEGER PRIMARY KEY AUTOINCREMENT,
+    ActivityType VARCHAR(50) NOT NULL,
+    UserID INT NOT NULL,
+    Username VARCHAR(255),
+    PostID INT REFERENCES FoodReviews(ReviewID) ON DELETE CASCADE,
+    FoodName VARCHAR(255),
+    CanteenID INT,
+    ActivityTime TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    ActivityID INT
+);
+CREATE INDEX idx_campus_canteen ON CampusActivity (CanteenID, EntryID);
+CREATE INDEX fk_campus_post ON CampusActivity (PostID);
+CREATE INDEX idx_campus_activity ON CampusActivity (ActivityID);
+
+CREATE TABLE DishStats (
+    CanteenID INT NOT NULL REFERENCES canteens(canteen_id),
+    FoodKey VARCHAR(255) NOT NULL,
+    FoodName VARCHAR(255) NOT NULL,
+    ReviewCount INT NOT NULL DEFAULT 0,
+    RatingSum INT NOT NULL DEFAULT 0,
+    SpiceSum INT NOT NULL DEFAULT 0,
+    SpiceCount INT NOT NULL DEFAULT 0,
+    AvgRating DECIMAL(5,2) GENERATED ALWAYS AS (ROUND(CAST(RatingSum AS REAL) / NULLIF(ReviewCount, 0), 2)) STORED,
+    AvgSpice DECIMAL(5,2) GENERATED ALWAYS AS (ROUND(CAST(SpiceSum AS REAL) / NULLIF(SpiceCount, 0), 2)) STORED,
+    MinPrice DECIMAL(10,2),
+    MaxPrice DECIMAL(10,2),
+    MedianPrice DECIMAL(10,2),
+    UpdatedAt TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY (CanteenID, FoodKey)
+);
+CREATE INDEX idx_dish_key ON DishStats (FoodKey);
+
+CREATE TABLE CanteenRollups (
+    CanteenID INT NOT NULL REFERENCES canteens(canteen_id),
+    Grain VARCHAR(4) NOT NULL,
+    BucketStart DATETIME NOT NULL,
+    ReviewCount INT NOT NULL DEFAULT 0,
+    RatingSum INT NOT NULL DEFAULT 0,
+    PriceSum DECIMAL(14,2) NOT NULL DEFAULT 0,
+    UpvoteCount INT NOT NULL DEFAULT 0,
+    ActiveUsers INT NOT NULL DEFAULT 0,
+    PRIMARY KEY (CanteenID, Grain, BucketStart)
+);
+
+CREATE TABLE RollupActiveUsers (
+    CanteenID INT NOT NULL,
+    Grain VARCHAR(4) NOT NULL,
+    BucketStart DATETIME NOT NULL,
+    UserID INT NOT NULL,
+    PRIMARY KEY (CanteenID, Grain, BucketStart, UserID)
+);
+
+CREATE TABLE RollupWatermarks (
+    Source VARCHAR(32) PRIMARY KEY,
+    LastID BIGINT NOT NULL DEFAULT 0,
+    UpdatedAt TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+INSERT INTO RollupWatermarks (Source) VALUES ('FoodReviews'), ('Upvotes'), ('UserActivity');
+
+CREATE TABLE ReviewImports (
+    ImportKey VARCHAR(255) PRIMARY KEY,
+    FileName VARCHAR(1024),
+    LinesDone INT NOT NULL DEFAULT 0,
+    PrefixHash CHAR(64),
+    ReviewsImported INT NOT NULL DEFAULT 0,
+    CommentsImported INT NOT NULL DEFAULT 0,
+    StartedAt TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    FinishedAt DATETIME NULL
+);
+
+INSERT INTO canteens (name, description, image_url, location)
+VALUES
+  ('Pixel Canteen', 'Affordable and delicious local cuisine', '/templates/public/PIXEL.png', 'Ground Floor'),
+  ('4th Floor Cafeteria', 'Street food paradise with authentic tastes', '/templates/public/4TH_FLOOR.png', '4th Floor'),
+  ('5th Floor Cafeteria', 'Quick bites and beverages for study sessions', '/templates/public/5TH_FLOOR.png', '5th Floor'),
+  ('MRD Canteen', 'Traditional Indian cuisine with modern twists', '/templates/public/mrd.png', 'MRD Building');
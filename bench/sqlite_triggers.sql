@@ -0,0 +1,116 @@
+-- Triggers of the MySQL schema, created after the bulk seed so loading does
+-- not pay for them (the seeder backfills the same columns instead).
+
+CREATE TRIGGER trg_upvotes_before_insert_prevent_own
+BEFORE INSERT ON Upvotes
+WHEN (SELECT UserID FROM FoodReviews WHERE ReviewID = NEW.ReviewID) = NEW.UserID
+BEGIN
+  SELECT RAISE(ABORT, 'Cannot upvote your own review');
+END;
+
+CREATE TRIGGER fav_before_insert_prevent_own
+BEFORE INSERT ON Favorites
+WHEN (SELECT UserID FROM FoodReviews WHERE ReviewID = NEW.ReviewID) = NEW.UserID
+BEGIN
+  SELECT RAISE(ABORT, 'Cannot favorite your own review');
+END;
+
+CREATE TRIGGER trg_upvotes_after_insert_count AFTER INSERT ON Upvotes
+BEGIN
+  UPDATE FoodReviews SET UpvoteCount = UpvoteCount + 1 WHERE ReviewID = NEW.ReviewID;
+END;
+CREATE TRIGGER trg_upvotes_after_delete_count AFTER DELETE ON Upvotes
+BEGIN
+  UPDATE FoodReviews SET UpvoteCount = MAX(UpvoteCount - 1, 0) WHERE ReviewID = OLD.ReviewID;
+END;
+CREATE TRIGGER trg_favorites_after_insert_count AFTER INSERT ON Favorites
+BEGIN
+  UPDATE FoodReviews SET FavoriteCount = FavoriteCount + 1 WHERE ReviewID = NEW.ReviewID;
+END;
+CREATE TRIGGER trg_favorites_after_delete_count AFTER DELETE ON Favorites
+BEGIN
+  UPDATE FoodReviews SET FavoriteCount = MAX(FavoriteCount - 1, 0) WHERE ReviewID = OLD.ReviewID;
+END;
+CREATE TRIGGER trg_comments_after_insert_count AFTER INSERT ON Comments
+BEGIN
+  UPDATE FoodReviews SET CommentCount = CommentCount + 1 WHERE ReviewID = NEW.ReviewID;
+END;
+CREATE TRIGGER trg_comments_after_delete_count AFTER DELETE ON Comments
+BEGIN
+  UPDATE FoodReviews SET CommentCount = MAX(CommentCount - 1, 0) WHERE ReviewID = OLD.ReviewID;
+END;
+
+-- SQLite cannot assign NEW.Version in a BEFORE trigger; bump it afterwards
+-- (the WHEN keeps the trigger's own UPDATE from bumping it again)
+CREATE TRIGGER trg_reviews_after_update_version AFTER UPDATE ON FoodReviews
+WHEN NEW.Version = OLD.Version
+BEGIN
+  UPDATE FoodReviews SET Version = Version + 1 WHERE ReviewID = NEW.ReviewID;
+END;
+
+CREATE TRIGGER trg_reviews_after_insert_dish AFTER INSERT ON FoodReviews
+WHEN NEW.CanteenID IS NOT NULL
+BEGIN
+  INSERT INTO DishStats (CanteenID, FoodKey, FoodName, ReviewCount, RatingSum, SpiceSum, SpiceCount)
+  VALUES (NEW.CanteenID, NEW.FoodKey, NEW.FoodName, 1, NEW.Rating,
+          COALESCE(NEW.SpiceLevel, 0), NEW.SpiceLevel IS NOT NULL)
+  ON CONFLICT (CanteenID, FoodKey) DO UPDATE SET
+      FoodName = excluded.FoodName,
+      ReviewCount = ReviewCount + 1,
+      RatingSum = RatingSum + excluded.RatingSum,
+      SpiceSum = SpiceSum + excluded.SpiceSum,
+      SpiceCount = SpiceCount + excluded.SpiceCount;
+  UPDATE DishStats SET
+      MinPrice = (SELECT MIN(Price) FROM FoodReviews WHERE CanteenID = NEW.CanteenID AND FoodKey = NEW.FoodKey),
+      MaxPrice = (SELECT MAX(Price) FROM FoodReviews WHERE CanteenID = NEW.CanteenID AND FoodKey = NEW.FoodKey),
+      MedianPrice = (SELECT AVG(Price) FROM (
+          SELECT Price, ROW_NUMBER() OVER (ORDER BY Price) AS rn, COUNT(*) OVER () AS cnt
+          FROM FoodReviews WHERE CanteenID = NEW.CanteenID AND FoodKey = NEW.FoodKey)
+          WHERE rn IN ((cnt + 1) / 2, (cnt + 2) / 2))
+  WHERE CanteenID = NEW.CanteenID AND FoodKey = NEW.FoodKey;
+END;
+
+CREATE TRIGGER trg_reviews_after_delete_dish AFTER DELETE ON FoodReviews
+WHEN OLD.CanteenID IS NOT NULL
+BEGIN
+  UPDATE DishStats SET
+      ReviewCount = ReviewCount - 1,
+      RatingSum = RatingSum - OLD.Rating,
+      SpiceSum = SpiceSum - COALESCE(OLD.SpiceLevel, 0),
+      SpiceCount = SpiceCount - (OLD.SpiceLevel IS NOT NULL)
+  WHERE CanteenID = OLD.CanteenID AND FoodKey = OLD.FoodKey;
+  DELETE FROM DishStats WHERE CanteenID = OLD.CanteenID AND FoodKey = OLD.FoodKey AND ReviewCount <= 0;
+  UPDATE DishStats SET
+      MinPrice = (SELECT MIN(Price) FROM FoodReviews WHERE CanteenID = OLD.CanteenID AND FoodKey = OLD.FoodKey),
+      MaxPrice = (SELECT MAX(Price) FROM FoodReviews WHERE CanteenID = OLD.CanteenID AND FoodKey = OLD.FoodKey),
+      MedianPrice = (SELECT AVG(Price) FROM (
+          SELECT Price, ROW_NUMBER() OVER (ORDER BY Price) AS rn, COUNT(*) OVER () AS cnt
+          FROM FoodReviews WHERE CanteenID = OLD.CanteenID AND FoodKey = OLD.FoodKey)
+          WHERE rn IN ((cnt + 1) / 2, (cnt + 2) / 2))
+  WHERE CanteenID = OLD.CanteenID AND FoodKey = OLD.FoodKey;
+END;
+
+-- UserActivity denormalization and the campus log (migrations/007); the
+-- FoodName / CanteenID a BEFORE trigger sets in MySQL are filled in after
+CREATE TRIGGER trg_activity_after_insert_review AFTER INSERT ON UserActivity
+WHEN NEW.PostID IS NOT NULL AND NEW.FoodName IS NULL
+BEGIN
+  UPDATE UserActivity SET
+      FoodName = (SELECT FoodName FROM FoodReviews WHERE ReviewID = NEW.PostID),
+      CanteenID = (SELECT CanteenID FROM FoodReviews WHERE ReviewID = NEW.PostID)
+  WHERE ActivityID = NEW.ActivityID;
+END;
+CREATE TRIGGER trg_activity_after_insert_campus AFTER INSERT ON UserActivity
+WHEN NEW.ActivityType IN ('review', 'comment') AND NEW.PostID IS NOT NULL
+BEGIN
+  INSERT INTO CampusActivity (ActivityType, UserID, Username, PostID, FoodName, CanteenID, ActivityTime, ActivityID)
+  SELECT NEW.ActivityType, NEW.UserID, (SELECT username FROM users WHERE user_id = NEW.UserID),
+         NEW.PostID, r.FoodName, r.CanteenID, NEW.ActivityTime, NEW.ActivityID
+  FROM FoodReviews r WHERE r.ReviewID = NEW.PostID;
+END;
+-- migrations/011 and 012: an undone comment leaves the campus log as well
+CREATE TRIGGER trg_activity_after_delete_campus AFTER DELETE ON UserActivity
+WHEN OLD.ActivityType IN ('review', 'comment')
+BEGIN
+  DELETE FROM CampusActivity WHERE ActivityID = OLD.ActivityID;
+END;
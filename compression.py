@@ -0,0 +1,192 @@
+"""Negotiated gzip / brotli compression of responses.
+
+app.py passes every response through Compressor.compress(), which encodes
+it when the client accepts gzip or br, the body is at least `min_size`
+bytes and its mimetype is text-like. Images (uploads, canteen pictures)
+are already compressed and are left alone, and so is text/event-stream,
+whose events must reach the browser one by one.
+
+Bodies up to `stream_over` bytes are compressed in one go and keep their
+Content-Length. Larger ones, files sent with send_file() and streamed
+responses are compressed chunk by chunk while they are sent, so neither
+the original nor the compressed body is held in memory twice.
+
+A strong ETag becomes weak on a compressed response: the bytes differ per
+encoding, while the ETag stays valid for If-None-Match revalidation.
+
+brotli is optional; without it only gzip is offered.
+"""
+import threading
+import time
+import zlib
+
+try:
+    import brotli
+except ImportError:  # pragma: no cover - brotli is an optional dependency
+    brotli = None
+
+COMPRESSIBLE = frozenset({
+    'text/html', 'text/css', 'text/plain', 'text/javascript', 'text/xml',
+    'application/json', 'application/javascript', 'application/xml', 'image/svg+xml',
+})
+CHUNK_SIZE = 64 * 1024
+
+
+class Compressor:
+
+    def __init__(self, min_size=1024, gzip_level=5, brotli_quality=4, stream_over=256 * 1024):
+        self.min_size = min_size
+        self.gzip_level = gzip_level
+        self.brotli_quality = brotli_quality
+        self.stream_over = stream_over
+        self.encodings = ('br', 'gzip') if brotli is not None else ('gzip',)
+
+        self._lock = threading.Lock()
+        # encoding -> [responses, bytes in, bytes out, CPU seconds]
+        self._totals = {e: [0, 0, 0, 0.0] for e in self.encodings}
+        self.streamed = 0
+
+    def negotiate(self, accept_encodings):
+        """Best encoding the client accepts (a werkzeug Accept), or None;
+        br wins ties."""
+        best, best_q = None, 0
+        for encoding in self.encodings:
+            q = accept_encodings.quality(encoding)
+            if q > best_q:
+                best, best_q = encoding, q
+        return best
+
+    def compress(self, response, accept_encodings):
+        """Encode `response` in place if it is worth it; returns it either way."""
+        if response.mimetype not in COMPRESSIBLE:
+            # never compressed, so their 304s keep the 200's strong ETag
+            return response
+        if response.status_code == 304:
+            # repeat the ETag as the compressed 200 would have sent it
+            etag, weak = response.get_etag()
+            if etag and not weak and self.negotiate(accept_encodings):
+                response.set_etag(etag, weak=True)
+            return response
+        response.vary.add('Accept-Encoding')
+        if (response.status_code != 200 or 'Content-Encoding' in response.headers
+                or 'Content-Range' in response.headers):
+            return response
+        length = response.content_length
+        if length is not None and length < self.min_size:
+            return response
+        encoding = self.negotiate(accept_encodings)
+        if encoding is None:
+            return response
+
+        if response.is_streamed or response.direct_passthrough or length is None or length > self.stream_over:
+            body = response.response
+            if hasattr(body, 'close'):
+                response.call_on_close(body.close)
+            response.response = self._stream(body, encoding, sync=response.is_streamed and length is None)
+            response.direct_passthrough = False
+            response.headers.pop('Content-Length', None)
+        else:
+            data = response.get_data()
+            start = time.thread_time()
+            encoder = self._encoder(encoding)
+            if encoding == 'br':
+                out = encoder.process(data) + encoder.finish()
+            else:
+                out = encoder.compress(data) + encoder.flush()
+            self._record(encoding, len(data), len(out), time.thread_time() - start)
+            response.set_data(out)
+
+        response.headers['Content-Encoding'] = encoding
+        # a compressed body cannot satisfy byte ranges of the original
+        response.headers.pop('Accept-Ranges', None)
+        etag, weak = response.get_etag()
+        if etag and not weak:
+            response.set_etag(etag, weak=True)
+        return response
+
+    def precompress(self, data):
+        """{encoding: body} of `data` in every offered encoding, at the
+        highest levels: for bodies compressed once and sent many times."""
+        encoded = {}
+        for encoding in self.encodings:
+            if encoding == 'br':
+                encoded[encoding] = brotli.compress(data, quality=11)
+            else:
+                encoder = zlib.compressobj(9, zlib.DEFLATED, 31)
+                encoded[encoding] = encoder.compress(data) + encoder.flush()
+        return encoded
+
+    def _encoder(self, encoding):
+        if encoding == 'br':
+            return brotli.Compressor(quality=self.brotli_quality)
+        return zlib.compressobj(self.gzip_level, zlib.DEFLATED, 31)  # 31: gzip container
+
+    def _stream(self, body, encoding, sync):
+        """Compress an iterable body while it is sent. `sync` flushes after
+        every chunk, for generators that yield data as it becomes ready."""
+        encoder = self._encoder(encoding)
+        is_zlib = encoding == 'gzip'
+        size_in = size_out = 0
+        cpu = 0.0
+        try:
+            for chunk in body:
+                if isinstance(chunk, str):
+                    chunk = chunk.encode()
+                # a large in-memory body is one chunk; feed it in slices so
+                # compressed output goes out as it is produced
+                for offset in range(0, len(chunk), CHUNK_SIZE):
+                    piece = chunk[offset:offset + CHUNK_SIZE]
+                    start = time.thread_time()
+                    if is_zlib:
+                        out = encoder.compress(piece)
+                    else:
+                        out = encoder.process(piece)
+                    cpu += time.thread_time() - start
+                    size_in += len(piece)
+                    size_out += len(out)
+                    if out:
+                        yield out
+                if sync:
+                    out = encoder.flush(zlib.Z_SYNC_FLUSH) if is_zlib else encoder.flush()
+                    size_out += len(out)
+                    yield out
+            start = time.thread_time()
+            out = encoder.flush() if is_zlib else encoder.finish()
+            cpu += time.thread_time() - start
+            size_out += len(out)
+            yield out
+        finally:
+            self._record(encoding, size_in, size_out, cpu, streamed=True)
+
+    def _record(self, encoding, size_in, size_out, cpu, streamed=False):
+        with self._lock:
+            totals = self._totals[encoding]
+            totals[0] += 1
+            totals[1] += size_in
+            totals[2] += size_out
+            totals[3] += cpu
+            if streamed:
+                self.streamed += 1
+
+    def totals(self, field):
+        """{encoding: value} of 'responses', 'bytes_in', 'bytes_out' or 'cpu_seconds'."""
+        index = ('responses', 'bytes_in', 'bytes_out', 'cpu_seconds').index(field)
+        with self._lock:
+            return {e: t[index] for e, t in self._totals.items()}
+
+    def stats(self):
+        with self._lock:
+            return {
+                'encodings': list(self.encodings),
+                'min_size': self.min_size,
+                'streamed': self.streamed,
+                'by_encoding': {
+                    e: {
+                        'responses': n,
+                        'bytes_in': size_in,
+                        'bytes_out': size_out,
+                        'ratio': round(size_out / size_in, 4) if size_in else None,
+                        'cpu_ms': round(cpu * 1000, 3),
+                    } for e, (n, size_in, size_out, cpu) in self._totals.items()
+                },
+            }
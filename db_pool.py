@@ -0,0 +1,190 @@
+"""A small, bounded pool of database connections.
+
+app.py hands out one pooled connection per request (see get_db_connection);
+calling close() on it returns the underlying connection to the pool instead
+of tearing down the TCP connection and redoing the MySQL handshake.
+"""
+import logging
+import threading
+import time
+from collections import deque
+
+logger = logging.getLogger(__name__)
+
+
+class PoolTimeout(Exception):
+    """Raised when no connection became available within the wait timeout."""
+
+
+class PooledConnection:
+    """Proxy around a raw connection; close() checks it back in to the pool."""
+
+    def __init__(self, pool, raw):
+        self._pool = pool
+        self._raw = raw
+        self.released = False
+
+    def __getattr__(self, name):
+        return getattr(self._raw, name)
+
+    def close(self):
+        if self.released:
+            return
+        self.released = True
+        self._pool._checkin(self._raw)
+
+    def invalidate(self):
+        """Drop the underlying connection instead of returning it to the pool."""
+        if self.released:
+            return
+        self.released = True
+        self._pool._checkin(self._raw, discard=True)
+
+
+class ConnectionPool:
+    """Bounded connection pool with overflow, wait timeout and health checks.
+
+    - pool_size connections are kept open once created
+    - up to max_overflow extra connections may be opened under load; they
+      are closed on checkin instead of being kept idle
+    - when everything is checked out, callers wait up to `timeout` seconds
+    - idle connections older than `recycle` seconds are reopened, and
+      connections idle for longer than `ping_after` seconds are pinged
+      before being handed out
+    """
+
+    def __init__(self, creator, pool_size=5, max_overflow=10, timeout=10.0,
+                 recycle=3600, ping_after=30.0):
+        self._creator = creator
+        self.pool_size = pool_size
+        self.max_overflow = max_overflow
+        self.timeout = timeout
+        self.recycle = recycle
+        self.ping_after = ping_after
+
+        self._cond = threading.Condition()
+        self._idle = deque()  # (raw, created_at, last_used)
+        self._created_at = {}  # id(raw) -> created_at for checked-out conns
+        self._open = 0
+        self._in_use = 0
+
+        self._checkouts = 0
+        self._waits = 0
+        self._timeouts = 0
+        self._wait_time = 0.0
+        self._max_wait = 0.0
+        self._health_failures = 0
+
+    def checkout(self):
+        start = time.monotonic()
+        deadline = start + self.timeout
+        waited = False
+        with self._cond:
+            while True:
+                if self._idle:
+                    raw, created_at, last_used = self._idle.pop()
+                    break
+                if self._open < self.pool_size + self.max_overflow:
+                    raw, created_at, last_used = None, None, None
+                    self._open += 1
+                    break
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    self._timeouts += 1
+                    raise PoolTimeout('timed out after %.1fs waiting for a database connection' % self.timeout)
+                waited = True
+                self._cond.wait(remaining)
+            self._in_use += 1
+            self._checkouts += 1
+            if waited:
+                self._waits += 1
+            elapsed = time.monotonic() - start
+            self._wait_time += elapsed
+            self._max_wait = max(self._max_wait, elapsed)
+
+        try:
+            if raw is not None:
+                raw, created_at = self._ensure_healthy(raw, created_at, last_used)
+            else:
+                raw, created_at = self._creator(), time.monotonic()
+        except Exception:
+            with self._cond:
+                self._open -= 1
+                self._in_use -= 1
+                self._cond.notify()
+            raise
+
+        self._created_at[id(raw)] = created_at
+        return PooledConnection(self, raw)
+
+    def _ensure_healthy(self, raw, created_at, last_used):
+        now = time.monotonic()
+        if self.recycle and now - created_at > self.recycle:
+            self._close_quietly(raw)
+            return self._creator(), time.monotonic()
+        if self.ping_after is not None and now - last_used > self.ping_after:
+            try:
+                raw.ping(reconnect=False)
+            except Exception:
+                self._health_failures += 1
+                logger.warning('Discarding stale pooled connection')
+                self._close_quietly(raw)
+                return self._creator(), time.monotonic()
+        return raw, created_at
+
+    def _checkin(self, raw, discard=False):
+        created_at = self._created_at.pop(id(raw), time.monotonic())
+        if not discard:
+            # never hand an open transaction to the next request
+            try:
+                raw.rollback()
+            except Exception:
+                discard = True
+
+        with self._cond:
+            self._in_use -= 1
+            if discard or self._open > self.pool_size:
+                self._open -= 1
+                close_it = True
+            else:
+                self._idle.append((raw, created_at, time.monotonic()))
+                close_it = False
+            self._cond.notify()
+
+        if close_it:
+            self._close_quietly(raw)
+
+    @staticmethod
+    def _close_quietly(raw):
+        try:
+            raw.close()
+        except Exception:
+            pass
+
+    def dispose(self):
+        """Close every idle connection (checked-out ones close on checkin)."""
+        with self._cond:
+            idle = list(self._idle)
+            self._idle.clear()
+            self._open -= len(idle)
+        for raw, _, _ in idle:
+            self._close_quietly(raw)
+
+    def stats(self):
+        with self._cond:
+            checkouts = self._checkouts
+            return {
+                'pool_size': self.pool_size,
+                'max_overflow': self.max_overflow,
+                'open': self._open,
+                'in_use': self._in_use,
+                'idle': len(self._idle),
+                'overflow': max(0, self._open - self.pool_size),
+                'checkouts': checkouts,
+                'waits': self._waits,
+                'timeouts': self._timeouts,
+                'health_check_failures': self._health_failures,
+                'wait_time_total_ms': round(self._wait_time * 1000, 3),
+                'wait_time_avg_ms': round(self._wait_time * 1000 / checkouts, 3) if checkouts else 0.0,
+                'wait_time_max_ms': round(self._max_wait * 1000, 3),
+            }
@@ -0,0 +1,189 @@
+"""In-process fan-out of live review updates as server-sent events.
+
+Write routes publish small delta events (new review, counter change,
+comment added or removed, review deleted) on the channel of the canteen
+they touched; /api/stream subscribers receive them as text/event-stream.
+
+Each channel keeps the last `backlog` events in a ring buffer. A
+subscriber holds nothing but its position in that buffer and sleeps on the
+channel's condition, so publishing is one append plus a wake-up of that
+canteen's readers, however many are connected. The event id carries a
+per-process boot id, so a browser reconnecting with Last-Event-ID resumes
+where it left off, or is sent a `reset` event (reload the list) when the
+events it missed are no longer buffered or came from another process.
+
+Streams end after `max_age` seconds; EventSource reconnects on its own,
+which keeps long-lived request threads from piling up. Like review_cache,
+the hub lives in one worker process and only sees that worker's writes.
+"""
+import json
+import secrets
+import threading
+import time
+from collections import deque
+
+ALL = '*'  # channel receiving every event
+
+
+class HubFull(Exception):
+    """max_subscribers streams are already open."""
+
+
+class _Channel:
+    __slots__ = ('cond', 'events', 'evicted')
+
+    def __init__(self, lock):
+        self.cond = threading.Condition(lock)
+        self.events = deque()  # (seq, event, payload), oldest first
+        self.evicted = 0  # seq of the newest event dropped from the buffer
+
+
+class _Stream:
+    """One subscriber's chunks. Holds its subscriber slot from
+    EventHub.stream() until it is exhausted or closed, whether or not it
+    was ever iterated (a generator that never started would not run its
+    finally block)."""
+
+    def __init__(self, hub, chunks):
+        self._hub = hub
+        self._chunks = chunks
+        self._open = True
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        try:
+            return next(self._chunks)
+        except StopIteration:
+            self.close()
+            raise
+
+    def close(self):
+        self._chunks.close()
+        if self._open:
+            self._open = False
+            self._hub._release()
+
+    def __del__(self):
+        self.close()
+
+
+class EventHub:
+
+    def __init__(self, backlog=256, heartbeat=15.0, max_age=300.0, max_subscribers=500, retry_ms=3000):
+        self.backlog = backlog
+        self.heartbeat = heartbeat
+        self.max_age = max_age
+        self.max_subscribers = max_subscribers
+        self.retry_ms = retry_ms
+        self.boot_id = secrets.token_hex(4)
+
+        self._lock = threading.Lock()
+        self._channels = {}
+        self._seq = 0
+        self._closed = False
+
+        self.subscribers = 0
+        self.max_seen = 0
+        self.published = 0
+        self.rejected = 0
+
+    def _channel(self, key):
+        ch = self._channels.get(key)
+        if ch is None:
+            ch = self._channels[key] = _Channel(self._lock)
+        return ch
+
+    def publish(self, channel, event, data):
+        """Queue one event for subscribers of `channel` (and of ALL)."""
+        payload = json.dumps(data, separators=(',', ':'), default=str)
+        with self._lock:
+            self._seq += 1
+            self.published += 1
+            for key in {channel, ALL}:
+                ch = self._channel(key)
+                ch.events.append((self._seq, event, payload))
+                if len(ch.events) > self.backlog:
+                    ch.evicted = ch.events.popleft()[0]
+                ch.cond.notify_all()
+
+    def _parse_last_id(self, last_id):
+        """Sequence number from a Last-Event-ID header, or None if it was
+        issued by another process."""
+        boot, _, seq = (last_id or '').partition('-')
+        if boot != self.boot_id or not seq.isdigit():
+            return None
+        return int(seq)
+
+    def stream(self, channel, last_id=None):
+        """Iterator of SSE-formatted chunks for one subscriber; close() it
+        to give up its slot early.
+
+        Raises HubFull if too many streams are open. The slot is taken here,
+        under the lock, so concurrent connects cannot overshoot the cap.
+        """
+        with self._lock:
+            if self._closed or self.subscribers >= self.max_subscribers:
+                self.rejected += 1
+                raise HubFull()
+            self.subscribers += 1
+            self.max_seen = max(self.max_seen, self.subscribers)
+            ch = self._channel(channel)
+            position = self._seq
+            reset = False
+            if last_id:
+                resumed = self._parse_last_id(last_id)
+                if resumed is None or resumed < ch.evicted:
+                    reset = True
+                else:
+                    position = resumed
+        return _Stream(self, self._iter(ch, position, reset))
+
+    def _release(self):
+        with self._lock:
+            self.subscribers -= 1
+
+    def _iter(self, ch, position, reset):
+        deadline = time.monotonic() + self.max_age
+        yield f'retry: {self.retry_ms}\n\n'
+        if reset:
+            yield self._format(position, 'reset', '{}')
+        while True:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return
+            with self._lock:
+                pending = [e for e in ch.events if e[0] > position]
+                if not pending and not self._closed:
+                    ch.cond.wait(min(self.heartbeat, remaining))
+                    pending = [e for e in ch.events if e[0] > position]
+                if self._closed:
+                    return
+            if not pending:
+                yield ': keepalive\n\n'
+                continue
+            for seq, event, payload in pending:
+                position = seq
+                yield self._format(seq, event, payload)
+
+    def _format(self, seq, event, payload):
+        return f'id: {self.boot_id}-{seq}\nevent: {event}\ndata: {payload}\n\n'
+
+    def close(self):
+        """End every open stream (on shutdown)."""
+        with self._lock:
+            self._closed = True
+            for ch in self._channels.values():
+                ch.cond.notify_all()
+
+    def stats(self):
+        with self._lock:
+            return {
+                'subscribers': self.subscribers,
+                'max_subscribers_seen': self.max_seen,
+                'max_subscribers': self.max_subscribers,
+                'published': self.published,
+                'rejected': self.rejected,
+                'channels': len(self._channels),
+            }
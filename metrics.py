@@ -0,0 +1,291 @@
+"""Per-route request metrics in the Prometheus text format.
+
+app.py starts a RequestTrace for every request and wraps the request's
+pooled connection in a TracedConnection, whose cursors count statements,
+time spent in execute() and rows fetched. When the request ends the trace
+is folded into per-route totals: a latency histogram, a status counter and
+statement / DB time / row / response byte counters, served on /metrics.
+
+Requests slower than `slow_ms` are logged (logger "metrics.slow") with
+every statement they ran and how long each took.
+
+Routes are labelled by their URL rule ("/upvote/<int:review_id>"), so the
+number of series stays bounded. With metrics disabled app.py neither
+starts traces nor wraps connections.
+
+Views can declare a query budget with @query_budget(n): the most
+statements one request may run. check_query_budget() also flags a
+statement shape (SQL with IN lists collapsed) that repeats more often than
+allowed, the signature of a per-row query in a loop. app.py logs
+violations, or raises QueryBudgetExceeded in test mode.
+"""
+import logging
+import re
+import threading
+import time
+from collections import Counter
+
+slow_log = logging.getLogger('metrics.slow')
+
+# request latency buckets, in seconds
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+# statements kept per request for the slow log and the repeat check
+MAX_TRACED_STATEMENTS = 200
+IN_LIST = re.compile(r'IN \((?:%s, )*%s\)')
+
+
+class QueryBudgetExceeded(Exception):
+    """A request ran more statements than its view's query budget, or one
+    statement shape more often than allowed."""
+
+
+def query_budget(queries, repeats=None):
+    """Declare the most SQL statements a view may run per request, and
+    optionally how often one statement shape may repeat (default: the app's
+    QUERY_REPEAT_LIMIT). The view itself is returned unchanged."""
+    def decorate(view):
+        view.query_budget = (queries, repeats)
+        return view
+    return decorate
+
+
+def statement_shape(sql):
+    return IN_LIST.sub('IN (...)', ' '.join(sql.split()))
+
+
+class RequestTrace:
+    __slots__ = ('start', 'statements', 'db_time', 'rows', 'log', 'raise_over')
+
+    def __init__(self, raise_over=None):
+        self.start = time.perf_counter()
+        self.statements = 0
+        self.db_time = 0.0
+        self.rows = 0
+        self.log = []  # (seconds, sql), first MAX_TRACED_STATEMENTS only
+        # raise as soon as more statements than this have run (test mode),
+        # so the traceback points at the offending call
+        self.raise_over = raise_over
+
+    def record(self, sql, elapsed):
+        self.statements += 1
+        self.db_time += elapsed
+        if len(self.log) < MAX_TRACED_STATEMENTS:
+            self.log.append((elapsed, sql))
+        if self.raise_over is not None and self.statements > self.raise_over:
+            self.raise_over = None
+            raise QueryBudgetExceeded(f'statement {self.statements} is over the query budget of '
+                                      f'{self.statements - 1}: {statement_shape(sql)[:200]}')
+
+
+def check_query_budget(trace, budget, repeat_limit):
+    """Human-readable violations of a view's budget ((queries, repeats) or
+    None) by a finished request; empty if there are none."""
+    queries, repeats = budget or (None, None)
+    repeats = repeats or repeat_limit
+    problems = []
+    if queries is not None and trace.statements > queries:
+        problems.append(f'{trace.statements} statements, budget {queries}')
+    if repeats:
+        for shape, n in Counter(statement_shape(sql) for _, sql in trace.log).most_common():
+            if n <= repeats:
+                break
+            problems.append(f'{n}x {shape[:200]}')
+    return problems
+
+
+class TracedCursor:
+    def __init__(self, cursor, trace):
+        self._cursor = cursor
+        self._trace = trace
+
+    def __getattr__(self, name):
+        return getattr(self._cursor, name)
+
+    def execute(self, sql, params=None):
+        start = time.perf_counter()
+        try:
+            return self._cursor.execute(sql, params)
+        finally:
+            self._trace.record(sql, time.perf_counter() - start)
+
+    def executemany(self, sql, seq):
+        start = time.perf_counter()
+        try:
+            return self._cursor.executemany(sql, seq)
+        finally:
+            self._trace.record(sql, time.perf_counter() - start)
+
+    def fetchone(self):
+        row = self._cursor.fetchone()
+        if row is not None:
+            self._trace.rows += 1
+        return row
+
+    def fetchall(self):
+        rows = self._cursor.fetchall()
+        self._trace.rows += len(rows)
+        return rows
+
+    def fetchmany(self, size=None):
+        rows = self._cursor.fetchmany(size) if size is not None else self._cursor.fetchmany()
+        self._trace.rows += len(rows)
+        return rows
+
+    def __iter__(self):
+        for row in self._cursor:
+            self._trace.rows += 1
+            yield row
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self._cursor.close()
+
+
+class TracedConnection:
+    """Proxy of a (pooled) connection whose cursors report to a RequestTrace."""
+
+    def __init__(self, conn, trace):
+        self._conn = conn
+        self._trace = trace
+
+    def __getattr__(self, name):
+        return getattr(self._conn, name)
+
+    def cursor(self, *args, **kwargs):
+        return TracedCursor(self._conn.cursor(*args, **kwargs), self._trace)
+
+    def close(self):
+        self._conn.close()
+
+
+class _RouteStats:
+    __slots__ = ('buckets', 'latency_sum', 'count', 'statuses', 'statements', 'db_time', 'rows', 'bytes')
+
+    def __init__(self):
+        self.buckets = [0] * len(LATENCY_BUCKETS)
+        self.latency_sum = 0.0
+        self.count = 0
+        self.statuses = {}
+        self.statements = 0
+        self.db_time = 0.0
+        self.rows = 0
+        self.bytes = 0
+
+
+class Metrics:
+
+    def __init__(self, slow_ms=500.0):
+        self.slow_ms = slow_ms
+        self._lock = threading.Lock()
+        self._routes = {}  # (route, method) -> _RouteStats
+        self._gauges = []  # (name, help, fn)
+        self._counters = []  # (name, help, label, fn)
+        self.slow_requests = 0
+
+    def add_gauge(self, name, help_text, fn):
+        """Report fn() as a gauge on every scrape."""
+        self._gauges.append((name, help_text, fn))
+
+    def add_counter(self, name, help_text, label, fn):
+        """Report fn(), a {label value: count} dict, as a labelled counter on
+        every scrape."""
+        self._counters.append((name, help_text, label, fn))
+
+    def finish(self, trace, route, method, status, response_bytes):
+        """Fold a finished request into the per-route totals."""
+        elapsed = time.perf_counter() - trace.start
+        with self._lock:
+            stats = self._routes.get((route, method))
+            if stats is None:
+                stats = self._routes[(route, method)] = _RouteStats()
+            for i, bound in enumerate(LATENCY_BUCKETS):
+                if elapsed <= bound:
+                    stats.buckets[i] += 1
+                    break
+            stats.latency_sum += elapsed
+            stats.count += 1
+            stats.statuses[status] = stats.statuses.get(status, 0) + 1
+            stats.statements += trace.statements
+            stats.db_time += trace.db_time
+            stats.rows += trace.rows
+            stats.bytes += response_bytes or 0
+
+        if self.slow_ms and elapsed * 1000 >= self.slow_ms:
+            with self._lock:
+                self.slow_requests += 1
+            lines = [f'  {t * 1000:8.2f} ms  {" ".join(sql.split())[:500]}' for t, sql in trace.log]
+            if trace.statements > len(trace.log):
+                lines.append(f'  ... {trace.statements - len(trace.log)} more statement(s)')
+            slow_log.warning('Slow request %s %s: %.1f ms, %d statement(s), %.1f ms in the database\n%s',
+                             method, route, elapsed * 1000, trace.statements, trace.db_time * 1000,
+                             '\n'.join(lines))
+
+    def render(self):
+        """All series in the Prometheus text exposition format."""
+        with self._lock:
+            routes = sorted(self._routes.items())
+            snapshot = [(key, list(s.buckets), s.latency_sum, s.count, dict(s.statuses),
+                         s.statements, s.db_time, s.rows, s.bytes) for key, s in routes]
+            slow = self.slow_requests
+
+        out = []
+
+        def family(name, kind, help_text):
+            out.append(f'# HELP {name} {help_text}')
+            out.append(f'# TYPE {name} {kind}')
+
+        family('http_request_duration_seconds', 'histogram', 'Request latency by route.')
+        for (route, method), buckets, total, count, _, _, _, _, _ in snapshot:
+            labels = f'route="{_escape(route)}",method="{method}"'
+            cumulative = 0
+            for bound, n in zip(LATENCY_BUCKETS, buckets):
+                cumulative += n
+                out.append(f'http_request_duration_seconds_bucket{{{labels},le="{bound}"}} {cumulative}')
+            out.append(f'http_request_duration_seconds_bucket{{{labels},le="+Inf"}} {count}')
+            out.append(f'http_request_duration_seconds_sum{{{labels}}} {total:.6f}')
+            out.append(f'http_request_duration_seconds_count{{{labels}}} {count}')
+
+        family('http_requests_total', 'counter', 'Requests by route and status code.')
+        for (route, method), _, _, _, statuses, _, _, _, _ in snapshot:
+            for status, n in sorted(statuses.items()):
+                out.append(f'http_requests_total{{route="{_escape(route)}",method="{method}",status="{status}"}} {n}')
+
+        counters = (
+            ('db_statements_total', 'SQL statements executed by route.', 5, '{}'),
+            ('db_time_seconds_total', 'Time spent executing SQL by route.', 6, '{:.6f}'),
+            ('db_rows_fetched_total', 'Rows fetched from the database by route.', 7, '{}'),
+            ('http_response_bytes_total', 'Response body bytes by route (streamed bodies excluded).', 8, '{}'),
+        )
+        for name, help_text, index, fmt in counters:
+            family(name, 'counter', help_text)
+            for row in snapshot:
+                route, method = row[0]
+                out.append(f'{name}{{route="{_escape(route)}",method="{method}"}} {fmt.format(row[index])}')
+
+        family('http_slow_requests_total', 'counter', 'Requests that went to the slow request log.')
+        out.append(f'http_slow_requests_total {slow}')
+
+        for name, help_text, label, fn in self._counters:
+            try:
+                values = fn()
+            except Exception:
+                continue
+            family(name, 'counter', help_text)
+            for key, value in sorted(values.items()):
+                value = f'{value:.6f}' if isinstance(value, float) else value
+                out.append(f'{name}{{{label}="{_escape(str(key))}"}} {value}')
+
+        for name, help_text, fn in self._gauges:
+            try:
+                value = fn()
+            except Exception:
+                continue
+            family(name, 'gauge', help_text)
+            out.append(f'{name} {value}')
+        return '\n'.join(out) + '\n'
+
+
+def _escape(value):
+    return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
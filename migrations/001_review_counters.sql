@@ -0,0 +1,69 @@
+-- Denormalized interaction counters on FoodReviews.
+-- The counters are maintained by AFTER INSERT/DELETE triggers, so every write
+-- path (the app routes, AddReviewWithActivity, manual SQL) keeps them in sync
+-- inside the same transaction. `flask reconcile-counters` recomputes them from
+-- Upvotes/Favorites/Comments and reports drift.
+USE food;
+
+ALTER TABLE FoodReviews
+    ADD COLUMN UpvoteCount INT NOT NULL DEFAULT 0,
+    ADD COLUMN FavoriteCount INT NOT NULL DEFAULT 0,
+    ADD COLUMN CommentCount INT NOT NULL DEFAULT 0;
+
+-- Backfill from the base tables
+UPDATE FoodReviews r
+SET r.UpvoteCount = (SELECT COUNT(*) FROM Upvotes u WHERE u.ReviewID = r.ReviewID),
+    r.FavoriteCount = (SELECT COUNT(*) FROM Favorites f WHERE f.ReviewID = r.ReviewID),
+    r.CommentCount = (SELECT COUNT(*) FROM Comments c WHERE c.ReviewID = r.ReviewID);
+
+-- Canteen listings are served straight from these indexes (InnoDB appends the
+-- ReviewID primary key, which is the keyset tie-breaker).
+CREATE INDEX idx_reviews_canteen_upvotes ON FoodReviews (CanteenID, UpvoteCount);
+CREATE INDEX idx_reviews_canteen_popular ON FoodReviews (CanteenID, UpvoteCount, Rating);
+CREATE INDEX idx_reviews_canteen_date ON FoodReviews (CanteenID, SubmissionDate);
+CREATE INDEX idx_reviews_canteen_price ON FoodReviews (CanteenID, Price);
+CREATE INDEX idx_reviews_canteen_spice ON FoodReviews (CanteenID, SpiceLevel);
+
+DELIMITER $$
+CREATE TRIGGER trg_upvotes_after_insert_count
+AFTER INSERT ON Upvotes
+FOR EACH ROW
+BEGIN
+  UPDATE FoodReviews SET UpvoteCount = UpvoteCount + 1 WHERE ReviewID = NEW.ReviewID;
+END$$
+
+CREATE TRIGGER trg_upvotes_after_delete_count
+AFTER DELETE ON Upvotes
+FOR EACH ROW
+BEGIN
+  UPDATE FoodReviews SET UpvoteCount = GREATEST(UpvoteCount - 1, 0) WHERE ReviewID = OLD.ReviewID;
+END$$
+
+CREATE TRIGGER trg_favorites_after_insert_count
+AFTER INSERT ON Favorites
+FOR EACH ROW
+BEGIN
+  UPDATE FoodReviews SET FavoriteCount = FavoriteCount + 1 WHERE ReviewID = NEW.ReviewID;
+END$$
+
+CREATE TRIGGER trg_favorites_after_delete_count
+AFTER DELETE ON Favorites
+FOR EACH ROW
+BEGIN
+  UPDATE FoodReviews SET FavoriteCount = GREATEST(FavoriteCount - 1, 0) WHERE ReviewID = OLD.ReviewID;
+END$$
+
+CREATE TRIGGER trg_comments_after_insert_count
+AFTER INSERT ON Comments
+FOR EACH ROW
+BEGIN
+  UPDATE FoodReviews SET CommentCount = CommentCount + 1 WHERE ReviewID = NEW.ReviewID;
+END$$
+
+CREATE TRIGGER trg_comments_after_delete_count
+AFTER DELETE ON Comments
+FOR EACH ROW
+BEGIN
+  UPDATE FoodReviews SET CommentCount = GREATEST(CommentCount - 1, 0) WHERE ReviewID = OLD.ReviewID;
+END$$
+DELIMITER ;
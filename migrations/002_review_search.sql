@@ -0,0 +1,8 @@
+-- FULLTEXT indexes backing /api/search.
+-- ft_reviews_text answers the match itself; ft_reviews_name is only used to
+-- weight hits in the dish name above hits in the review body.
+-- InnoDB builds one FULLTEXT index per statement.
+USE food;
+
+CREATE FULLTEXT INDEX ft_reviews_text ON FoodReviews (FoodName, Review);
+CREATE FULLTEXT INDEX ft_reviews_name ON FoodReviews (FoodName);
@@ -0,0 +1,153 @@
+-- Materialized per-dish statistics.
+-- A dish is (CanteenID, FoodKey) where FoodKey is the normalized food name.
+-- Counts and sums are adjusted incrementally by the FoodReviews triggers
+-- below; min/max/median price are re-read from idx_reviews_dish, which only
+-- touches the rows of that one dish. /api/dishes and GetAverageRating read
+-- this table instead of aggregating FoodReviews.
+USE food;
+
+ALTER TABLE FoodReviews
+    ADD COLUMN FoodKey VARCHAR(255) GENERATED ALWAYS AS (LOWER(TRIM(FoodName))) STORED;
+CREATE INDEX idx_reviews_dish ON FoodReviews (CanteenID, FoodKey, Price);
+
+CREATE TABLE DishStats (
+    CanteenID INT NOT NULL,
+    FoodKey VARCHAR(255) NOT NULL,
+    FoodName VARCHAR(255) NOT NULL,     -- display spelling of the latest review
+    ReviewCount INT NOT NULL DEFAULT 0,
+    RatingSum INT NOT NULL DEFAULT 0,
+    SpiceSum INT NOT NULL DEFAULT 0,
+    SpiceCount INT NOT NULL DEFAULT 0,  -- reviews with a SpiceLevel
+    AvgRating DECIMAL(5,2) AS (RatingSum / NULLIF(ReviewCount, 0)) STORED,
+    AvgSpice DECIMAL(5,2) AS (SpiceSum / NULLIF(SpiceCount, 0)) STORED,
+    MinPrice DECIMAL(10,2),
+    MaxPrice DECIMAL(10,2),
+    MedianPrice DECIMAL(10,2),
+    UpdatedAt TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
+    PRIMARY KEY (CanteenID, FoodKey),
+    INDEX idx_dish_key (FoodKey),
+    FOREIGN KEY (CanteenID) REFERENCES canteens(canteen_id)
+);
+
+DELIMITER //
+
+-- Recompute min/max/median price of one dish from idx_reviews_dish
+CREATE PROCEDURE RefreshDishPrices(IN p_canteen_id INT, IN p_food_key VARCHAR(255))
+BEGIN
+    DECLARE n INT;
+    DECLARE lo_pos INT;
+    DECLARE hi_pos INT;
+    DECLARE lo DECIMAL(10,2);
+    DECLARE hi DECIMAL(10,2);
+    -- keep "no row" lookups from reaching a caller's NOT FOUND handler
+    DECLARE CONTINUE HANDLER FOR NOT FOUND BEGIN END;
+
+    SELECT ReviewCount INTO n FROM DishStats
+    WHERE CanteenID = p_canteen_id AND FoodKey = p_food_key;
+
+    IF n IS NOT NULL AND n > 0 THEN
+        SET lo_pos = FLOOR((n - 1) / 2);
+        SET hi_pos = FLOOR(n / 2);
+        SELECT Price INTO lo FROM FoodReviews
+        WHERE CanteenID = p_canteen_id AND FoodKey = p_food_key
+        ORDER BY Price LIMIT lo_pos, 1;
+        SELECT Price INTO hi FROM FoodReviews
+        WHERE CanteenID = p_canteen_id AND FoodKey = p_food_key
+        ORDER BY Price LIMIT hi_pos, 1;
+
+        UPDATE DishStats s
+        SET s.MinPrice = (SELECT MIN(Price) FROM FoodReviews WHERE CanteenID = p_canteen_id AND FoodKey = p_food_key),
+            s.MaxPrice = (SELECT MAX(Price) FROM FoodReviews WHERE CanteenID = p_canteen_id AND FoodKey = p_food_key),
+            s.MedianPrice = (lo + hi) / 2
+        WHERE s.CanteenID = p_canteen_id AND s.FoodKey = p_food_key;
+    END IF;
+END;
+//
+
+-- Full rebuild, used for the initial backfill and by `flask rebuild-dish-stats`
+CREATE PROCEDURE RebuildDishStats()
+BEGIN
+    DECLARE done INT DEFAULT 0;
+    DECLARE c_id INT;
+    DECLARE f_key VARCHAR(255);
+    DECLARE dishes CURSOR FOR SELECT CanteenID, FoodKey FROM DishStats;
+    DECLARE CONTINUE HANDLER FOR NOT FOUND SET done = 1;
+
+    DELETE FROM DishStats;
+    INSERT INTO DishStats (CanteenID, FoodKey, FoodName, ReviewCount, RatingSum, SpiceSum, SpiceCount)
+    SELECT CanteenID, FoodKey, ANY_VALUE(FoodName), COUNT(*), SUM(Rating),
+           COALESCE(SUM(SpiceLevel), 0), COUNT(SpiceLevel)
+    FROM FoodReviews
+    WHERE CanteenID IS NOT NULL
+    GROUP BY CanteenID, FoodKey;
+
+    OPEN dishes;
+    read_loop: LOOP
+        FETCH dishes INTO c_id, f_key;
+        IF done THEN
+            LEAVE read_loop;
+        END IF;
+        CALL RefreshDishPrices(c_id, f_key);
+    END LOOP;
+    CLOSE dishes;
+END;
+//
+
+-- There is deliberately no AFTER UPDATE trigger: the counter triggers from
+-- 001 update FoodReviews on every upvote, and the app never edits a
+-- review's name, price, rating or spice level.
+CREATE TRIGGER trg_reviews_after_insert_dish
+AFTER INSERT ON FoodReviews
+FOR EACH ROW
+BEGIN
+    IF NEW.CanteenID IS NOT NULL THEN
+        INSERT INTO DishStats (CanteenID, FoodKey, FoodName, ReviewCount, RatingSum, SpiceSum, SpiceCount)
+        VALUES (NEW.CanteenID, LOWER(TRIM(NEW.FoodName)), NEW.FoodName, 1, NEW.Rating,
+                COALESCE(NEW.SpiceLevel, 0), NEW.SpiceLevel IS NOT NULL)
+        ON DUPLICATE KEY UPDATE
+            FoodName = VALUES(FoodName),
+            ReviewCount = ReviewCount + 1,
+            RatingSum = RatingSum + VALUES(RatingSum),
+            SpiceSum = SpiceSum + VALUES(SpiceSum),
+            SpiceCount = SpiceCount + VALUES(SpiceCount);
+        CALL RefreshDishPrices(NEW.CanteenID, LOWER(TRIM(NEW.FoodName)));
+    END IF;
+END;
+//
+
+CREATE TRIGGER trg_reviews_after_delete_dish
+AFTER DELETE ON FoodReviews
+FOR EACH ROW
+BEGIN
+    IF OLD.CanteenID IS NOT NULL THEN
+        UPDATE DishStats
+        SET ReviewCount = ReviewCount - 1,
+            RatingSum = RatingSum - OLD.Rating,
+            SpiceSum = SpiceSum - COALESCE(OLD.SpiceLevel, 0),
+            SpiceCount = SpiceCount - (OLD.SpiceLevel IS NOT NULL)
+        WHERE CanteenID = OLD.CanteenID AND FoodKey = OLD.FoodKey;
+        DELETE FROM DishStats
+        WHERE CanteenID = OLD.CanteenID AND FoodKey = OLD.FoodKey AND ReviewCount <= 0;
+        CALL RefreshDishPrices(OLD.CanteenID, OLD.FoodKey);
+    END IF;
+END;
+//
+
+-- Average rating of a dish across all canteens, now an indexed DishStats read
+DROP FUNCTION IF EXISTS GetAverageRating;
+//
+CREATE FUNCTION GetAverageRating(food_name VARCHAR(255))
+RETURNS DECIMAL(5,2)
+READS SQL DATA
+BEGIN
+    DECLARE avg_rating DECIMAL(5,2);
+    SELECT SUM(RatingSum) / NULLIF(SUM(ReviewCount), 0) INTO avg_rating
+    FROM DishStats
+    WHERE FoodKey = LOWER(TRIM(food_name));
+    RETURN avg_rating;
+END;
+//
+
+DELIMITER ;
+
+CALL RebuildDishStats();
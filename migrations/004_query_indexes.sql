@@ -0,0 +1,19 @@
+-- Secondary indexes for the remaining hot predicates in app.py.
+-- Canteen listings already use the idx_reviews_canteen_* indexes from 001.
+-- Each index below starts with a foreign-key column, so InnoDB drops the
+-- single-column index it created for that foreign key on its own.
+-- `python -m bench.explain` EXPLAINs every statement the routes run and
+-- fails on full table scans; run it after changing a query or an index.
+USE food;
+
+-- /api/my_reviews: WHERE UserID = ? ORDER BY SubmissionDate DESC
+CREATE INDEX idx_reviews_user_date ON FoodReviews (UserID, SubmissionDate);
+
+-- comments of a page of reviews, oldest first
+CREATE INDEX idx_comments_review_date ON Comments (ReviewID, CommentDate);
+
+-- /api/activity_feed: WHERE UserID = ? ORDER BY ActivityTime DESC LIMIT 50
+CREATE INDEX idx_activity_user_time ON UserActivity (UserID, ActivityTime);
+
+-- removing the activity row of an undone upvote / favorite / comment
+CREATE INDEX idx_activity_user_post_type ON UserActivity (UserID, PostID, ActivityType);
@@ -0,0 +1,73 @@
+-- Upvote / favorite toggles in one round trip.
+-- ToggleUpvote / ToggleFavorite flip (p_active NULL) or set (TRUE / FALSE)
+-- a user's interaction with a review and return one row with the new state
+-- and the review's counter; no row means the review does not exist.
+-- The review row is locked first, so concurrent toggles of the same review
+-- (double clicks, two tabs) run one after the other instead of racing
+-- between the existence check and the INSERT. The own-review triggers still
+-- SIGNAL 1644, which leaves nothing changed.
+USE food;
+
+DELIMITER //
+
+CREATE PROCEDURE ToggleUpvote(IN p_user_id INT, IN p_review_id INT, IN p_active BOOLEAN)
+BEGIN
+    DECLARE v_found INT DEFAULT 0;
+    DECLARE v_active BOOLEAN DEFAULT FALSE;
+    DECLARE CONTINUE HANDLER FOR NOT FOUND BEGIN END;
+
+    SELECT 1 INTO v_found FROM FoodReviews WHERE ReviewID = p_review_id FOR UPDATE;
+
+    IF v_found = 1 THEN
+        IF p_active IS NULL THEN
+            DELETE FROM Upvotes WHERE UserID = p_user_id AND ReviewID = p_review_id;
+            IF ROW_COUNT() = 0 THEN
+                INSERT INTO Upvotes (UserID, ReviewID) VALUES (p_user_id, p_review_id);
+                SET v_active = TRUE;
+            END IF;
+        ELSEIF p_active THEN
+            IF NOT EXISTS (SELECT 1 FROM Upvotes WHERE UserID = p_user_id AND ReviewID = p_review_id) THEN
+                INSERT INTO Upvotes (UserID, ReviewID) VALUES (p_user_id, p_review_id);
+            END IF;
+            SET v_active = TRUE;
+        ELSE
+            DELETE FROM Upvotes WHERE UserID = p_user_id AND ReviewID = p_review_id;
+        END IF;
+    END IF;
+
+    SELECT v_active AS active, UpvoteCount AS total, CanteenID, UserID
+    FROM FoodReviews WHERE ReviewID = p_review_id;
+END;
+//
+
+CREATE PROCEDURE ToggleFavorite(IN p_user_id INT, IN p_review_id INT, IN p_active BOOLEAN)
+BEGIN
+    DECLARE v_found INT DEFAULT 0;
+    DECLARE v_active BOOLEAN DEFAULT FALSE;
+    DECLARE CONTINUE HANDLER FOR NOT FOUND BEGIN END;
+
+    SELECT 1 INTO v_found FROM FoodReviews WHERE ReviewID = p_review_id FOR UPDATE;
+
+    IF v_found = 1 THEN
+        IF p_active IS NULL THEN
+            DELETE FROM Favorites WHERE UserID = p_user_id AND ReviewID = p_review_id;
+            IF ROW_COUNT() = 0 THEN
+                INSERT INTO Favorites (UserID, ReviewID) VALUES (p_user_id, p_review_id);
+                SET v_active = TRUE;
+            END IF;
+        ELSEIF p_active THEN
+            IF NOT EXISTS (SELECT 1 FROM Favorites WHERE UserID = p_user_id AND ReviewID = p_review_id) THEN
+                INSERT INTO Favorites (UserID, ReviewID) VALUES (p_user_id, p_review_id);
+            END IF;
+            SET v_active = TRUE;
+        ELSE
+            DELETE FROM Favorites WHERE UserID = p_user_id AND ReviewID = p_review_id;
+        END IF;
+    END IF;
+
+    SELECT v_active AS active, FavoriteCount AS total, CanteenID, UserID
+    FROM FoodReviews WHERE ReviewID = p_review_id;
+END;
+//
+
+DELIMITER ;
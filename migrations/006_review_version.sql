@@ -0,0 +1,19 @@
+-- Row version of FoodReviews, the key of the per-review JSON fragment cache
+-- (review_json.FragmentCache). Every UPDATE of a review row bumps it,
+-- including those made by the counter triggers of 001, so a new upvote,
+-- favorite or comment changes the review's version too.
+USE food;
+
+ALTER TABLE FoodReviews ADD COLUMN Version INT NOT NULL DEFAULT 0;
+
+DELIMITER //
+
+CREATE TRIGGER trg_reviews_before_update_version
+BEFORE UPDATE ON FoodReviews
+FOR EACH ROW
+BEGIN
+    SET NEW.Version = OLD.Version + 1;
+END;
+//
+
+DELIMITER ;
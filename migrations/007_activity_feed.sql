@@ -0,0 +1,66 @@
+-- Join-free, paginated activity feeds.
+-- UserActivity rows now carry the FoodName / CanteenID of their review,
+-- filled in by a trigger as they are written, so /api/activity_feed reads
+-- one index range and still shows what an activity was about once the
+-- review is gone (delete_review detaches activity rows instead of deleting
+-- them).
+-- CampusActivity is an append-only log of the reviews and comments posted
+-- across campus, written by a trigger on UserActivity. The campus feed
+-- pages through it newest first by primary key, so a page costs the same
+-- however long the log grows. Entries go away with their review.
+USE food;
+
+ALTER TABLE UserActivity
+    ADD COLUMN FoodName VARCHAR(255) NULL,
+    ADD COLUMN CanteenID INT NULL;
+
+UPDATE UserActivity a
+JOIN FoodReviews r ON r.ReviewID = a.PostID
+SET a.FoodName = r.FoodName, a.CanteenID = r.CanteenID;
+
+CREATE TABLE CampusActivity (
+    EntryID BIGINT PRIMARY KEY AUTO_INCREMENT,
+    ActivityType VARCHAR(50) NOT NULL,
+    UserID INT NOT NULL,
+    Username VARCHAR(255),
+    PostID INT,
+    FoodName VARCHAR(255),
+    CanteenID INT,
+    ActivityTime TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    INDEX idx_campus_canteen (CanteenID, EntryID),
+    FOREIGN KEY (PostID) REFERENCES FoodReviews(ReviewID) ON DELETE CASCADE
+);
+
+INSERT INTO CampusActivity (ActivityType, UserID, Username, PostID, FoodName, CanteenID, ActivityTime)
+SELECT a.ActivityType, a.UserID, u.username, a.PostID, a.FoodName, a.CanteenID, a.ActivityTime
+FROM UserActivity a
+LEFT JOIN users u ON u.user_id = a.UserID
+WHERE a.ActivityType IN ('review', 'comment') AND a.PostID IS NOT NULL
+ORDER BY a.ActivityTime, a.ActivityID;
+
+DELIMITER //
+
+CREATE TRIGGER trg_activity_before_insert_review
+BEFORE INSERT ON UserActivity
+FOR EACH ROW
+BEGIN
+    IF NEW.PostID IS NOT NULL AND NEW.FoodName IS NULL THEN
+        SET NEW.FoodName = (SELECT FoodName FROM FoodReviews WHERE ReviewID = NEW.PostID),
+            NEW.CanteenID = (SELECT CanteenID FROM FoodReviews WHERE ReviewID = NEW.PostID);
+    END IF;
+END;
+//
+
+CREATE TRIGGER trg_activity_after_insert_campus
+AFTER INSERT ON UserActivity
+FOR EACH ROW
+BEGIN
+    IF NEW.ActivityType IN ('review', 'comment') AND NEW.PostID IS NOT NULL THEN
+        INSERT INTO CampusActivity (ActivityType, UserID, Username, PostID, FoodName, CanteenID, ActivityTime)
+        VALUES (NEW.ActivityType, NEW.UserID, (SELECT username FROM users WHERE user_id = NEW.UserID),
+                NEW.PostID, NEW.FoodName, NEW.CanteenID, NEW.ActivityTime);
+    END IF;
+END;
+//
+
+DELIMITER ;
@@ -0,0 +1,37 @@
+-- Hourly and daily per-canteen analytics rollups.
+-- analytics.RollupJob folds new FoodReviews, Upvotes and UserActivity rows
+-- into CanteenRollups in the background, remembering in RollupWatermarks
+-- the highest primary key it has folded in per source, and records which
+-- users it already counted per bucket in RollupActiveUsers.
+-- /api/analytics/canteen/<id> reads one primary-key range of CanteenRollups.
+-- The watermarks start at 0, so the first runs backfill the history.
+USE food;
+
+CREATE TABLE CanteenRollups (
+    CanteenID INT NOT NULL,
+    Grain ENUM('hour', 'day') NOT NULL,
+    BucketStart DATETIME NOT NULL,
+    ReviewCount INT NOT NULL DEFAULT 0,
+    RatingSum INT NOT NULL DEFAULT 0,
+    PriceSum DECIMAL(14,2) NOT NULL DEFAULT 0,
+    UpvoteCount INT NOT NULL DEFAULT 0,
+    ActiveUsers INT NOT NULL DEFAULT 0,
+    PRIMARY KEY (CanteenID, Grain, BucketStart),
+    FOREIGN KEY (CanteenID) REFERENCES canteens(canteen_id)
+);
+
+CREATE TABLE RollupActiveUsers (
+    CanteenID INT NOT NULL,
+    Grain ENUM('hour', 'day') NOT NULL,
+    BucketStart DATETIME NOT NULL,
+    UserID INT NOT NULL,
+    PRIMARY KEY (CanteenID, Grain, BucketStart, UserID)
+);
+
+CREATE TABLE RollupWatermarks (
+    Source VARCHAR(32) PRIMARY KEY,
+    LastID BIGINT NOT NULL DEFAULT 0,
+    UpdatedAt TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP
+);
+
+INSERT INTO RollupWatermarks (Source) VALUES ('FoodReviews'), ('Upvotes'), ('UserActivity');
@@ -0,0 +1,49 @@
+-- Bulk review imports (`flask import-reviews`, see review_transfer.py).
+-- ReviewImports tracks each import: every committed chunk advances
+-- LinesDone in the same transaction as its rows, so a failed import
+-- resumes after the last committed chunk. PrefixHash is the SHA-256 of the
+-- lines done, used to refuse resuming with a different file under the same
+-- ImportKey.
+-- The DishStats insert trigger from 003 re-read a dish's prices for every
+-- new review. It now leaves that to the session when @defer_dish_prices is
+-- set; the importer sets it and calls RefreshDishPrices once per dish and
+-- chunk instead.
+USE food;
+
+CREATE TABLE ReviewImports (
+    ImportKey VARCHAR(255) PRIMARY KEY,
+    FileName VARCHAR(1024),
+    LinesDone INT NOT NULL DEFAULT 0,
+    PrefixHash CHAR(64),
+    ReviewsImported INT NOT NULL DEFAULT 0,
+    CommentsImported INT NOT NULL DEFAULT 0,
+    StartedAt TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    FinishedAt DATETIME NULL
+);
+
+DROP TRIGGER IF EXISTS trg_reviews_after_insert_dish;
+
+DELIMITER //
+
+CREATE TRIGGER trg_reviews_after_insert_dish
+AFTER INSERT ON FoodReviews
+FOR EACH ROW
+BEGIN
+    IF NEW.CanteenID IS NOT NULL THEN
+        INSERT INTO DishStats (CanteenID, FoodKey, FoodName, ReviewCount, RatingSum, SpiceSum, SpiceCount)
+        VALUES (NEW.CanteenID, LOWER(TRIM(NEW.FoodName)), NEW.FoodName, 1, NEW.Rating,
+                COALESCE(NEW.SpiceLevel, 0), NEW.SpiceLevel IS NOT NULL)
+        ON DUPLICATE KEY UPDATE
+            FoodName = VALUES(FoodName),
+            ReviewCount = ReviewCount + 1,
+            RatingSum = RatingSum + VALUES(RatingSum),
+            SpiceSum = SpiceSum + VALUES(SpiceSum),
+            SpiceCount = SpiceCount + VALUES(SpiceCount);
+        IF @defer_dish_prices IS NULL THEN
+            CALL RefreshDishPrices(NEW.CanteenID, LOWER(TRIM(NEW.FoodName)));
+        END IF;
+    END IF;
+END;
+//
+
+DELIMITER ;
@@ -0,0 +1,10 @@
+-- Spice-sorted canteen listings compare COALESCE(SpiceLevel, 0), the value
+-- the keyset cursor stores for reviews without a spice level (the importer
+-- and AddReviewWithActivity can write NULL). On the bare column, `<` / `>`
+-- never match NULL, so those reviews were skipped or repeated between pages.
+-- The functional key part (MySQL 8.0.13+) lets the listing keep reading the
+-- index in order; InnoDB appends the ReviewID tie-breaker.
+USE food;
+
+CREATE INDEX idx_reviews_canteen_spice_sort ON FoodReviews (CanteenID, (COALESCE(SpiceLevel, 0)));
+DROP INDEX idx_reviews_canteen_spice ON FoodReviews;
@@ -0,0 +1,21 @@
+-- CampusActivity entries of an undone activity.
+-- The campus log from 007 only lost entries with their review, so a
+-- deleted comment stayed in the campus feed. The activity log removes the
+-- user's UserActivity row when a comment (or upvote / favorite) is taken
+-- back; this trigger removes the campus entries written for that row.
+USE food;
+
+DELIMITER //
+
+CREATE TRIGGER trg_activity_after_delete_campus
+AFTER DELETE ON UserActivity
+FOR EACH ROW
+BEGIN
+    IF OLD.ActivityType IN ('review', 'comment') AND OLD.PostID IS NOT NULL THEN
+        DELETE FROM CampusActivity
+        WHERE PostID = OLD.PostID AND UserID = OLD.UserID AND ActivityType = OLD.ActivityType;
+    END IF;
+END;
+//
+
+DELIMITER ;
@@ -0,0 +1,81 @@
+-- Exact undo of a comment's activity.
+-- A user can comment on a review more than once, but UserActivity and
+-- CampusActivity rows only named (user, post, type), so deleting one
+-- comment removed the activity and campus entries of all of the user's
+-- comments on that review (011 matched on those columns too).
+-- UserActivity.CommentID names the comment a 'comment' row was written
+-- for, and CampusActivity.ActivityID the activity row an entry was copied
+-- from; the activity log deletes by CommentID and the delete trigger from
+-- 011 is replaced by one that removes exactly the entry of the deleted row.
+-- Neither column is a foreign key: a cascaded delete would skip the
+-- triggers that keep the campus log in step.
+USE food;
+
+ALTER TABLE UserActivity
+    ADD COLUMN CommentID INT NULL,
+    ADD INDEX idx_activity_comment (CommentID);
+
+ALTER TABLE CampusActivity
+    ADD COLUMN ActivityID INT NULL,
+    ADD INDEX idx_campus_activity (ActivityID);
+
+-- existing rows: pair the n-th comment activity of a user on a review with
+-- their n-th comment on it, and the n-th campus entry with the n-th
+-- activity row it was copied from (both were written in that order)
+UPDATE UserActivity a
+JOIN (
+    SELECT ActivityID, UserID, PostID,
+           ROW_NUMBER() OVER (PARTITION BY UserID, PostID ORDER BY ActivityTime, ActivityID) AS n
+    FROM UserActivity
+    WHERE ActivityType = 'comment' AND PostID IS NOT NULL
+) ua ON ua.ActivityID = a.ActivityID
+JOIN (
+    SELECT CommentID, UserID, ReviewID,
+           ROW_NUMBER() OVER (PARTITION BY UserID, ReviewID ORDER BY CommentDate, CommentID) AS n
+    FROM Comments
+) c ON c.UserID = ua.UserID AND c.ReviewID = ua.PostID AND c.n = ua.n
+SET a.CommentID = c.CommentID;
+
+UPDATE CampusActivity e
+JOIN (
+    SELECT EntryID,
+           ROW_NUMBER() OVER (PARTITION BY UserID, PostID, ActivityType ORDER BY EntryID) AS n
+    FROM CampusActivity
+) ce ON ce.EntryID = e.EntryID
+JOIN (
+    SELECT ActivityID, UserID, PostID, ActivityType,
+           ROW_NUMBER() OVER (PARTITION BY UserID, PostID, ActivityType ORDER BY ActivityTime, ActivityID) AS n
+    FROM UserActivity
+    WHERE ActivityType IN ('review', 'comment') AND PostID IS NOT NULL
+) ua ON ua.UserID = e.UserID AND ua.PostID = e.PostID AND ua.ActivityType = e.ActivityType AND ua.n = ce.n
+SET e.ActivityID = ua.ActivityID;
+
+DROP TRIGGER IF EXISTS trg_activity_after_insert_campus;
+DROP TRIGGER IF EXISTS trg_activity_after_delete_campus;
+
+DELIMITER //
+
+CREATE TRIGGER trg_activity_after_insert_campus
+AFTER INSERT ON UserActivity
+FOR EACH ROW
+BEGIN
+    IF NEW.ActivityType IN ('review', 'comment') AND NEW.PostID IS NOT NULL THEN
+        INSERT INTO CampusActivity (ActivityType, UserID, Username, PostID, FoodName, CanteenID, ActivityTime,
+                                    ActivityID)
+        VALUES (NEW.ActivityType, NEW.UserID, (SELECT username FROM users WHERE user_id = NEW.UserID),
+                NEW.PostID, NEW.FoodName, NEW.CanteenID, NEW.ActivityTime, NEW.ActivityID);
+    END IF;
+END;
+//
+
+CREATE TRIGGER trg_activity_after_delete_campus
+AFTER DELETE ON UserActivity
+FOR EACH ROW
+BEGIN
+    IF OLD.ActivityType IN ('review', 'comment') THEN
+        DELETE FROM CampusActivity WHERE ActivityID = OLD.ActivityID;
+    END IF;
+END;
+//
+
+DELIMITER ;
@@ -0,0 +1,90 @@
+"""The single-page app shell, rendered once and served from memory.
+
+`/`, `/profile` and `/canteen/<id>` all serve the same document: the page
+works out which view to open from its URL and who is signed in from
+/api/me, so nothing in it depends on the request. It is rendered on first
+use, compressed once in every encoding the Compressor offers, and then
+sent as stored bytes with a strong ETag, so a page load costs neither a
+template render nor a compression pass, and a revalidation is a 304.
+
+With `reload` set (debug mode) the template is rendered on every request
+so edits show up without a restart. It can be a callable, read on every
+request, as debug mode is often only switched on after the app is created.
+"""
+import hashlib
+import threading
+import time
+
+from flask import Response
+
+
+class PageShell:
+
+    def __init__(self, render, compressor, reload=False):
+        self._render = render
+        self._compressor = compressor
+        self.reload = reload
+        self._lock = threading.Lock()
+        self._page = None  # (body, {encoding: body}, etag, rendered_at)
+
+        self.renders = 0
+        self.render_ms = None
+        self.served = {}  # encoding ('identity' for none) -> responses
+
+    def _reloading(self):
+        return self.reload() if callable(self.reload) else self.reload
+
+    def _get(self):
+        page = self._page
+        reload = self._reloading()
+        if page is not None and not reload:
+            return page
+        with self._lock:
+            if self._page is None or reload:
+                start = time.monotonic()
+                body = self._render().encode()
+                encoded = {} if reload else self._compressor.precompress(body)
+                self._page = (body, encoded, hashlib.sha256(body).hexdigest()[:32], time.time())
+                self.renders += 1
+                self.render_ms = round((time.monotonic() - start) * 1000, 3)
+            return self._page
+
+    @property
+    def etag(self):
+        return self._get()[2]
+
+    @property
+    def rendered_at(self):
+        return self._get()[3]
+
+    def response(self, accept_encodings):
+        """The stored page in the best encoding the client accepts
+        (uncompressed if `accept_encodings` is None)."""
+        body, encoded, etag, _ = self._get()
+        encoding = None
+        if encoded and accept_encodings is not None:
+            encoding = self._compressor.negotiate(accept_encodings)
+        response = Response(encoded.get(encoding, body), mimetype='text/html')
+        response.vary.add('Accept-Encoding')
+        if encoding:
+            response.headers['Content-Encoding'] = encoding
+        with self._lock:
+            key = encoding or 'identity'
+            self.served[key] = self.served.get(key, 0) + 1
+        return response
+
+    def reset(self):
+        """Render again on the next request (e.g. after a template change)."""
+        with self._lock:
+            self._page = None
+
+    def stats(self):
+        with self._lock:
+            page = self._page
+            return {
+                'renders': self.renders,
+                'render_ms': self.render_ms,
+                'bytes': len(page[0]) if page else None,
+                'encoded_bytes': {e: len(b) for e, b in page[1].items()} if page else {},
+                'served': dict(self.served),
+            }
@@ -0,0 +1,403 @@
+"""Item-item dish recommendations, precomputed off-request.
+
+A dish is a (CanteenID, FoodKey) row of DishStats. A background job loads
+every review, upvote and favorite into a sparse user x dish matrix of
+implicit feedback
+
+    own review of the dish    rating / 5
+    upvote of a review of it  UPVOTE_WEIGHT
+    favorite of one           FAVORITE_WEIGHT
+
+(summed per cell, then log1p-damped), derives the cosine similarity of
+every pair of dish columns from one sparse product, keeps each dish's
+`neighbours` most similar dishes and scores all users against that,
+`block_size` users at a time, keeping each user's `top_n` dishes they have
+not reviewed themselves. /api/recommendations only reads those lists.
+
+Between rebuilds, observe() folds a new review, upvote or favorite into
+the user's row and rescores just that user against the current similarity
+matrix. Dishes that appear after a build join at the next one. Users with
+no signal at all get the most popular dishes (Bayesian-average rating).
+
+numpy and scipy are optional. Without them every user gets the popular
+list.
+"""
+import logging
+import threading
+import time
+import tracemalloc
+
+try:
+    import numpy as np
+    from scipy import sparse
+except ImportError:  # pragma: no cover - numpy/scipy are optional dependencies
+    np = None
+
+logger = logging.getLogger(__name__)
+
+UPVOTE_WEIGHT = 0.5
+FAVORITE_WEIGHT = 1.0
+INTERACTION_WEIGHTS = { 'upvote': UPVOTE_WEIGHT, 'favorite': FAVORITE_WEIGHT }
+# pseudo-reviews at the global mean rating in the popularity ranking
+POPULARITY_PRIOR = 5
+
+
+def food_key(name):
+    """Python side of the FoodKey generated column, LOWER(TRIM(FoodName))."""
+    return (name or '').strip(' ').lower()
+
+
+class _Model:
+    """One build. Arrays are never modified after the build; per-user
+    changes folded in by observe() go to `overrides`."""
+
+    def __init__(self):
+        self.built_at = time.time()
+        self.items = []  # [{'canteen_id', 'key', 'name', ...}], as /api/dishes names them
+        self.item_index = {}  # (canteen_id, food_key) -> column
+        self.popular = []  # columns, most popular first
+        self.personalized = False
+        self.review_item = None  # ReviewID -> column, -1 if unknown
+        self.new_reviews = {}  # ReviewID -> column, for reviews observed since the build
+        self.user_index = {}  # UserID -> row
+        self.raw = None  # csr users x items, undamped weights
+        self.reviewed = None  # csr users x items, 1 where the user reviewed the dish
+        self.similarity = None  # csr items x items, top `neighbours` per row
+        self.top_items = None  # users x top_n columns, -1 padded
+        self.top_scores = None
+        self.overrides = {}  # UserID -> (weights {col: w}, reviewed set, [(col, score)])
+
+
+class Recommender:
+
+    def __init__(self, connect, top_n=20, neighbours=50, refresh_interval=3600.0, block_size=2048):
+        self._connect = connect
+        self.top_n = top_n
+        self.neighbours = neighbours
+        self.refresh_interval = refresh_interval
+        self.block_size = block_size
+
+        self._lock = threading.Lock()
+        self._model = None
+        self._journal = None  # observations made while a build runs
+        self._build_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+
+        self.builds = 0
+        self.failures = 0
+        self.last_build = {}
+        self.folded = 0
+
+        if np is None:
+            logger.warning('numpy / scipy are not installed; recommendations fall back to popular dishes')
+
+    def start(self):
+        """Build in a background thread now and every refresh_interval seconds."""
+        with self._lock:
+            if self._thread is None and self.refresh_interval > 0:
+                self._stop.clear()
+                self._thread = threading.Thread(target=self._run, name='recommender', daemon=True)
+                self._thread.start()
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                self.rebuild()
+            except Exception:
+                logger.exception('Recommendation build failed')
+            self._stop.wait(self.refresh_interval)
+
+    def shutdown(self):
+        self._stop.set()
+
+    @property
+    def ready(self):
+        return self._model is not None
+
+    # -- build ---------------------------------------------------------
+
+    def rebuild(self, trace_memory=False):
+        """Recompute every user's list from the database and swap it in.
+        Returns the build's timings (and peak traced memory if asked)."""
+        with self._build_lock:
+            with self._lock:
+                self._journal = []
+            if trace_memory:
+                tracemalloc.start()
+            start = time.perf_counter()
+            try:
+                conn = self._connect()
+                try:
+                    model, timings = self._build(conn)
+                finally:
+                    conn.close()
+            except Exception:
+                with self._lock:
+                    self._journal = None
+                    self.failures += 1
+                raise
+            finally:
+                peak = tracemalloc.get_traced_memory()[1] if trace_memory else None
+                if trace_memory:
+                    tracemalloc.stop()
+
+            with self._lock:
+                journal, self._journal = self._journal, None
+                self._model = model
+                # an observation the build's SELECTs already saw counts twice
+                # until the next build; the weights only rank dishes
+                for args in journal:
+                    self._fold(model, *args)
+                self.builds += 1
+                self.last_build = dict(timings, total_s=round(time.perf_counter() - start, 3),
+                                       users=len(model.user_index), items=len(model.items),
+                                       model_mb=round(_model_bytes(model) / 2 ** 20, 1), replayed=len(journal))
+                if peak is not None:
+                    self.last_build['peak_mb'] = round(peak / 2 ** 20, 1)
+                return dict(self.last_build)
+
+    def _build(self, conn):
+        model = _Model()
+        timings = {}
+        t = time.perf_counter()
+        with conn.cursor() as cursor:
+            cursor.execute("""
+                SELECT CanteenID, FoodKey, FoodName, ReviewCount, RatingSum, MedianPrice
+                FROM DishStats WHERE ReviewCount > 0
+            """)
+            for row in cursor.fetchall():
+                model.item_index[(row['CanteenID'], row['FoodKey'])] = len(model.items)
+                model.items.append({
+                    'canteen_id': row['CanteenID'],
+                    'key': row['FoodKey'],
+                    'name': row['FoodName'],
+                    'reviews': int(row['ReviewCount']),
+                    'avg_rating': round(float(row['RatingSum']) / row['ReviewCount'], 2),
+                    'median_price': float(row['MedianPrice']) if row['MedianPrice'] is not None else None,
+                })
+            model.popular = _popular(model.items)
+            if np is None or not model.items:
+                timings['load_s'] = round(time.perf_counter() - t, 3)
+                return model, timings
+
+            cursor.execute("SELECT ReviewID, UserID, CanteenID, FoodKey, Rating FROM FoodReviews")
+            reviews = cursor.fetchall()
+            cursor.execute("SELECT UserID, ReviewID FROM Upvotes")
+            upvotes = cursor.fetchall()
+            cursor.execute("SELECT UserID, ReviewID FROM Favorites")
+            favorites = cursor.fetchall()
+        timings['load_s'] = round(time.perf_counter() - t, 3)
+
+        t = time.perf_counter()
+        n_items = len(model.items)
+        review_ids = np.fromiter((r['ReviewID'] for r in reviews), dtype=np.int64, count=len(reviews))
+        review_cols = np.fromiter((model.item_index.get((r['CanteenID'], r['FoodKey']), -1) for r in reviews),
+                                  dtype=np.int64, count=len(reviews))
+        model.review_item = np.full(int(review_ids.max(initial=0)) + 1, -1, dtype=np.int32)
+        model.review_item[review_ids] = review_cols
+
+        parts = [(np.fromiter((r['UserID'] or 0 for r in reviews), dtype=np.int64, count=len(reviews)),
+                  review_cols,
+                  np.fromiter((r['Rating'] or 0 for r in reviews), dtype=np.float64, count=len(reviews)) / 5.0,
+                  True)]
+        for rows, weight in ((upvotes, UPVOTE_WEIGHT), (favorites, FAVORITE_WEIGHT)):
+            users = np.fromiter((r['UserID'] for r in rows), dtype=np.int64, count=len(rows))
+            targets = np.fromiter((r['ReviewID'] for r in rows), dtype=np.int64, count=len(rows))
+            cols = np.full(len(rows), -1, dtype=np.int64)
+            known = targets < len(model.review_item)
+            cols[known] = model.review_item[targets[known]]
+            parts.append((users, cols, np.full(len(rows), weight), False))
+
+        user_ids, user_rows = np.unique(np.concatenate([p[0] for p in parts]), return_inverse=True)
+        model.user_index = {int(u): i for i, u in enumerate(user_ids)}
+        rows = np.split(user_rows, np.cumsum([len(p[0]) for p in parts])[:-1])
+        shape = (len(user_ids), n_items)
+
+        def matrix(keep, values):
+            r = np.concatenate([rows[i][parts[i][1] >= 0] for i in keep])
+            c = np.concatenate([parts[i][1][parts[i][1] >= 0] for i in keep])
+            v = np.concatenate([values(i)[parts[i][1] >= 0] for i in keep])
+            m = sparse.csr_matrix((v, (r, c)), shape=shape, dtype=np.float64)
+            m.sum_duplicates()
+            return m
+
+        model.raw = matrix(range(len(parts)), lambda i: parts[i][2])
+        model.reviewed = matrix([0], lambda i: np.ones(len(parts[i][0])))
+        model.reviewed.data[:] = 1.0
+        timings['matrix_s'] = round(time.perf_counter() - t, 3)
+
+        t = time.perf_counter()
+        damped = model.raw.copy()
+        damped.data = np.log1p(damped.data)
+        norms = np.sqrt(np.asarray(damped.multiply(damped).sum(axis=0)).ravel())
+        norms[norms == 0] = 1.0
+        normalized = damped @ sparse.diags(1.0 / norms)
+        similarity = (normalized.T @ normalized).tocsr()
+        similarity = (similarity - sparse.diags(similarity.diagonal())).tocsr()
+        similarity.eliminate_zeros()
+        model.similarity = _keep_top(similarity, self.neighbours)
+        timings['similarity_s'] = round(time.perf_counter() - t, 3)
+
+        t = time.perf_counter()
+        n_users = shape[0]
+        top_n = min(self.top_n, n_items)
+        model.top_items = np.full((n_users, top_n), -1, dtype=np.int32)
+        model.top_scores = np.zeros((n_users, top_n), dtype=np.float32)
+        for lo in range(0, n_users, self.block_size):
+            hi = min(lo + self.block_size, n_users)
+            scores = (damped[lo:hi] @ model.similarity).toarray()
+            scores[model.reviewed[lo:hi].toarray() > 0] = 0
+            cols = np.argpartition(-scores, top_n - 1, axis=1)[:, :top_n] if top_n < n_items else \
+                np.tile(np.arange(n_items), (hi - lo, 1))
+            picked = np.take_along_axis(scores, cols, axis=1)
+            order = np.argsort(-picked, axis=1)
+            cols = np.take_along_axis(cols, order, axis=1)
+            picked = np.take_along_axis(picked, order, axis=1)
+            cols[picked <= 0] = -1
+            model.top_items[lo:hi] = cols
+            model.top_scores[lo:hi] = picked
+        model.personalized = True
+        timings['scoring_s'] = round(time.perf_counter() - t, 3)
+        return model, timings
+
+    # -- incremental updates -------------------------------------------
+
+    def observe_review(self, user_id, review_id, canteen_id, food_name, rating):
+        """Fold a review the user just posted into their list."""
+        self._observe(user_id, review_id, (canteen_id, food_key(food_name)), (rating or 0) / 5.0, True)
+
+    def observe(self, user_id, review_id, kind, active):
+        """Fold an upvote / favorite (or its removal) into the user's list."""
+        weight = INTERACTION_WEIGHTS.get(kind)
+        if weight is not None:
+            self._observe(user_id, review_id, None, weight if active else -weight, False)
+
+    def _observe(self, user_id, review_id, dish, delta, reviewed):
+        if user_id is None:
+            return
+        with self._lock:
+            if self._journal is not None:
+                self._journal.append((user_id, review_id, dish, delta, reviewed))
+            if self._model is not None:
+                self._fold(self._model, user_id, review_id, dish, delta, reviewed)
+
+    def _fold(self, model, user_id, review_id, dish, delta, reviewed):
+        """Apply one observation to `model` (caller holds the lock)."""
+        if not model.personalized:
+            return
+        if dish is not None:
+            col = model.item_index.get(dish)
+            if col is not None:
+                model.new_reviews[review_id] = col
+        elif review_id in model.new_reviews:
+            col = model.new_reviews[review_id]
+        elif 0 <= review_id < len(model.review_item) and model.review_item[review_id] >= 0:
+            col = int(model.review_item[review_id])
+        else:
+            col = None
+        if col is None:
+            return
+
+        override = model.overrides.get(user_id)
+        if override is None:
+            weights, seen = {}, set()
+            row = model.user_index.get(user_id)
+            if row is not None:
+                start, end = model.raw.indptr[row], model.raw.indptr[row + 1]
+                weights = dict(zip(model.raw.indices[start:end].tolist(), model.raw.data[start:end].tolist()))
+                start, end = model.reviewed.indptr[row], model.reviewed.indptr[row + 1]
+                seen = set(model.reviewed.indices[start:end].tolist())
+            override = (weights, seen, [])
+        weights, seen, _ = override
+        weights[col] = max(weights.get(col, 0.0) + delta, 0.0)
+        if reviewed:
+            seen.add(col)
+
+        cols = np.fromiter(weights.keys(), dtype=np.int64, count=len(weights))
+        values = np.log1p(np.fromiter(weights.values(), dtype=np.float64, count=len(weights)))
+        vector = sparse.csr_matrix((values, (np.zeros(len(cols), dtype=np.int64), cols)),
+                                   shape=(1, len(model.items)))
+        scores = (vector @ model.similarity).toarray().ravel()
+        if seen:
+            scores[list(seen)] = 0
+        best = np.argsort(-scores)[:self.top_n]
+        model.overrides[user_id] = (weights, seen, [(int(c), float(scores[c])) for c in best if scores[c] > 0])
+        self.folded += 1
+
+    # -- serving -------------------------------------------------------
+
+    def recommend(self, user_id, limit=10):
+        """([dish dict with 'score'], personalized?) for a user (or None for
+        a guest); popular dishes the user has not reviewed fill in when there
+        is nothing personal."""
+        with self._lock:
+            model = self._model
+            if model is None:
+                return [], False
+            picks = []
+            seen = ()
+            if user_id is not None and model.personalized:
+                override = model.overrides.get(user_id)
+                if override is not None:
+                    picks = override[2][:limit]
+                    seen = override[1]
+                elif user_id in model.user_index:
+                    row = model.user_index[user_id]
+                    picks = [(int(c), float(s)) for c, s in zip(model.top_items[row], model.top_scores[row])
+                             if c >= 0][:limit]
+                    seen = model.reviewed.indices[model.reviewed.indptr[row]:model.reviewed.indptr[row + 1]]
+        if picks:
+            return [dict(model.items[c], score=round(s, 4)) for c, s in picks], True
+        seen = set(int(c) for c in seen)
+        popular = [c for c in model.popular if c not in seen][:limit]
+        return [dict(model.items[c], score=None) for c in popular], False
+
+    def stats(self):
+        with self._lock:
+            model = self._model
+            return {
+                'ready': model is not None,
+                'personalized': bool(model and model.personalized),
+                'built_at': model.built_at if model else None,
+                'builds': self.builds,
+                'failures': self.failures,
+                'last_build': self.last_build,
+                'folded': self.folded,
+                'overrides': len(model.overrides) if model else 0,
+            }
+
+
+def _popular(items):
+    """Columns by Bayesian-average rating, most popular first."""
+    total = sum(i['reviews'] for i in items)
+    if not total:
+        return []
+    mean = sum(i['avg_rating'] * i['reviews'] for i in items) / total
+    score = [(i['avg_rating'] * i['reviews'] + mean * POPULARITY_PRIOR) / (i['reviews'] + POPULARITY_PRIOR)
+             for i in items]
+    return sorted(range(len(items)), key=lambda c: (-score[c], -items[c]['reviews']))
+
+
+def _model_bytes(model):
+    """Size of a model's arrays (the Python dicts beside them not included)."""
+    total = 0
+    for m in (model.raw, model.reviewed, model.similarity):
+        if m is not None:
+            total += m.data.nbytes + m.indices.nbytes + m.indptr.nbytes
+    for a in (model.review_item, model.top_items, model.top_scores):
+        if a is not None:
+            total += a.nbytes
+    return total
+
+
+def _keep_top(matrix, k):
+    """Zero all but the k largest entries of every row of a csr matrix."""
+    matrix = matrix.tocsr()
+    for row in range(matrix.shape[0]):
+        start, end = matrix.indptr[row], matrix.indptr[row + 1]
+        if end - start > k:
+            values = matrix.data[start:end]
+            values[np.argpartition(-values, k)[k:]] = 0
+    matrix.eliminate_zeros()
+    return matrix
@@ -0,0 +1,136 @@
+"""In-process read-through cache for canteen review listings.
+
+Entries are grouped by canteen so a write only drops the listings of the
+canteen it touched. Each canteen also has a version number that is bumped
+on invalidation; a reader records the version before querying and the
+result is only stored if no write happened in between, so a slow reader
+can never put a pre-write page back into the cache.
+
+The cache lives in one worker process. With several workers, the TTL is
+the upper bound on how stale another worker's copy can be.
+"""
+import threading
+import time
+from collections import OrderedDict
+
+
+class ReviewListCache:
+    """LRU + TTL cache keyed by (canteen_id, key)."""
+
+    def __init__(self, max_entries=1024, ttl=30.0):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()  # (canteen_id, key) -> (expires_at, value)
+        self._by_canteen = {}  # canteen_id -> set of keys
+        self._versions = {}  # canteen_id -> int
+        self._changed_at = {}  # canteen_id -> wall-clock time of the last invalidation
+        self.started_at = time.time()
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.invalidations = 0
+
+    def version(self, canteen_id):
+        with self._lock:
+            return self._versions.get(canteen_id, 0)
+
+    def changed_at(self, canteen_id):
+        with self._lock:
+            return self._changed_at.get(canteen_id, self.started_at)
+
+    def get(self, canteen_id, key):
+        """Return the cached value or None."""
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get((canteen_id, key))
+            if entry is None:
+                self.misses += 1
+                return None
+            if entry[0] <= now:
+                self._drop((canteen_id, key))
+                self.expirations += 1
+                self.misses += 1
+                return None
+            self._entries.move_to_end((canteen_id, key))
+            self.hits += 1
+            return entry[1]
+
+    def set(self, canteen_id, key, value, version):
+        """Store `value` unless the canteen was invalidated after `version` was read."""
+        with self._lock:
+            if self._versions.get(canteen_id, 0) != version:
+                return False
+            self._entries[(canteen_id, key)] = (time.monotonic() + self.ttl, value)
+            self._entries.move_to_end((canteen_id, key))
+            self._by_canteen.setdefault(canteen_id, set()).add(key)
+            while len(self._entries) > self.max_entries:
+                oldest = next(iter(self._entries))
+                self._drop(oldest)
+                self.evictions += 1
+            return True
+
+    def invalidate(self, canteen_id):
+        """Drop every cached listing for one canteen."""
+        with self._lock:
+            self._versions[canteen_id] = self._versions.get(canteen_id, 0) + 1
+            self._changed_at[canteen_id] = time.time()
+            for key in self._by_canteen.pop(canteen_id, ()):
+                self._entries.pop((canteen_id, key), None)
+            self.invalidations += 1
+
+    def clear(self):
+        with self._lock:
+            for canteen_id in self._by_canteen:
+                self._versions[canteen_id] = self._versions.get(canteen_id, 0) + 1
+            self._entries.clear()
+            self._by_canteen.clear()
+
+    def _drop(self, entry_key):
+        self._entries.pop(entry_key, None)
+        canteen_id, key = entry_key
+        keys = self._by_canteen.get(canteen_id)
+        if keys is not None:
+            keys.discard(key)
+            if not keys:
+                del self._by_canteen[canteen_id]
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'entries': len(self._entries),
+                'max_entries': self.max_entries,
+                'ttl_seconds': self.ttl,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_ratio': round(self.hits / lookups, 4) if lookups else 0.0,
+                'evictions': self.evictions,
+                'expirations': self.expirations,
+                'invalidations': self.invalidations,
+            }
+
+
+class VersionStamps:
+    """Per-key version counters with the time of the last bump.
+
+    Used to derive ETags for responses that are not cached themselves
+    (e.g. per-user payloads): any write that could change the payload bumps
+    the key, so an unchanged (version, ...) means an unchanged response.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._versions = {}  # key -> (version, bumped_at)
+        self.started_at = time.time()
+
+    def get(self, key):
+        with self._lock:
+            return self._versions.get(key, (0, self.started_at))
+
+    def bump(self, key):
+        with self._lock:
+            version, _ = self._versions.get(key, (0, self.started_at))
+            self._versions[key] = (version + 1, time.time())
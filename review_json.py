@@ -0,0 +1,113 @@
+"""JSON encoding of review payloads from cached per-review fragments.
+
+A review's JSON (the serialize_review() dict, comments included) is
+encoded once and kept in a FragmentCache under its ReviewID, tagged with
+the row's Version column (migrations/006_review_version.sql). Every UPDATE
+of the row bumps the version, and so does every upvote, favorite or
+comment, through the counter triggers. A list response is then the cached
+fragments of its rows joined into one body; only reviews that changed
+since they were last encoded are parsed and encoded again.
+
+orjson is used when it is installed; otherwise the standard library
+encoder produces the same JSON, only slower.
+"""
+import json
+import threading
+from collections import OrderedDict
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - orjson is an optional dependency
+    orjson = None
+
+ENCODER = 'orjson' if orjson is not None else 'json'
+
+
+def dumps(obj):
+    """Compact UTF-8 JSON bytes."""
+    if orjson is not None:
+        return orjson.dumps(obj, default=str)
+    return json.dumps(obj, separators=(',', ':'), ensure_ascii=False, default=str).encode()
+
+
+def with_members(fragment, **members):
+    """An encoded object with extra members appended."""
+    if not members:
+        return fragment
+    extra = dumps(members)
+    if fragment == b'{}':
+        return extra
+    return fragment[:-1] + b',' + extra[1:]
+
+
+def encode_payload(fields, reviews):
+    """`fields` encoded as an object with a "reviews" array assembled from
+    already-encoded review fragments."""
+    head = dumps(fields)[:-1]
+    return head + (b',' if len(head) > 1 else b'') + b'"reviews":[' + b','.join(reviews) + b']}'
+
+
+class FragmentCache:
+    """LRU of encoded reviews keyed by ReviewID, each stored with the
+    Version it was encoded from; a lookup with any other version misses."""
+
+    def __init__(self, max_entries=20000):
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()  # review_id -> (version, fragment)
+        self._bytes = 0
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, review_id, version):
+        with self._lock:
+            entry = self._entries.get(review_id)
+            if entry is None or entry[0] != version:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(review_id)
+            self.hits += 1
+            return entry[1]
+
+    def set(self, review_id, version, fragment):
+        """Store a fragment unless a newer version is already cached (a slow
+        reader finishing after a fast one)."""
+        with self._lock:
+            entry = self._entries.get(review_id)
+            if entry is not None and entry[0] > version:
+                return
+            if entry is not None:
+                self._bytes -= len(entry[1])
+            self._entries[review_id] = (version, fragment)
+            self._entries.move_to_end(review_id)
+            self._bytes += len(fragment)
+            while len(self._entries) > self.max_entries:
+                self._bytes -= len(self._entries.popitem(last=False)[1][1])
+                self.evictions += 1
+
+    def discard(self, review_id):
+        with self._lock:
+            entry = self._entries.pop(review_id, None)
+            if entry is not None:
+                self._bytes -= len(entry[1])
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'encoder': ENCODER,
+                'entries': len(self._entries),
+                'max_entries': self.max_entries,
+                'bytes': self._bytes,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_ratio': round(self.hits / lookups, 4) if lookups else 0.0,
+                'evictions': self.evictions,
+            }
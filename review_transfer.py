@@ -0,0 +1,311 @@
+"""Bulk export and import of reviews as NDJSON, for `flask export-reviews`
+and `flask import-reviews`.
+
+Export writes one JSON object per review, oldest first, with its comments
+and counters. Reviews and comments are read through two unbuffered
+(server-side) cursors, both in ReviewID order, and merged as they stream,
+so memory stays flat however many reviews there are. Authors are written
+by username, which is what identifies them in another environment.
+
+Import reads such a file `chunk_size` lines at a time and writes each
+chunk with one multi-row INSERT for the reviews and one per
+COMMENTS_PER_INSERT comments, in one transaction that also records how
+many lines are done in ReviewImports (migrations/009_review_imports.sql).
+After a failure, running the same import again skips the committed lines
+and continues with the chunk that failed. A SHA-256 of the committed lines
+is stored with the count, so a different file under the same import key is
+refused instead of being resumed halfway.
+
+Imported reviews do not write UserActivity rows, so a bulk load does not
+flood the activity feeds; counters come from the rows actually imported
+(comments), not from the exported counts. DishStats prices are refreshed
+once per dish and chunk instead of once per review.
+"""
+import hashlib
+import json
+import logging
+import os
+import time
+from datetime import datetime
+
+import pymysql
+
+from review_json import dumps
+
+logger = logging.getLogger(__name__)
+
+# rows per multi-row INSERT INTO Comments
+COMMENTS_PER_INSERT = 1000
+
+
+class TransferError(Exception):
+    """An import cannot start or continue (bad input, changed file, missing table)."""
+
+
+def export_reviews(review_cursor, comment_cursor, out, canteen_id=None, after_id=0, progress=None):
+    """Write reviews with ReviewID > after_id (of one canteen, if given) to
+    the binary file `out` as NDJSON. The cursors should be unbuffered and on
+    separate connections. Returns the number of reviews written."""
+    where = 'r.ReviewID > %s'
+    params = [after_id]
+    if canteen_id is not None:
+        where += ' AND r.CanteenID = %s'
+        params.append(canteen_id)
+    review_cursor.execute(f"""
+        SELECT r.ReviewID, r.FoodName, r.Price, r.Rating, r.SpiceLevel, r.Review, r.ImagePaths,
+               r.SubmissionDate, r.CanteenID, r.UpvoteCount, r.FavoriteCount, r.CommentCount, u.username
+        FROM FoodReviews r
+        LEFT JOIN users u ON u.user_id = r.UserID
+        WHERE {where}
+        ORDER BY r.ReviewID
+    """, params)
+    comment_cursor.execute(f"""
+        SELECT c.ReviewID, c.CommentText, c.CommentDate, u.username
+        FROM Comments c
+        JOIN FoodReviews r ON r.ReviewID = c.ReviewID
+        LEFT JOIN users u ON u.user_id = c.UserID
+        WHERE {where}
+        ORDER BY c.ReviewID, c.CommentDate, c.CommentID
+    """, params)
+
+    comments = iter(comment_cursor)
+    pending = next(comments, None)
+    written = 0
+    for r in review_cursor:
+        # comments come in the same ReviewID order; skip those of reviews
+        # added after the review cursor started
+        while pending is not None and pending['ReviewID'] < r['ReviewID']:
+            pending = next(comments, None)
+        own = []
+        while pending is not None and pending['ReviewID'] == r['ReviewID']:
+            own.append({ 'author': pending['username'], 'text': pending['CommentText'], 'date': pending['CommentDate'] })
+            pending = next(comments, None)
+        out.write(dumps({
+            'id': r['ReviewID'],
+            'canteen_id': r['CanteenID'],
+            'name': r['FoodName'],
+            'price': float(r['Price']) if r['Price'] is not None else None,
+            'rating': r['Rating'],
+            'spiceLevel': r['SpiceLevel'],
+            'review': r['Review'],
+            'images': _image_list(r['ImagePaths']),
+            'author': r['username'],
+            'submitted_at': r['SubmissionDate'],
+            'upvotes': r['UpvoteCount'],
+            'favorites': r['FavoriteCount'],
+            'comment_count': r['CommentCount'],
+            'comments': own,
+        }) + b'\n')
+        written += 1
+        if progress is not None and written % 10000 == 0:
+            progress(written)
+    return written
+
+
+def _image_list(raw):
+    """ImagePaths as a list (it is stored as a JSON array or a comma-separated string)."""
+    try:
+        parsed = json.loads(raw) if raw else []
+        return parsed if isinstance(parsed, list) else [parsed]
+    except ValueError:
+        return [p.strip() for p in raw.split(',') if p.strip()]
+
+
+def _parse_date(value, line_no):
+    if value in (None, ''):
+        return None
+    try:
+        return datetime.fromisoformat(str(value)).replace(tzinfo=None, microsecond=0)
+    except ValueError:
+        raise TransferError(f'line {line_no}: invalid date {value!r}')
+
+
+def _review_values(record, line_no):
+    """(FoodName, Price, Rating, SpiceLevel, Review, ImagePaths, SubmissionDate,
+    CanteenID) of one exported review, checked against the table's rules."""
+    name = (record.get('name') or '').strip()
+    if not name:
+        raise TransferError(f'line {line_no}: name is required')
+    try:
+        price = float(record.get('price') or 0)
+        rating = int(record.get('rating'))
+        spice = int(record['spiceLevel']) if record.get('spiceLevel') is not None else None
+        canteen_id = int(record.get('canteen_id'))
+    except (TypeError, ValueError):
+        raise TransferError(f'line {line_no}: price, rating, spiceLevel and canteen_id must be numbers')
+    if price < 0:
+        raise TransferError(f'line {line_no}: price cannot be negative')
+    if not 1 <= rating <= 5:
+        raise TransferError(f'line {line_no}: rating must be between 1 and 5')
+    if spice is not None and not 0 <= spice <= 5:
+        raise TransferError(f'line {line_no}: spiceLevel must be between 0 and 5')
+    images = record.get('images') or []
+    return (name, price, rating, spice, record.get('review') or '', json.dumps(images),
+            _parse_date(record.get('submitted_at'), line_no) or datetime.now().replace(microsecond=0), canteen_id)
+
+
+class ReviewImporter:
+
+    def __init__(self, conn, path, key=None, chunk_size=500, default_user=None, progress=None, schema=None):
+        self.conn = conn
+        self.schema = schema  # schema_registry.SchemaRegistry, to check for ReviewImports up front
+        self.path = path
+        self.key = key or os.path.basename(path)
+        self.chunk_size = chunk_size
+        self.default_user = default_user
+        self.progress = progress
+
+        self._user_ids = {}  # username -> user_id or None
+        self._default_user_id = None
+
+        self.lines = 0
+        self.reviews = 0
+        self.comments = 0
+        self.skipped_comments = 0
+        self.resumed_from = 0
+
+    def run(self, restart=False):
+        """Import the file, resuming a previous attempt unless `restart`.
+        Returns False if this import already finished."""
+        if self.schema is not None and not self.schema.has_table('ReviewImports'):
+            raise TransferError('ReviewImports table missing; apply migrations/009_review_imports.sql')
+        with self.conn.cursor() as cursor:
+            cursor.execute("SELECT LinesDone, PrefixHash, FinishedAt FROM ReviewImports WHERE ImportKey = %s",
+                           (self.key,))
+            state = cursor.fetchone()
+            if state is not None and restart:
+                cursor.execute("DELETE FROM ReviewImports WHERE ImportKey = %s", (self.key,))
+                state = None
+            if state is not None and state['FinishedAt'] is not None:
+                self.conn.commit()
+                return False
+            if state is None:
+                cursor.execute("INSERT INTO ReviewImports (ImportKey, FileName) VALUES (%s, %s)",
+                               (self.key, os.path.abspath(self.path)))
+            if self.default_user:
+                self._default_user_id = self._resolve_users(cursor, [self.default_user]).get(self.default_user)
+                if self._default_user_id is None:
+                    raise TransferError(f'default user {self.default_user!r} does not exist')
+        self.conn.commit()
+
+        done = state['LinesDone'] if state else 0
+        digest = hashlib.sha256()
+        start = time.monotonic()
+        with open(self.path, 'rb') as f:
+            for _ in range(done):
+                line = f.readline()
+                if not line:
+                    raise TransferError(f'{self.path} has fewer lines than the {done} already imported as {self.key!r}')
+                digest.update(line)
+            if done and digest.hexdigest() != state['PrefixHash']:
+                raise TransferError(f'the first {done} lines of {self.path} differ from those imported as '
+                                    f'{self.key!r}; pass a new key or restart the import')
+            self.lines = self.resumed_from = done
+
+            # DishStats prices are refreshed once per dish and chunk, not
+            # per review (see the insert trigger in migration 009)
+            with self.conn.cursor() as cursor:
+                cursor.execute("SET @defer_dish_prices = 1")
+            try:
+                while True:
+                    chunk = []
+                    for _ in range(self.chunk_size):
+                        line = f.readline()
+                        if not line:
+                            break
+                        chunk.append(line)
+                    if not chunk:
+                        break
+                    for line in chunk:
+                        digest.update(line)
+                    self._write_chunk(chunk, digest.hexdigest())
+                    if self.progress is not None:
+                        self.progress(self, time.monotonic() - start)
+            finally:
+                # must not hide the error that got us here (e.g. a lost connection)
+                try:
+                    with self.conn.cursor() as cursor:
+                        cursor.execute("SET @defer_dish_prices = NULL")
+                except Exception:
+                    logger.warning('Could not reset @defer_dish_prices', exc_info=True)
+
+        with self.conn.cursor() as cursor:
+            cursor.execute("UPDATE ReviewImports SET FinishedAt = %s WHERE ImportKey = %s",
+                           (datetime.now().replace(microsecond=0), self.key))
+        self.conn.commit()
+        return True
+
+    def _write_chunk(self, lines, prefix_hash):
+        first_line = self.lines + 1
+        records = []
+        for offset, line in enumerate(lines):
+            if not line.strip():
+                continue
+            try:
+                record = json.loads(line)
+            except ValueError as e:
+                raise TransferError(f'line {first_line + offset}: not JSON ({e})')
+            records.append((first_line + offset, record))
+
+        try:
+            with self.conn.cursor() as cursor:
+                names = {r.get('author') for _, r in records}
+                names.update(c.get('author') for _, r in records for c in r.get('comments') or ())
+                users = self._resolve_users(cursor, [n for n in names if n])
+
+                reviews = [_review_values(r, n) + (users.get(r.get('author')) or self._default_user_id,)
+                           for n, r in records]
+                comments = []
+                if reviews:
+                    cursor.execute(
+                        "INSERT INTO FoodReviews (FoodName, Price, Rating, SpiceLevel, Review, ImagePaths, "
+                        "SubmissionDate, CanteenID, UserID) VALUES "
+                        + ', '.join(['(%s, %s, %s, %s, %s, %s, %s, %s, %s)'] * len(reviews)),
+                        [v for row in reviews for v in row]
+                    )
+                    # one multi-row INSERT gets consecutive ids; lastrowid is the first
+                    first_id = cursor.lastrowid
+                    for canteen_id, name in sorted({(row[7], row[0].strip(' ').lower()) for row in reviews}):
+                        cursor.execute("CALL RefreshDishPrices(%s, LOWER(TRIM(%s)))", (canteen_id, name))
+                    for i, (n, r) in enumerate(records):
+                        for c in r.get('comments') or ():
+                            user_id = users.get(c.get('author')) or self._default_user_id
+                            if user_id is None or not c.get('text'):
+                                self.skipped_comments += 1
+                                continue
+                            comments.append((first_id + i, user_id, c['text'],
+                                             _parse_date(c.get('date'), n) or datetime.now().replace(microsecond=0)))
+                for i in range(0, len(comments), COMMENTS_PER_INSERT):
+                    part = comments[i:i + COMMENTS_PER_INSERT]
+                    cursor.execute(
+                        "INSERT INTO Comments (ReviewID, UserID, CommentText, CommentDate) VALUES "
+                        + ', '.join(['(%s, %s, %s, %s)'] * len(part)),
+                        [v for row in part for v in row]
+                    )
+                cursor.execute("UPDATE ReviewImports SET LinesDone = %s, PrefixHash = %s, ReviewsImported = "
+                               "ReviewsImported + %s, CommentsImported = CommentsImported + %s WHERE ImportKey = %s",
+                               (self.lines + len(lines), prefix_hash, len(reviews), len(comments), self.key))
+            self.conn.commit()
+        except pymysql.err.IntegrityError as e:
+            self.conn.rollback()
+            if e.args and e.args[0] == 1452:
+                raise TransferError(f'lines {first_line}-{self.lines + len(lines)}: unknown canteen_id')
+            raise
+        except BaseException:
+            self.conn.rollback()
+            raise
+
+        self.lines += len(lines)
+        self.reviews += len(reviews)
+        self.comments += len(comments)
+
+    def _resolve_users(self, cursor, names):
+        """{username: user_id or None} for `names`, querying only new ones."""
+        unknown = [n for n in names if n not in self._user_ids]
+        if unknown:
+            cursor.execute(f"SELECT user_id, username FROM users WHERE username IN ({', '.join(['%s'] * len(unknown))})",
+                           unknown)
+            found = {r['username']: r['user_id'] for r in cursor.fetchall()}
+            for n in unknown:
+                self._user_ids[n] = found.get(n)
+        return {n: self._user_ids[n] for n in names}
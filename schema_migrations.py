@@ -0,0 +1,230 @@
+"""Versioned schema migrations.
+
+Files in migrations/ are named NNN_description.sql and applied in version
+order. Each applied version is recorded in the schema_migrations table
+together with a checksum of the file, so `flask migrate` only runs what is
+new and warns when an already-applied file was edited afterwards.
+
+The files are written for the mysql client (DELIMITER blocks, `USE food;`),
+so they are split into single statements here; USE is skipped because the
+runner works on the database the app is configured for.
+
+MySQL commits DDL implicitly, so a migration that fails halfway cannot be
+rolled back: it is not recorded, and the error names the failing statement.
+"""
+import hashlib
+import os
+import re
+import time
+
+MIGRATION_FILE = re.compile(r'^(\d+)_([\w-]+)\.sql$')
+DELIMITER_LINE = re.compile(r'^\s*DELIMITER\s+(\S+)\s*$', re.IGNORECASE)
+USE_STATEMENT = re.compile(r'^USE\s+\S+$', re.IGNORECASE)
+
+LOCK_NAME = 'schema_migrations'
+LOCK_TIMEOUT = 30
+
+
+class MigrationError(Exception):
+    """A statement of a migration failed; earlier statements stay applied."""
+
+    def __init__(self, migration, statement, error):
+        super().__init__(f'{migration.filename}: {error}\n  in: {statement[:200]}')
+        self.migration = migration
+        self.statement = statement
+        self.error = error
+
+
+class Migration:
+
+    def __init__(self, version, name, path):
+        self.version = version
+        self.name = name
+        self.path = path
+        self.filename = os.path.basename(path)
+        with open(path, 'rb') as f:
+            raw = f.read()
+        self.checksum = hashlib.sha256(raw).hexdigest()
+        self.sql = raw.decode('utf-8')
+
+    def statements(self):
+        return [s for s in split_statements(self.sql) if not USE_STATEMENT.match(s)]
+
+
+def discover(folder):
+    """Migrations in `folder`, ordered by version."""
+    migrations = []
+    for name in os.listdir(folder):
+        m = MIGRATION_FILE.match(name)
+        if m:
+            migrations.append(Migration(int(m.group(1)), m.group(2), os.path.join(folder, name)))
+    migrations.sort(key=lambda m: m.version)
+    versions = [m.version for m in migrations]
+    if len(set(versions)) != len(versions):
+        raise ValueError(f'duplicate migration versions in {folder}')
+    return migrations
+
+
+def split_statements(sql):
+    """Split a mysql-client script into statements.
+
+    Honours DELIMITER lines, quoted strings and comments, so procedure and
+    trigger bodies come out as one statement each.
+    """
+    statements = []
+    delimiter = ';'
+    buf = []
+    quote = None
+    for line in sql.splitlines(keepends=True):
+        if quote is None and not ''.join(buf).strip():
+            m = DELIMITER_LINE.match(line)
+            if m:
+                delimiter = m.group(1)
+                buf = []
+                continue
+        i = 0
+        while i < len(line):
+            ch = line[i]
+            if quote is not None:
+                buf.append(ch)
+                if ch == '\\' and quote != '`' and i + 1 < len(line):
+                    buf.append(line[i + 1])
+                    i += 1
+                elif ch == quote:
+                    quote = None
+                i += 1
+                continue
+            if ch in ("'", '"', '`'):
+                quote = ch
+                buf.append(ch)
+                i += 1
+                continue
+            if line.startswith('--', i) and (i + 2 == len(line) or line[i + 2] in ' \t\r\n'):
+                break
+            if ch == '#':
+                break
+            if line.startswith('/*', i):
+                end = line.find('*/', i + 2)
+                if end != -1:
+                    i = end + 2
+                    continue
+            if line.startswith(delimiter, i):
+                statement = ''.join(buf).strip()
+                if delimiter != ';':
+                    # "END;" before "//" in a DELIMITER block
+                    statement = statement.rstrip(';').rstrip()
+                if statement:
+                    statements.append(statement)
+                buf = []
+                i += len(delimiter)
+                continue
+            buf.append(ch)
+            i += 1
+        else:
+            continue
+        buf.append('\n')  # the line ended in a comment
+    statement = ''.join(buf).strip()
+    if statement:
+        statements.append(statement)
+    return statements
+
+
+class MigrationRunner:
+    """Applies migrations from `folder` over one DB-API connection."""
+
+    def __init__(self, conn, folder):
+        self.conn = conn
+        self.folder = folder
+
+    def ensure_table(self):
+        with self.conn.cursor() as cursor:
+            cursor.execute("""
+                CREATE TABLE IF NOT EXISTS schema_migrations (
+                    version INT PRIMARY KEY,
+                    name VARCHAR(255) NOT NULL,
+                    checksum CHAR(64) NOT NULL,
+                    applied_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                    duration_ms INT
+                )
+            """)
+        self.conn.commit()
+
+    def applied(self):
+        """{version: row} of recorded migrations."""
+        with self.conn.cursor() as cursor:
+            cursor.execute("SELECT version, name, checksum, applied_at, duration_ms FROM schema_migrations")
+            return {row['version']: row for row in cursor.fetchall()}
+
+    def status(self):
+        """[(migration, applied row or None, modified since applied)]"""
+        applied = self.applied()
+        result = []
+        for m in discover(self.folder):
+            row = applied.get(m.version)
+            result.append((m, row, row is not None and row['checksum'] != m.checksum))
+        return result
+
+    def pending(self, target=None):
+        applied = self.applied()
+        return [m for m in discover(self.folder)
+                if m.version not in applied and (target is None or m.version <= target)]
+
+    def _record(self, cursor, migration, duration_ms):
+        cursor.execute(
+            "INSERT INTO schema_migrations (version, name, checksum, duration_ms) VALUES (%s, %s, %s, %s)",
+            (migration.version, migration.name, migration.checksum, duration_ms)
+        )
+
+    def _locked(self, fn):
+        """Run fn while holding a named lock, so two deploys cannot migrate at once."""
+        with self.conn.cursor() as cursor:
+            cursor.execute("SELECT GET_LOCK(%s, %s) AS locked", (LOCK_NAME, LOCK_TIMEOUT))
+            if not cursor.fetchone()['locked']:
+                raise RuntimeError('another process is applying migrations')
+        try:
+            return fn()
+        finally:
+            with self.conn.cursor() as cursor:
+                cursor.execute("SELECT RELEASE_LOCK(%s)", (LOCK_NAME,))
+
+    def migrate(self, target=None, log=print):
+        """Apply pending migrations up to `target`; returns the applied ones."""
+        self.ensure_table()
+
+        def run():
+            done = []
+            for m in self.pending(target):
+                log(f'applying {m.filename}')
+                start = time.monotonic()
+                with self.conn.cursor() as cursor:
+                    for statement in m.statements():
+                        try:
+                            cursor.execute(statement)
+                            # drain result sets (e.g. of CALL) before the next statement
+                            while cursor.nextset():
+                                pass
+                        except Exception as e:
+                            self.conn.rollback()
+                            raise MigrationError(m, statement, e) from e
+                    self._record(cursor, m, int((time.monotonic() - start) * 1000))
+                self.conn.commit()
+                done.append(m)
+            return done
+
+        return self._locked(run)
+
+    def baseline(self, version):
+        """Record migrations up to `version` as applied without running them
+        (for databases migrated by hand before the runner existed)."""
+        self.ensure_table()
+
+        def run():
+            marked = []
+            with self.conn.cursor() as cursor:
+                for m in self.pending(version):
+                    self._record(cursor, m, None)
+                    marked.append(m)
+            self.conn.commit()
+            return marked
+
+        return self._locked(run)
@@ -0,0 +1,276 @@
+"""What the database schema provides, probed once instead of per request.
+
+Handlers used to run their query and catch errno 1146 (no such table),
+1305 (no such procedure) or 1191 (no FULLTEXT index) to find out whether a
+migration had been applied, paying a failed round trip every time. The
+registry reads information_schema once (tables, columns, indexes,
+triggers and routines of the current database, in five queries on a
+connection of its own) and handlers branch on has_table(), has_index()
+and has_routine() instead.
+
+The snapshot is taken on first use and again once it is older than
+`max_age` seconds, after invalidate() (the app calls it when a query
+still hits a missing table) or on probe(). Until a probe has succeeded
+every check answers True, so queries run and fail the way they used to.
+
+report() compares the snapshot with EXPECTED, what the base schema and
+each migration create, and with the schema_migrations table: a migration
+recorded as applied whose objects are missing is drift, one that is not
+recorded but whose objects all exist was applied by hand.
+"""
+import logging
+import threading
+import time
+from datetime import datetime
+
+logger = logging.getLogger(__name__)
+
+BASE_SCHEMA = 'Campus_Food_Guide.sql'
+
+# schema file -> what it creates that the app relies on
+EXPECTED = {
+    BASE_SCHEMA: {
+        'tables': ('users', 'canteens', 'FoodReviews', 'Upvotes', 'Favorites', 'Comments', 'UserActivity'),
+        'triggers': ('fav_before_insert_prevent_own', 'trg_upvotes_before_insert_prevent_own'),
+        'routines': ('AddReviewWithActivity', 'GetAverageRating'),
+    },
+    '001_review_counters.sql': {
+        'columns': {'FoodReviews': ('UpvoteCount', 'FavoriteCount', 'CommentCount')},
+        # idx_reviews_canteen_spice is replaced by 010
+        'indexes': {'FoodReviews': ('idx_reviews_canteen_upvotes', 'idx_reviews_canteen_popular',
+                                    'idx_reviews_canteen_date', 'idx_reviews_canteen_price')},
+        'triggers': ('trg_upvotes_after_insert_count', 'trg_upvotes_after_delete_count',
+                     'trg_favorites_after_insert_count', 'trg_favorites_after_delete_count',
+                     'trg_comments_after_insert_count', 'trg_comments_after_delete_count'),
+    },
+    '002_review_search.sql': {
+        'indexes': {'FoodReviews': ('ft_reviews_text', 'ft_reviews_name')},
+    },
+    '003_dish_stats.sql': {
+        'tables': ('DishStats',),
+        'columns': {'FoodReviews': ('FoodKey',)},
+        'indexes': {'FoodReviews': ('idx_reviews_dish',)},
+        'triggers': ('trg_reviews_after_insert_dish', 'trg_reviews_after_delete_dish'),
+        'routines': ('RefreshDishPrices', 'RebuildDishStats'),
+    },
+    '004_query_indexes.sql': {
+        'indexes': {'FoodReviews': ('idx_reviews_user_date',), 'Comments': ('idx_comments_review_date',),
+                    'UserActivity': ('idx_activity_user_time', 'idx_activity_user_post_type')},
+    },
+    '005_toggle_procedures.sql': {
+        'routines': ('ToggleUpvote', 'ToggleFavorite'),
+    },
+    '006_review_version.sql': {
+        'columns': {'FoodReviews': ('Version',)},
+        'triggers': ('trg_reviews_before_update_version',),
+    },
+    '007_activity_feed.sql': {
+        'tables': ('CampusActivity',),
+        'columns': {'UserActivity': ('FoodName', 'CanteenID')},
+        'triggers': ('trg_activity_before_insert_review', 'trg_activity_after_insert_campus'),
+    },
+    '008_canteen_rollups.sql': {
+        'tables': ('CanteenRollups', 'RollupActiveUsers', 'RollupWatermarks'),
+    },
+    '009_review_imports.sql': {
+        'tables': ('ReviewImports',),
+    },
+    '010_spice_sort_index.sql': {
+        'indexes': {'FoodReviews': ('idx_reviews_canteen_spice_sort',)},
+    },
+    '011_campus_activity_cleanup.sql': {
+        'triggers': ('trg_activity_after_delete_campus',),
+    },
+    '012_activity_comment_ids.sql': {
+        'columns': {'UserActivity': ('CommentID',), 'CampusActivity': ('ActivityID',)},
+        'indexes': {'UserActivity': ('idx_activity_comment',), 'CampusActivity': ('idx_campus_activity',)},
+    },
+}
+
+# names are compared lowercased: MySQL folds routine (and, depending on
+# lower_case_table_names, table) names
+PROBES = {
+    'tables': "SELECT TABLE_NAME AS name FROM information_schema.TABLES WHERE TABLE_SCHEMA = DATABASE()",
+    'columns': """
+        SELECT TABLE_NAME AS tbl, COLUMN_NAME AS name
+        FROM information_schema.COLUMNS WHERE TABLE_SCHEMA = DATABASE()
+    """,
+    'indexes': """
+        SELECT DISTINCT TABLE_NAME AS tbl, INDEX_NAME AS name
+        FROM information_schema.STATISTICS WHERE TABLE_SCHEMA = DATABASE()
+    """,
+    'triggers': "SELECT TRIGGER_NAME AS name FROM information_schema.TRIGGERS WHERE TRIGGER_SCHEMA = DATABASE()",
+    'routines': "SELECT ROUTINE_NAME AS name FROM information_schema.ROUTINES WHERE ROUTINE_SCHEMA = DATABASE()",
+}
+
+
+class SchemaRegistry:
+
+    def __init__(self, connect, migrations=(), max_age=300.0, retry_after=5.0):
+        self._connect = connect
+        # versions and file names of the known migrations (schema_migrations.discover)
+        self.migrations = {m.filename: m.version for m in migrations}
+        self.max_age = max_age
+        self.retry_after = retry_after
+
+        self._lock = threading.Lock()
+        self._probe_lock = threading.Lock()
+        self._snapshot = None  # kind -> set of names; columns / indexes as (table, name)
+        self._applied = None  # recorded migration versions, None without schema_migrations
+        self._probed_at = 0.0  # monotonic
+        self._attempted_at = None
+
+        self.probes = 0
+        self.failures = 0
+        self.last_error = None
+        self.probed_at = None  # wall clock, for reports
+        self.probe_ms = 0.0
+
+    def probe(self):
+        """Read the schema now. Returns False (keeping the previous snapshot)
+        if the database could not be queried."""
+        with self._probe_lock:
+            return self._probe()
+
+    def _probe(self):
+        start = time.monotonic()
+        with self._lock:
+            self._attempted_at = start
+        try:
+            conn = self._connect()
+            try:
+                snapshot = {}
+                with conn.cursor() as cursor:
+                    for kind, sql in PROBES.items():
+                        cursor.execute(sql)
+                        rows = cursor.fetchall()
+                        if kind in ('columns', 'indexes'):
+                            snapshot[kind] = {(r['tbl'].lower(), r['name'].lower()) for r in rows}
+                        else:
+                            snapshot[kind] = {r['name'].lower() for r in rows}
+                    applied = None
+                    if 'schema_migrations' in snapshot['tables']:
+                        cursor.execute("SELECT version FROM schema_migrations")
+                        applied = {r['version'] for r in cursor.fetchall()}
+                conn.rollback()
+            finally:
+                conn.close()
+        except Exception as e:
+            with self._lock:
+                self.failures += 1
+                self.last_error = str(e)
+            logger.warning('Schema probe failed: %s', e)
+            return False
+        with self._lock:
+            self._snapshot = snapshot
+            self._applied = applied
+            self._probed_at = time.monotonic()
+            self.probed_at = datetime.now().replace(microsecond=0)
+            self.probes += 1
+            self.last_error = None
+            self.probe_ms = round((time.monotonic() - start) * 1000, 3)
+        return True
+
+    def invalidate(self):
+        """Probe again on the next check (e.g. a query hit a missing table)."""
+        with self._lock:
+            self._probed_at = 0.0
+            self._attempted_at = None
+
+    def _current(self):
+        """The snapshot, probing first if there is none yet or it is stale.
+        A stale snapshot keeps being used while another thread probes."""
+        now = time.monotonic()
+        with self._lock:
+            snapshot = self._snapshot
+            fresh = snapshot is not None and now - self._probed_at < self.max_age
+            retrying = self._attempted_at is not None and now - self._attempted_at < self.retry_after
+        if fresh or retrying:
+            return snapshot
+        if snapshot is None:
+            self.probe()
+        elif self._probe_lock.acquire(blocking=False):
+            try:
+                self._probe()
+            finally:
+                self._probe_lock.release()
+        with self._lock:
+            return self._snapshot
+
+    def has_table(self, table):
+        snapshot = self._current()
+        return snapshot is None or table.lower() in snapshot['tables']
+
+    def has_column(self, table, column):
+        snapshot = self._current()
+        return snapshot is None or (table.lower(), column.lower()) in snapshot['columns']
+
+    def has_index(self, table, index):
+        snapshot = self._current()
+        return snapshot is None or (table.lower(), index.lower()) in snapshot['indexes']
+
+    def has_routine(self, routine):
+        snapshot = self._current()
+        return snapshot is None or routine.lower() in snapshot['routines']
+
+    def missing(self, expected):
+        """Objects of one EXPECTED entry absent from the snapshot, as
+        'table X' / 'column T.C' / 'index T.I' / 'trigger X' / 'routine X'."""
+        snapshot = self._current()
+        if snapshot is None:
+            return []
+        missing = []
+        for table in expected.get('tables', ()):
+            if table.lower() not in snapshot['tables']:
+                missing.append(f'table {table}')
+        for kind, label in (('columns', 'column'), ('indexes', 'index')):
+            for table, names in expected.get(kind, {}).items():
+                missing += [f'{label} {table}.{name}' for name in names
+                            if (table.lower(), name.lower()) not in snapshot[kind]]
+        for kind, label in (('triggers', 'trigger'), ('routines', 'routine')):
+            missing += [f'{label} {name}' for name in expected.get(kind, ())
+                        if name.lower() not in snapshot[kind]]
+        return missing
+
+    def report(self):
+        """Per schema file: 'ok', 'pending' (not applied), 'drift' (applied
+        but objects are missing) or 'unrecorded' (applied by hand), with the
+        missing objects. `drift` is True unless everything is 'ok'."""
+        snapshot = self._current()
+        with self._lock:
+            applied = self._applied
+            report = {
+                'probed': snapshot is not None,
+                'probed_at': self.probed_at,
+                'probe_ms': self.probe_ms,
+                'last_error': self.last_error,
+            }
+        if snapshot is None:
+            report.update(drift=None, sources={})
+            return report
+        sources = {}
+        for source, expected in EXPECTED.items():
+            missing = self.missing(expected)
+            version = self.migrations.get(source)
+            recorded = source == BASE_SCHEMA or (applied is not None and version in applied)
+            if recorded:
+                status = 'drift' if missing else 'ok'
+            elif version is None and source != BASE_SCHEMA:
+                status = 'unknown'  # no such file in migrations/
+            else:
+                status = 'pending' if missing else 'unrecorded'
+            sources[source] = {'status': status, 'missing': missing}
+        report.update(drift=any(s['status'] != 'ok' for s in sources.values()), sources=sources)
+        return report
+
+    def stats(self):
+        with self._lock:
+            snapshot = self._snapshot
+            return {
+                'probes': self.probes,
+                'failures': self.failures,
+                'probed_at': self.probed_at,
+                'probe_ms': self.probe_ms,
+                'last_error': self.last_error,
+                'objects': {kind: len(names) for kind, names in snapshot.items()} if snapshot else {},
+            }
@@ -0,0 +1,161 @@
+"""Cache-friendly delivery of uploads and the public template images.
+
+A URL whose bytes can never change is served with a year-long
+`Cache-Control: public, max-age=..., immutable`, so browsers stop
+revalidating it: content-addressed uploads and their variants
+(see uploads.UploadPipeline.immutable), and /templates/public files
+requested through the `?v=<digest>` URLs versioned_url() builds. Anything
+else is `no-cache` and revalidates against a strong ETag, which for
+mutable files is the SHA-256 of their bytes (computed once per file
+version, keyed by mtime and size).
+
+The bytes themselves go out through werkzeug's send_file, which answers
+Range / If-Range with 206 and hands the open file to the WSGI server's
+file_wrapper (sendfile(2) under gunicorn). With `sendfile` set to
+'x-sendfile' or 'x-accel-redirect' the response carries only the headers
+and the front proxy (Apache mod_xsendfile, nginx) sends the file, ranges
+included; conditional requests are still answered here with a 304.
+"""
+import hashlib
+import mimetypes
+import os
+import threading
+from collections import OrderedDict
+
+from flask import Response, send_file
+from werkzeug.exceptions import NotFound
+from werkzeug.security import safe_join
+
+SENDFILE_MODES = ('x-sendfile', 'x-accel-redirect')
+DIGEST_LENGTH = 32
+VERSION_LENGTH = 16
+
+
+class FileServer:
+
+    def __init__(self, root, sendfile=None, accel_prefix='/_files', immutable_max_age=365 * 24 * 3600,
+                 digest_cache_size=4096):
+        if sendfile and sendfile not in SENDFILE_MODES:
+            raise ValueError(f'sendfile must be one of {SENDFILE_MODES}, not {sendfile!r}')
+        self.root = os.path.abspath(root)
+        self.sendfile = sendfile or None
+        self.accel_prefix = accel_prefix.rstrip('/')
+        self.immutable_max_age = immutable_max_age
+        self.digest_cache_size = digest_cache_size
+
+        self._lock = threading.Lock()
+        self._digests = OrderedDict()  # path -> (mtime_ns, size, digest)
+
+        self.served = 0
+        self.immutable = 0
+        self.not_modified = 0
+        self.partial = 0
+        self.handed_off = 0
+        self.hashed = 0
+
+    def digest(self, path, stat=None):
+        """SHA-256 (hex, truncated) of the file at `path`, hashed again only
+        when its mtime or size changes."""
+        stat = stat or os.stat(path)
+        with self._lock:
+            cached = self._digests.get(path)
+            if cached is not None and cached[:2] == (stat.st_mtime_ns, stat.st_size):
+                self._digests.move_to_end(path)
+                return cached[2]
+        h = hashlib.sha256()
+        with open(path, 'rb') as f:
+            for chunk in iter(lambda: f.read(64 * 1024), b''):
+                h.update(chunk)
+        digest = h.hexdigest()[:DIGEST_LENGTH]
+        with self._lock:
+            self.hashed += 1
+            self._digests[path] = (stat.st_mtime_ns, stat.st_size, digest)
+            self._digests.move_to_end(path)
+            while len(self._digests) > self.digest_cache_size:
+                self._digests.popitem(last=False)
+        return digest
+
+    def versioned_url(self, url_prefix, folder, name):
+        """`url_prefix/name?v=<digest>`, or the plain URL if the file is missing."""
+        url = f'{url_prefix.rstrip("/")}/{name}'
+        path = safe_join(folder, name)
+        try:
+            return f'{url}?v={self.digest(path)[:VERSION_LENGTH]}'
+        except (OSError, TypeError):
+            return url
+
+    def is_current(self, folder, name, version):
+        """True if `version` (a ?v= value) matches the file's current bytes."""
+        path = safe_join(folder, name)
+        if not version or path is None:
+            return False
+        try:
+            return self.digest(path)[:VERSION_LENGTH] == version
+        except OSError:
+            return False
+
+    def serve(self, request, folder, name, immutable=False, etag=None):
+        """Send `name` from `folder`. `immutable` marks URLs whose bytes never
+        change; `etag` can name them without hashing the file."""
+        path = safe_join(folder, name)
+        if path is None:
+            raise NotFound()
+        path = os.path.abspath(path)
+        try:
+            stat = os.stat(path)
+        except OSError:
+            raise NotFound()
+        if not os.path.isfile(path):
+            raise NotFound()
+        etag = etag or self.digest(path, stat)
+
+        if self.sendfile and not request.if_none_match.contains(etag):
+            response = self._handoff(path, stat)
+        else:
+            # conditional=True: If-None-Match -> 304, Range / If-Range -> 206
+            response = send_file(path, conditional=True, etag=etag, max_age=None)
+        response.set_etag(etag)
+        response.cache_control.public = True
+        if immutable:
+            response.cache_control.no_cache = None
+            response.cache_control.max_age = self.immutable_max_age
+            response.cache_control.immutable = True
+        else:
+            response.cache_control.no_cache = True
+
+        with self._lock:
+            self.served += 1
+            if immutable:
+                self.immutable += 1
+            if response.status_code == 304:
+                self.not_modified += 1
+            elif response.status_code == 206:
+                self.partial += 1
+            elif self.sendfile:
+                self.handed_off += 1
+        return response
+
+    def _handoff(self, path, stat):
+        response = Response(mimetype=mimetypes.guess_type(path)[0] or 'application/octet-stream')
+        response.content_length = stat.st_size
+        response.last_modified = stat.st_mtime
+        if self.sendfile == 'x-sendfile':
+            response.headers['X-Sendfile'] = path
+        else:
+            relative = os.path.relpath(path, self.root).replace(os.sep, '/')
+            response.headers['X-Accel-Redirect'] = f'{self.accel_prefix}/{relative}'
+        response.headers['Accept-Ranges'] = 'bytes'
+        return response
+
+    def stats(self):
+        with self._lock:
+            return {
+                'sendfile': self.sendfile,
+                'served': self.served,
+                'immutable': self.immutable,
+                'not_modified': self.not_modified,
+                'partial': self.partial,
+                'handed_off': self.handed_off,
+                'hashed': self.hashed,
+                'digests_cached': len(self._digests),
+            }
@@ -0,0 +1,80 @@
+"""Fixtures: app.py on a small seeded database of the SQLite stand-in
+(bench/sqlite_db.py), with app.testing set so @query_budget raises."""
+import argparse
+import os
+import sys
+import time
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bench import run as bench  # noqa: E402
+
+USER_ID = 1
+
+
+@pytest.fixture(scope='session')
+def connect(tmp_path_factory):
+    parser = argparse.ArgumentParser()
+    bench.add_database_arguments(parser)
+    args = parser.parse_args(['--db', str(tmp_path_factory.mktemp('db') / 'test.sqlite3'),
+                              '--users', '50', '--reviews', '400'])
+    creator, _ = bench.prepare_database(args)
+    return creator
+
+
+@pytest.fixture(scope='session')
+def app_module(connect):
+    module = bench.install_app(connect, 1)
+    module.app.testing = True
+    module.app.config['QUERY_BUDGET_MODE'] = ''
+    yield module
+    module.activity_log.shutdown()
+
+
+@pytest.fixture
+def client(app_module):
+    client = app_module.app.test_client()
+    with client.session_transaction() as session:
+        session['user_id'] = USER_ID
+    return client
+
+
+@pytest.fixture
+def query(connect):
+    """Run one SELECT on a connection of its own and return its rows."""
+    def run(sql, params=()):
+        conn = connect()
+        try:
+            with conn.cursor() as cursor:
+                cursor.execute(sql, params)
+                return cursor.fetchall()
+        finally:
+            conn.close()
+    return run
+
+
+@pytest.fixture
+def other_review(query):
+    """A review the test user did not write."""
+    return query('SELECT ReviewID FROM FoodReviews WHERE UserID <> %s ORDER BY ReviewID LIMIT 1',
+                 (USER_ID,))[0]['ReviewID']
+
+
+@pytest.fixture
+def without_schema(app_module):
+    """Hide objects from the schema snapshot, as on a database that lacks
+    them: without_schema(routines=['ToggleUpvote'])."""
+    schema = app_module.schema
+
+    def hide(**kinds):
+        schema.probe()
+        for kind, names in kinds.items():
+            for name in names:
+                name = tuple(n.lower() for n in name) if isinstance(name, tuple) else name.lower()
+                schema._snapshot[kind].discard(name)
+        schema._probed_at = time.monotonic()
+
+    yield hide
+    schema.invalidate()
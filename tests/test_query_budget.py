@@ -0,0 +1,103 @@
+"""@query_budget under app.testing: views stay within what they declare,
+and a view that runs more statements raises QueryBudgetExceeded."""
+import pytest
+
+from metrics import QueryBudgetExceeded
+
+from conftest import USER_ID
+
+# /api/search needs MySQL FULLTEXT, which the SQLite stand-in lacks
+GET_VIEWS = [
+    '/',
+    '/profile',
+    '/canteen/1',
+    '/api/canteens',
+    '/api/canteen_reviews?canteen_id=1',
+    '/api/canteen_reviews?canteen_id=1&sort=upvotes',
+    '/api/canteen_reviews?canteen_id=1&sort=popular',
+    '/api/canteen_reviews?canteen_id=1&sort=spice_desc',
+    '/api/canteen_reviews?canteen_id=1&sort=price_asc',
+    '/api/my_reviews',
+    '/api/reviews_by_ids?ids=1,2,3',
+    '/api/dishes?canteen_id=1',
+    '/api/recommendations',
+    '/api/analytics/canteen/1',
+    '/api/me',
+    '/api/activity_feed',
+    '/api/activity_feed?scope=campus',
+    '/api/stats',
+    '/api/health',
+]
+
+
+@pytest.mark.parametrize('path', GET_VIEWS)
+def test_get_views_stay_within_budget(client, path):
+    assert client.get(path).status_code < 500
+
+
+def test_over_budget_view_raises(app_module, client, monkeypatch):
+    view = app_module.app.view_functions['api_canteen_reviews']
+    monkeypatch.setattr(view, 'query_budget', (0, None))
+    with pytest.raises(QueryBudgetExceeded):
+        client.get('/api/canteen_reviews?canteen_id=2&sort=price_desc')
+
+
+def test_over_budget_view_passes_when_off(app_module, client, monkeypatch):
+    view = app_module.app.view_functions['api_canteen_reviews']
+    monkeypatch.setattr(view, 'query_budget', (0, None))
+    monkeypatch.setitem(app_module.app.config, 'QUERY_BUDGET_MODE', 'off')
+    assert client.get('/api/canteen_reviews?canteen_id=3&sort=price_desc').status_code == 200
+
+
+def test_repeated_statement_raises(app_module, client, other_review, monkeypatch):
+    # each comment is the same INSERT and SELECT
+    view = app_module.app.view_functions['api_interactions']
+    monkeypatch.setattr(view, 'query_budget', (None, 1))
+    with pytest.raises(QueryBudgetExceeded):
+        client.post('/api/interactions', json={ 'actions': [
+            { 'type': 'comment', 'review_id': other_review, 'text': 'first' },
+            { 'type': 'comment', 'review_id': other_review, 'text': 'second' },
+        ] })
+
+
+@pytest.mark.parametrize('kind', ['upvote', 'favorite'])
+def test_toggles_stay_within_budget(client, other_review, kind):
+    assert client.post(f'/{kind}/{other_review}').get_json()['success']
+    assert client.post(f'/{kind}/{other_review}').get_json()['success']
+
+
+@pytest.mark.parametrize('kind', ['upvote', 'favorite'])
+def test_toggle_fallback_extends_budget(client, other_review, without_schema, kind):
+    # before migration 005 a toggle runs up to four statements instead of a CALL
+    without_schema(routines=['ToggleUpvote', 'ToggleFavorite'])
+    first = client.post(f'/{kind}/{other_review}').get_json()
+    second = client.post(f'/{kind}/{other_review}').get_json()
+    assert first['success'] and second['success']
+
+
+def test_interactions_stay_within_budget(client, other_review):
+    actions = [{ 'type': 'upvote', 'review_id': other_review },
+               { 'type': 'favorite', 'review_id': other_review, 'active': True },
+               { 'type': 'comment', 'review_id': other_review, 'text': 'batched' }]
+    results = client.post('/api/interactions', json={ 'actions': actions }).get_json()['results']
+    assert all(r['success'] for r in results)
+
+
+def test_interactions_fallback_stays_within_budget(app_module, client, other_review, without_schema):
+    # a full batch of toggles, each extending the budget by the fallback's extra statements
+    without_schema(routines=['ToggleUpvote', 'ToggleFavorite'])
+    actions = [{ 'type': kind, 'review_id': other_review }
+               for kind in ('upvote', 'favorite')] * (app_module.INTERACTION_BATCH_MAX // 2)
+    results = client.post('/api/interactions', json={ 'actions': actions }).get_json()['results']
+    assert all(r['success'] for r in results)
+
+
+def test_comment_and_delete_stay_within_budget(client, other_review):
+    comment = client.post(f'/comment/{other_review}', data={ 'comment': 'budget' }).get_json()['comment']
+    assert client.post(f"/comment/{comment['id']}/delete").get_json()['success']
+
+
+def test_delete_review_stays_within_budget(client, query):
+    review_id = query('SELECT ReviewID FROM FoodReviews WHERE UserID = %s ORDER BY ReviewID DESC LIMIT 1',
+                      (USER_ID,))[0]['ReviewID']
+    assert client.post(f'/review/{review_id}/delete').get_json()['success']
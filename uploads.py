@@ -0,0 +1,203 @@
+"""Upload storage and off-request image processing.
+
+Uploaded files are stored under the SHA-256 of their bytes, so the same
+screenshot uploaded twice is kept once. The request only streams the
+original to disk; a small worker pool then writes resized WebP variants,
+re-encoded without EXIF or text metadata, next to it. The original is
+never rewritten, so its bytes always match the digest in its name:
+
+    <digest>.<ext>          original, as uploaded
+    <digest>_card.webp      fits the 200px-high review cards at 2x
+    <digest>_thumb.webp     gallery thumbnails / avatars
+
+Pillow is optional. Without it, originals are still deduplicated and served
+as-is, and variant_url() simply falls back to the original.
+"""
+import hashlib
+import logging
+import os
+import re
+import secrets
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+try:
+    from PIL import Image, ImageOps
+except ImportError:  # pragma: no cover - Pillow is an optional dependency
+    Image = None
+
+logger = logging.getLogger(__name__)
+
+# variant name -> bounding box (width, height)
+VARIANTS = {
+    'card': (640, 400),
+    'thumb': (120, 120),
+}
+VARIANT_FORMAT = 'webp'
+VARIANT_QUALITY = 80
+
+HASHED_NAME = re.compile(r'^([0-9a-f]{32})\.(png|jpe?g|gif)$')
+VARIANT_NAME = re.compile(r'^([0-9a-f]{32})_(\w+)\.' + VARIANT_FORMAT + '$')
+
+
+class UploadPipeline:
+
+    def __init__(self, folder, url_prefix, max_workers=2):
+        self.folder = folder
+        self.url_prefix = url_prefix.rstrip('/')
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='upload')
+        self._lock = threading.Lock()
+        self._ready = set()  # digests whose variants exist on disk
+        self._pending = set()
+
+        self.saved = 0
+        self.deduplicated = 0
+        self.processed = 0
+        self.failed = 0
+
+        if Image is None:
+            logger.warning('Pillow is not installed; uploads are stored without resized variants')
+        else:
+            self._scan_existing()
+
+    def _scan_existing(self):
+        try:
+            names = set(os.listdir(self.folder))
+        except OSError:
+            return
+        for name in names:
+            m = HASHED_NAME.match(name)
+            if not m:
+                continue
+            if all(f'{m.group(1)}_{v}.{VARIANT_FORMAT}' in names for v in VARIANTS):
+                self._ready.add(m.group(1))
+            else:
+                # a worker was stopped mid-way, or Pillow was missing when it was saved
+                self.schedule(m.group(1), os.path.join(self.folder, name))
+
+    def save(self, file_storage, ext):
+        """Stream an uploaded file to its content-addressed path and queue
+        variant generation. Returns the public URL of the original."""
+        tmp_path = os.path.join(self.folder, f'.upload-{secrets.token_hex(8)}.tmp')
+        digest = hashlib.sha256()
+        with open(tmp_path, 'wb') as out:
+            while True:
+                chunk = file_storage.stream.read(64 * 1024)
+                if not chunk:
+                    break
+                digest.update(chunk)
+                out.write(chunk)
+            out.flush()
+            os.fsync(out.fileno())
+
+        key = digest.hexdigest()[:32]
+        ext = ext.lower().replace('jpeg', 'jpg')
+        name = f'{key}.{ext}'
+        path = os.path.join(self.folder, name)
+        if os.path.exists(path):
+            os.remove(tmp_path)
+            with self._lock:
+                self.deduplicated += 1
+        else:
+            os.replace(tmp_path, path)
+            with self._lock:
+                self.saved += 1
+
+        self.schedule(key, path)
+        return f'{self.url_prefix}/{name}'
+
+    def schedule(self, key, path):
+        if Image is None:
+            return
+        with self._lock:
+            if key in self._ready or key in self._pending:
+                return
+            self._pending.add(key)
+        self._executor.submit(self._process, key, path)
+
+    def _process(self, key, path):
+        try:
+            with Image.open(path) as im:
+                im = ImageOps.exif_transpose(im)
+                for variant, box in VARIANTS.items():
+                    copy = im.convert('RGBA' if im.mode in ('RGBA', 'LA', 'P') else 'RGB')
+                    copy.thumbnail(box)
+                    self._atomic_save(copy, os.path.join(self.folder, f'{key}_{variant}.{VARIANT_FORMAT}'),
+                                      VARIANT_FORMAT, quality=VARIANT_QUALITY)
+            with self._lock:
+                self._ready.add(key)
+                self.processed += 1
+        except Exception:
+            logger.exception('Failed to process upload %s', path)
+            with self._lock:
+                self.failed += 1
+        finally:
+            with self._lock:
+                self._pending.discard(key)
+
+    @staticmethod
+    def _atomic_save(im, path, fmt, **params):
+        tmp_path = f'{path}.{secrets.token_hex(4)}.tmp'
+        im.save(tmp_path, format=fmt, **params)
+        os.replace(tmp_path, path)
+
+    def variant_url(self, url, variant):
+        """Return the URL of a processed variant of `url`, or `url` itself if
+        it is not a local upload or its variants are not ready yet."""
+        if not isinstance(url, str) or not url.startswith(self.url_prefix + '/'):
+            return url
+        m = HASHED_NAME.match(url[len(self.url_prefix) + 1:])
+        if not m or m.group(1) not in self._ready:
+            return url
+        return f'{self.url_prefix}/{m.group(1)}_{variant}.{VARIANT_FORMAT}'
+
+    def variant_settled(self, url):
+        """True once variant_url(url, ...) will not change any more: the
+        variants are ready, or `url` is not a local upload, or there is no
+        Pillow to produce them."""
+        if Image is None or not isinstance(url, str) or not url.startswith(self.url_prefix + '/'):
+            return True
+        m = HASHED_NAME.match(url[len(self.url_prefix) + 1:])
+        return not m or m.group(1) in self._ready
+
+    def is_content_addressed(self, url):
+        """True for uploads stored under their digest, which may be shared by
+        several reviews and are only removed by `flask prune-uploads`."""
+        return (isinstance(url, str) and url.startswith(self.url_prefix + '/')
+                and HASHED_NAME.match(url[len(self.url_prefix) + 1:]) is not None)
+
+    def immutable(self, url):
+        """True if the bytes at `url` will never change: a variant (written
+        once, atomically) or a content-addressed original."""
+        if not isinstance(url, str) or not url.startswith(self.url_prefix + '/'):
+            return False
+        name = url[len(self.url_prefix) + 1:]
+        m = VARIANT_NAME.match(name)
+        if m:
+            return m.group(2) in VARIANTS
+        return HASHED_NAME.match(name) is not None
+
+    def files_for(self, url):
+        """Local paths of an upload and its variants (for cleanup)."""
+        if not isinstance(url, str) or not url.startswith(self.url_prefix + '/'):
+            return []
+        name = url[len(self.url_prefix) + 1:]
+        paths = [os.path.join(self.folder, name)]
+        m = HASHED_NAME.match(name)
+        if m:
+            paths += [os.path.join(self.folder, f'{m.group(1)}_{v}.{VARIANT_FORMAT}') for v in VARIANTS]
+        return paths
+
+    def stats(self):
+        with self._lock:
+            return {
+                'image_processing': Image is not None,
+                'saved': self.saved,
+                'deduplicated': self.deduplicated,
+                'processed': self.processed,
+                'failed': self.failed,
+                'pending': len(self._pending),
+            }
+
+    def shutdown(self, wait=True):
+        self._executor.shutdown(wait=wait)